@@ -0,0 +1,52 @@
+"""
+api_spec.py
+
+flask-smorest `Api` that builds the OpenAPI spec when it is first needed
+instead of at startup. Registering a blueprint adds its routes to the app right
+away, but documenting its views (resolving every schema into the spec) waits
+until the first `/openapi.json`, Swagger UI or `flask openapi` request, which
+most worker processes never serve. The rendered JSON document is then kept and
+served as is.
+"""
+
+import json
+
+from flask import current_app
+from flask_smorest import Api as BaseApi
+
+
+class Api(BaseApi):
+    def __init__(self, *args, **kwargs):
+        self._pending_docs = []
+        self._spec_json = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def spec(self):
+        spec = self._spec
+        while self._pending_docs:
+            blp, name, parameters = self._pending_docs.pop(0)
+            blp.register_views_in_doc(self, self._app, spec, name=name, parameters=parameters)
+            spec.tag({"name": name, "description": blp.description})
+        return spec
+
+    @spec.setter
+    def spec(self, spec):
+        self._spec = spec
+        self._spec_json = None
+
+    def register_blueprint(self, blp, *, parameters=None, **options):
+        """Registers the blueprint in the app, and its views in the spec when
+        the spec is next used."""
+        name = options.get("name", blp.name)
+        self._app.extensions["flask-smorest"]["blp_name_to_api"][name] = self
+        self._app.register_blueprint(blp, **options)
+
+        self._pending_docs.append((blp, name, parameters))
+        self._spec_json = None
+
+    def _openapi_json(self):
+        if self._spec_json is None:
+            # Not jsonify, which would sort the keys
+            self._spec_json = json.dumps(self.spec.to_dict(), indent=2)
+        return current_app.response_class(self._spec_json, mimetype="application/json")
@@ -1,27 +1,49 @@
 import os
 
-from dotenv import load_dotenv
 from flask import Flask, jsonify
-from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
-from flask_smorest import Api
 
+from api_spec import Api
 from blocklist import BLOCKLIST
-from db import db
+from catalogue import catalogue_cli
+from changes import CHANGE_FEED, changes_cli
+from db import db, engine_config, migrate_cli
+from jwt_cache import CLAIMS_CACHE, USER_CACHE, CachedJWTManager
+from keys import KEY_SET, keys_cli
+from metrics import init_metrics
+from passwords import PASSWORD_HASHER
+from reference_cache import REFERENCE_CACHE
+from resources.catalogue import blp as CatalogueBlueprint
+from resources.changes import blp as ChangesBlueprint
 from resources.item import blp as ItemBlueprint
+from resources.stats import blp as StatsBlueprint
 from resources.store import blp as StoreBlueprint
 from resources.tag import blp as TagBlueprint
 from resources.user import blp as UserBlueprint
+from response_cache import RESPONSE_CACHE
+from serializers import SERIALIZER
+from settings import DEAD_LETTER_QUEUE, QUEUE, REDIS_URL
+from stats import stats_cli
+from task_queue import create_queue
 
 
 def create_app(db_url=None):
     app = Flask(__name__)
-    load_dotenv()
 
-    # Uncomment this code to use background worker
-    # connection = redis.from_url(os.getenv("REDIS_URL"))
+    # Without a REDIS_URL, background tasks run on a thread pool of the web
+    # process. TASK_QUEUE_EAGER runs them inline, for tests.
+    app.config["TASK_QUEUE_EAGER"] = os.getenv("TASK_QUEUE_EAGER", "0") == "1"
+    app.config["TASK_QUEUE_EAGER_RETRIES"] = os.getenv("TASK_QUEUE_EAGER_RETRIES", "0") == "1"
+    app.config["TASK_QUEUE_THREADS"] = int(os.getenv("TASK_QUEUE_THREADS", 2))
+    app.config["TASK_QUEUE_REDIS_URL"] = REDIS_URL if os.getenv("REDIS_URL") else None
+    app.config["TASK_QUEUE_NAME"] = QUEUE[0]
+    app.config["TASK_DEAD_LETTER_QUEUE"] = DEAD_LETTER_QUEUE
+    app.config["TASK_RETRY_INTERVALS"] = [
+        int(interval)
+        for interval in os.getenv("TASK_RETRY_INTERVALS", "10,60,300").split(",")
+        if interval
+    ]
+    app.queue = create_queue(app.config)
 
-    # app.queue = Queue("emails", connection=connection)
     app.config["PROPAGATE_EXCEPTIONS"] = True
     app.config["API_TITLE"] = "Stores REST API"
     app.config["API_VERSION"] = "v1"
@@ -58,22 +80,123 @@ def create_app(db_url=None):
         "DATABASE_URL", "sqlite:///data.db"
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    engine_config(app)
+    app.config["PAGINATION_DEFAULT_LIMIT"] = int(
+        os.getenv("PAGINATION_DEFAULT_LIMIT", 100)
+    )
+    app.config["PAGINATION_MAX_LIMIT"] = int(os.getenv("PAGINATION_MAX_LIMIT", 1000))
+    app.config["STREAM_CHUNK_SIZE"] = int(os.getenv("STREAM_CHUNK_SIZE", 1000))
+    app.config["CATALOGUE_BATCH_SIZE"] = int(os.getenv("CATALOGUE_BATCH_SIZE", 5000))
+    app.config["CATALOGUE_MAX_ERRORS"] = int(os.getenv("CATALOGUE_MAX_ERRORS", 100))
+    app.config["BULK_BATCH_SIZE"] = int(os.getenv("BULK_BATCH_SIZE", 1000))
+    app.config["STORE_DELETE_CHUNK_SIZE"] = int(os.getenv("STORE_DELETE_CHUNK_SIZE", 5000))
     db.init_app(app)
+    db.init_routing(app)
+
+    # Only with Redis, which holds the invalidations every worker has to see
+    app.config["RESPONSE_CACHE_REDIS_URL"] = os.getenv("RESPONSE_CACHE_REDIS_URL")
+    app.config["RESPONSE_CACHE_ENABLED"] = os.getenv(
+        "RESPONSE_CACHE_ENABLED", "1" if app.config["RESPONSE_CACHE_REDIS_URL"] else "0"
+    ) == "1"
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+    app.config["RESPONSE_CACHE_TTL"] = int(os.getenv("RESPONSE_CACHE_TTL", 60))
+    RESPONSE_CACHE.init_app(app)
 
-    Migrate(app, db)
+    app.config["REFERENCE_CACHE_REDIS_URL"] = os.getenv("REFERENCE_CACHE_REDIS_URL")
+    app.config["REFERENCE_CACHE_ENABLED"] = os.getenv(
+        "REFERENCE_CACHE_ENABLED", "1" if app.config["REFERENCE_CACHE_REDIS_URL"] else "0"
+    ) == "1"
+    app.config["REFERENCE_CACHE_SIZE"] = int(os.getenv("REFERENCE_CACHE_SIZE", 1024))
+    app.config["REFERENCE_CACHE_TTL"] = int(os.getenv("REFERENCE_CACHE_TTL", 300))
+    REFERENCE_CACHE.init_app(app)
+
+    # A waiting request holds a worker thread: well under GUNICORN_TIMEOUT
+    app.config["CHANGES_MAX_WAIT"] = float(os.getenv("CHANGES_MAX_WAIT", 10))
+    app.config["CHANGES_POLL_INTERVAL"] = float(os.getenv("CHANGES_POLL_INTERVAL", 1))
+    app.config["CHANGES_SSE_HEARTBEAT"] = float(os.getenv("CHANGES_SSE_HEARTBEAT", 5))
+    app.config["CHANGES_SSE_MAX_DURATION"] = float(os.getenv("CHANGES_SSE_MAX_DURATION", 15))
+    app.config["CHANGES_COMPACT_CHUNK_SIZE"] = int(
+        os.getenv("CHANGES_COMPACT_CHUNK_SIZE", 10000)
+    )
+    CHANGE_FEED.init_app(app)
+
+    app.config["SERIALIZER_COMPILED"] = os.getenv("SERIALIZER_COMPILED", "1") == "1"
+    app.config["SERIALIZER_JSON"] = os.getenv("SERIALIZER_JSON", "json")
+    SERIALIZER.init_app(app)
+
+    app.cli.add_command(migrate_cli(app))
 
     api = Api(app)
 
     # with app.app_context():
     #     db.create_all()
 
-    app.config["JWT_SECRET_KEY"] = "kanav"
-    jwt = JWTManager(app)
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "kanav")
+    jwt = CachedJWTManager(app)
+
+    app.config["JWT_KEYS_FILE"] = os.getenv("JWT_KEYS_FILE")
+    app.config["JWT_KEY_OVERLAP"] = float(os.getenv("JWT_KEY_OVERLAP", 0)) or None
+    app.config["JWT_KEYS_RELOAD_INTERVAL"] = float(
+        os.getenv("JWT_KEYS_RELOAD_INTERVAL", 60)
+    )
+    KEY_SET.init_app(app)
+    app.cli.add_command(keys_cli)
+
+    if KEY_SET.enabled:
+
+        @jwt.additional_headers_loader
+        def key_id_header(identity):
+            return KEY_SET.key_id_header()
+
+        @jwt.encode_key_loader
+        def signing_key(identity):
+            return KEY_SET.signing_secret()
+
+        @jwt.decode_key_loader
+        def verification_key(jwt_header, jwt_payload):
+            return KEY_SET.verification_key(jwt_header)
+
+    app.config["JWT_CLAIMS_CACHE_SIZE"] = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", 10000))
+    app.config["JWT_USER_CACHE_SIZE"] = int(os.getenv("JWT_USER_CACHE_SIZE", 10000))
+    app.config["JWT_USER_CACHE_TTL"] = float(os.getenv("JWT_USER_CACHE_TTL", 60))
+    CLAIMS_CACHE.init_app(app)
+    USER_CACHE.init_app(app)
+
+    app.config["BLOCKLIST_BACKEND"] = os.getenv("BLOCKLIST_BACKEND", "memory")
+    app.config["BLOCKLIST_REDIS_URL"] = os.getenv("BLOCKLIST_REDIS_URL", REDIS_URL)
+    app.config["BLOCKLIST_CACHE_SIZE"] = int(os.getenv("BLOCKLIST_CACHE_SIZE", 10000))
+    app.config["BLOCKLIST_NEGATIVE_TTL"] = float(
+        os.getenv("BLOCKLIST_NEGATIVE_TTL", 5)
+    )
+    BLOCKLIST.init_app(app)
+
+    app.config["PASSWORD_SCHEMES"] = os.getenv(
+        "PASSWORD_SCHEMES", "pbkdf2_sha256"
+    ).split(",")
+    app.config["PASSWORD_ROUNDS"] = int(os.getenv("PASSWORD_ROUNDS", 0)) or None
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", 0))
+    app.config["PASSWORD_HASH_MAX_PENDING"] = int(
+        os.getenv("PASSWORD_HASH_MAX_PENDING", 32)
+    )
+    PASSWORD_HASHER.init_app(app)
 
     @jwt.token_in_blocklist_loader
     def check_if_token_in_blocklist(jwt_header, jwt_payload):
         return jwt_payload["jti"] in BLOCKLIST
 
+    @jwt.user_lookup_loader
+    def user_lookup_callback(jwt_header, jwt_payload):
+        return USER_CACHE.load(jwt_payload["sub"])
+
+    @jwt.user_lookup_error_loader
+    def user_lookup_error_callback(jwt_header, jwt_payload):
+        return (
+            jsonify(
+                {"description": "The user no longer exists.", "error": "user_not_found"}
+            ),
+            401,
+        )
+
     @jwt.revoked_token_loader
     def revoked_token_callback(jwt_header, jwt_payload):
         return (
@@ -127,5 +250,15 @@ def create_app(db_url=None):
     api.register_blueprint(StoreBlueprint)
     api.register_blueprint(TagBlueprint)
     api.register_blueprint(UserBlueprint)
+    api.register_blueprint(StatsBlueprint)
+    api.register_blueprint(CatalogueBlueprint)
+    api.register_blueprint(ChangesBlueprint)
+
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(catalogue_cli)
+    app.cli.add_command(changes_cli)
+
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") == "1"
+    init_metrics(app)
 
     return app
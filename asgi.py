@@ -0,0 +1,246 @@
+"""
+asgi.py
+
+ASGI entry point, serving the API from an event loop:
+
+    uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 80 --workers 4
+
+The public read routes (items, stores, tags and stats) are coroutine views that
+query through async SQLAlchemy sessions (async_db.py), so a worker keeps many
+requests in flight while they wait on the database, instead of one per thread.
+Everything else (writes, JWT protected routes, `format=ndjson` streams, the
+OpenAPI docs and /metrics) goes to the Flask app, run in a thread pool by
+asgiref's WsgiToAsgi.
+
+The coroutine views run inside a Flask request context, through the app's
+before/after request hooks, query argument parser, response schemas, response
+cache and error handlers, so their responses are the same bytes as under
+gunicorn, and the OpenAPI spec and JWT checks are the Flask app's own.
+
+Needs the asyncio driver of the database: asyncpg for PostgreSQL, aiosqlite
+(with SQLAlchemy >= 1.4.3) for SQLite.
+"""
+
+import sys
+from io import BytesIO
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, g, jsonify, request
+from flask_smorest import Blueprint
+from sqlalchemy import select
+
+from app import create_app
+from async_db import ASYNC_DB
+from item_search import SORTS, filter_items
+from item_versions import etag
+from models import ItemModel, StoreModel, StoreStatsModel, TagModel
+from pagination import page_of, page_query
+from query_shaping import LOAD_OPTIONS
+from response_cache import RESPONSE_CACHE
+from schemas import (
+    ItemListArgsSchema,
+    ItemSchema,
+    ListArgsSchema,
+    StoreSchema,
+    StoreStatsSchema,
+    TagSchema,
+)
+
+# Coroutine views, by the endpoint of the Flask view they replace
+VIEWS = {}
+
+# Built once, like the schemas of the Flask views' decorators, so that their
+# compiled dump functions are reused
+ITEM, ITEMS = ItemSchema(), ItemSchema(many=True)
+STORE, STORES = StoreSchema(), StoreSchema(many=True)
+TAG, TAGS = TagSchema(), TagSchema(many=True)
+STORE_STATS, STORE_STATS_LIST = StoreStatsSchema(), StoreStatsSchema(many=True)
+LIST_ARGS, ITEM_LIST_ARGS = ListArgsSchema(), ItemListArgsSchema()
+
+
+def async_view(endpoint):
+    def decorator(func):
+        VIEWS[endpoint] = RESPONSE_CACHE.cached_async(func)
+        return func
+
+    return decorator
+
+
+def parse_query(schema):
+    # Same parser and error responses as `blp.arguments(schema, location="query")`
+    return Blueprint.ARGUMENTS_PARSER.parse(schema, location="query")
+
+
+def shaped_select(model, schema):
+    return select(model).options(*LOAD_OPTIONS[schema])
+
+
+async def fetch_all(statement):
+    async with ASYNC_DB.session(read_only=g.get("db_read_only", False)) as session:
+        return (await session.execute(statement)).scalars().all()
+
+
+async def get_or_404(model, schema, ident):
+    async with ASYNC_DB.session(read_only=g.get("db_read_only", False)) as session:
+        obj = await session.get(model, ident, options=LOAD_OPTIONS[schema])
+    if obj is None:
+        abort(404)
+    return obj
+
+
+def respond(schema, data, headers=None):
+    # What `blp.response(200, schema)` does with a view's return value
+    return jsonify(schema.dump(data)), 200, headers or {}
+
+
+async def respond_page(schema, statement, columns, args, descending=False):
+    statement, columns, limit = page_query(
+        statement, columns, args.get("limit"), args.get("after"), descending
+    )
+    rows, headers = page_of(await fetch_all(statement), columns, limit)
+    return respond(schema, rows, headers)
+
+
+@async_view("items.Item")
+async def get_item(item_id):
+    item = await get_or_404(ItemModel, ItemSchema, item_id)
+    return respond(ITEM, item, {"ETag": etag(item.version)})
+
+
+@async_view("items.ItemList")
+async def list_items():
+    args = parse_query(ITEM_LIST_ARGS)
+    statement = filter_items(shaped_select(ItemModel, ItemSchema), args)
+    columns = SORTS[args["sort"].lstrip("-")]
+    descending = args["sort"].startswith("-")
+    return await respond_page(ITEMS, statement, columns, args, descending)
+
+
+@async_view("stores.Store")
+async def get_store(store_id):
+    return respond(STORE, await get_or_404(StoreModel, StoreSchema, store_id))
+
+
+@async_view("stores.StoreList")
+async def list_stores():
+    args = parse_query(LIST_ARGS)
+    statement = shaped_select(StoreModel, StoreSchema)
+    return await respond_page(STORES, statement, StoreModel.id, args)
+
+
+@async_view("Tags.TagsInStore")
+async def list_tags_in_store(store_id):
+    async with ASYNC_DB.session(read_only=g.get("db_read_only", False)) as session:
+        if await session.get(StoreModel, store_id) is None:
+            abort(404)
+        statement = shaped_select(TagModel, TagSchema).filter_by(store_id=store_id)
+        tags = (await session.execute(statement)).scalars().all()
+    return respond(TAGS, tags)
+
+
+@async_view("Tags.Tag")
+async def get_tag(tag_id):
+    return respond(TAG, await get_or_404(TagModel, TagSchema, tag_id))
+
+
+@async_view("stats.StoreStats")
+async def get_store_stats(store_id):
+    stats = await get_or_404(StoreStatsModel, StoreStatsSchema, store_id)
+    return respond(STORE_STATS, stats)
+
+
+@async_view("stats.StoreStatsList")
+async def list_store_stats():
+    args = parse_query(LIST_ARGS)
+    statement = shaped_select(StoreStatsModel, StoreStatsSchema)
+    return await respond_page(STORE_STATS_LIST, statement, StoreStatsModel.store_id, args)
+
+
+def wsgi_environ(scope):
+    """The WSGI environ of a bodyless ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("ascii"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        value = value.decode("latin1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+class AsyncApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] == "GET":
+            with self.flask_app.request_context(wsgi_environ(scope)):
+                view = VIEWS.get(request.endpoint)
+                if view is not None and request.args.get("format") != "ndjson":
+                    response = await self.dispatch(view)
+                    return await self.send_response(response, send)
+
+        await self.wsgi(scope, receive, send)
+
+    async def dispatch(self, view):
+        """`Flask.full_dispatch_request` with a coroutine view."""
+        app = self.flask_app
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = await view(**request.view_args)
+        except Exception as error:
+            rv = app.handle_user_exception(error)
+        return app.process_response(app.make_response(rv))
+
+    async def send_response(self, response, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (name.lower().encode("latin1"), value.encode("latin1"))
+                    for name, value in response.headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await ASYNC_DB.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_asgi_app(db_url=None):
+    flask_app = create_app(db_url)
+    ASYNC_DB.init_app(flask_app)
+    return AsyncApp(flask_app)
@@ -0,0 +1,82 @@
+"""
+async_db.py
+
+Async SQLAlchemy engines and sessions for the ASGI app (asgi.py). They point at
+the same primary and replica databases as `db`, through the asyncio driver of
+each dialect, with the same pool settings.
+"""
+
+import random
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url):
+    """The URL of the asyncio driver of `url`'s dialect."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+")[0]
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {dialect} databases.")
+    return f"{ASYNC_DRIVERS[dialect]}://{rest}"
+
+
+def engine_options(app):
+    options = dict(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    # The async engine wraps its own pool class, and asyncpg does not read
+    # libpq's "options" connect argument.
+    options.pop("poolclass", None)
+    connect_args = options.pop("connect_args", {})
+    if "options" in connect_args:
+        timeout = connect_args["options"].split("statement_timeout=")[1]
+        options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        # aiosqlite runs every connection in a thread of its own; keep them
+        # open instead of starting one per session.
+        options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.engine = None
+        self.replicas = []
+        self._sessions = {}
+
+    def init_app(self, app):
+        options = engine_options(app)
+        self.engine = create_async_engine(
+            async_url(app.config["SQLALCHEMY_DATABASE_URI"]), **options
+        )
+        self.replicas = [
+            create_async_engine(async_url(url), **options)
+            for url in app.config["SQLALCHEMY_BINDS"].values()
+        ]
+
+    def session(self, read_only=False):
+        """A new AsyncSession, on a random replica if `read_only` and there are
+        replicas. Loaded objects stay usable after commit, since they cannot
+        be refreshed lazily."""
+        engine = self.engine
+        if read_only and self.replicas:
+            engine = random.choice(self.replicas)
+        if engine not in self._sessions:
+            self._sessions[engine] = sessionmaker(
+                engine, class_=AsyncSession, expire_on_commit=False
+            )
+        return self._sessions[engine]()
+
+    async def dispose(self):
+        for engine in [self.engine, *self.replicas]:
+            if engine is not None:
+                await engine.dispose()
+
+
+ASYNC_DB = AsyncDatabase()
@@ -0,0 +1,16 @@
+"""
+Benchmarks for the Stores REST API.
+
+    python -m benchmarks.bench_api --scale 10x1000x20 --output results/api.json
+    python -m benchmarks.bench_catalogue --rows 1000000
+    python -m benchmarks.bench_micro --output results/micro.json
+    python -m benchmarks.bench_passwords
+    python -m benchmarks.bench_serializers --items 10000
+    python -m benchmarks.bench_serving --concurrency 1,16,64
+    python -m benchmarks.bench_startup --budget 600
+    python -m benchmarks.compare results/before.json results/after.json
+    python -m benchmarks.explain --threshold 1000
+
+Every benchmark can save its results as JSON (tagged with the git commit), and
+`compare` reports the differences between two such files.
+"""
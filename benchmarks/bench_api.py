@@ -0,0 +1,250 @@
+"""
+Throughput and latency of every API route against seeded data.
+
+Seeds a local SQLite (default) or PostgreSQL database with stores x items x tags,
+then calls each route repeatedly and reports requests/s and p50/p95/p99.
+Registration emails are mocked out. By default the app is driven in-process
+through the Flask test client; with --url the same scenarios are sent over HTTP
+to a running server (seeded through --database-url) with --concurrency threads.
+
+    python -m benchmarks.bench_api --scale 10x1000x20 --seconds 2
+    python -m benchmarks.bench_api --database-url postgresql://localhost/bench \\
+        --url http://localhost:5000 --concurrency 8 --output results/api.json
+"""
+
+import argparse
+import itertools
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import print_result, run_for, save_results, summarize
+from benchmarks.seed import parse_scale, seed
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, token=None, json=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = self.client.open(path, method=method, json=json, headers=headers)
+        response.get_data()
+        return response.status_code, response.get_json(silent=True)
+
+
+class HTTPClient:
+    def __init__(self, url):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.local = threading.local()
+        self.requests = requests
+
+    def request(self, method, path, token=None, json=None):
+        if not hasattr(self.local, "session"):
+            self.local.session = self.requests.Session()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        response = self.local.session.request(
+            method, self.url + path, json=json, headers=headers
+        )
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+
+def scenarios(client, app, counts):
+    """(name, callable) pairs, one per route. Each callable makes one request."""
+    from flask_jwt_extended import create_access_token, create_refresh_token
+
+    stores, items_per_store, tags_per_store = counts
+    total_items = stores * items_per_store
+    unique = itertools.count()
+
+    client.request(
+        "POST", "/register", json={"username": "bench", "password": "bench", "email": "bench@x"}
+    )
+    _, tokens = client.request("POST", "/login", json={"username": "bench", "password": "bench"})
+    token = tokens["access_token"]
+
+    # The database is recreated by seed(), so the benchmark user is the first one
+    user_id = 1
+
+    def fresh_token(create_token):
+        # /refresh and /logout revoke the token they are called with
+        with app.app_context():
+            return create_token(identity=user_id)
+
+    item_ids = itertools.cycle(range(1, total_items + 1))
+    store_ids = itertools.cycle(range(1, stores + 1))
+    tag_ids = itertools.cycle(range(1, stores * tags_per_store + 1))
+    middle_page = f"/item?limit=100&after={middle_cursor(total_items)}"
+
+    created_items = []
+    created_stores = []
+
+    def create_item():
+        _, body = client.request(
+            "POST", "/item", token,
+            json={"name": f"bench-item-{next(unique)}", "price": 9.99, "store_id": next(store_ids)},
+        )
+        created_items.append(body["id"])
+
+    def delete_item():
+        # Deletes what the POST /item benchmark created, and stops when all are gone
+        try:
+            client.request("DELETE", f"/item/{created_items.pop()}", token)
+        except IndexError:
+            return False
+
+    def create_store():
+        _, body = client.request("POST", "/store", token, json={"name": f"bench-store-{next(unique)}"})
+        created_stores.append(body["id"])
+
+    def delete_store():
+        # Deletes what the POST /store benchmark created, and stops when all are gone
+        try:
+            client.request("DELETE", f"/store/{created_stores.pop()}", token)
+        except IndexError:
+            return False
+
+    def link_unlink():
+        # Items i of store s are tagged within the same store, so pick a matching tag
+        item_id = next(item_ids)
+        store_id = (item_id - 1) // items_per_store + 1
+        tag_id = (store_id - 1) * tags_per_store + 1 + next(unique) % tags_per_store
+        client.request("POST", f"/item/{item_id}/tag/{tag_id}", token)
+        client.request("DELETE", f"/item/{item_id}/tag/{tag_id}", token)
+
+    def batch_link_unlink():
+        # The first 100 items of a store, linked to and then removed from one of its tags
+        store_id = next(store_ids)
+        first_item = (store_id - 1) * items_per_store + 1
+        tag_id = (store_id - 1) * tags_per_store + 1 + next(unique) % tags_per_store
+        batch = {"item_ids": list(range(first_item, first_item + min(100, items_per_store)))}
+        client.request("POST", f"/tag/{tag_id}/items", token, json=batch)
+        client.request("DELETE", f"/tag/{tag_id}/items", token, json=batch)
+
+    def bulk_create():
+        store_id = next(store_ids)
+        batch = next(unique)
+        client.request(
+            "POST", f"/store/{store_id}/items/bulk", token,
+            json={"items": [{"name": f"bulk-{batch}-{i}", "price": 1.5} for i in range(1000)]},
+        )
+
+    result = [
+        ("GET /item (page of 100)", lambda: client.request("GET", "/item?limit=100")),
+        ("GET /item (middle page)", lambda: client.request("GET", middle_page)),
+        ("GET /item/<id>", lambda: client.request("GET", f"/item/{next(item_ids)}")),
+        ("GET /item?store_id&sort=price", lambda: client.request(
+            "GET", f"/item?limit=100&store_id={next(store_ids)}&sort=price"
+        )),
+        ("GET /item?price_min&price_max", lambda: client.request(
+            "GET", "/item?limit=100&price_min=100&price_max=110"
+        )),
+        ("GET /item?name_prefix&sort=name", lambda: client.request(
+            "GET", f"/item?limit=100&name_prefix=item-{next(store_ids)}-1&sort=name"
+        )),
+        ("GET /item?tag", lambda: client.request("GET", f"/item?limit=100&tag={next(tag_ids)}")),
+        ("GET /item?q", lambda: client.request(
+            "GET", f"/item?limit=100&q=item+{next(unique) % items_per_store + 1}+store+{next(store_ids)}"
+        )),
+        ("GET /store (page of 10)", lambda: client.request("GET", "/store?limit=10")),
+        ("GET /store/<id>", lambda: client.request("GET", f"/store/{next(store_ids)}")),
+        ("GET /store/<id>/tag", lambda: client.request("GET", f"/store/{next(store_ids)}/tag")),
+        ("GET /tag/<id>", lambda: client.request("GET", f"/tag/{next(tag_ids)}")),
+        ("GET /store/<id>/stats", lambda: client.request("GET", f"/store/{next(store_ids)}/stats")),
+        ("GET /stats/stores (page of 10)", lambda: client.request("GET", "/stats/stores?limit=10")),
+        ("GET /user/<id>", lambda: client.request("GET", f"/user/{user_id}")),
+        ("POST /item", create_item),
+        ("PUT /item/<id>", lambda: client.request(
+            "PUT", f"/item/{next(item_ids)}", token, json={"name": f"renamed-{next(unique)}", "price": 5.0}
+        )),
+        ("DELETE /item/<id>", delete_item),
+        ("POST /store/<id>/items/bulk (1000)", bulk_create),
+        ("POST /store", create_store),
+        ("DELETE /store/<id>", delete_store),
+        ("POST+DELETE /item/<id>/tag/<id>", link_unlink),
+        ("POST+DELETE /tag/<id>/items (100)", batch_link_unlink),
+        ("POST /login", lambda: client.request(
+            "POST", "/login", json={"username": "bench", "password": "bench"}
+        )),
+        ("POST /register", lambda: client.request(
+            "POST", "/register",
+            json={"username": f"user-{next(unique)}", "password": "bench", "email": f"{next(unique)}@x"},
+        )),
+        ("POST /refresh", lambda: client.request("POST", "/refresh", fresh_token(create_refresh_token))),
+        ("POST /logout", lambda: client.request("POST", "/logout", fresh_token(create_access_token))),
+    ]
+    if not tags_per_store:
+        result = [s for s in result if "tag" not in s[0]]
+    return result
+
+
+def middle_cursor(total_items):
+    from pagination import encode_cursor
+
+    return encode_cursor([total_items // 2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", default="10x1000x20", help="stores x items per store x tags per store")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--concurrency", type=int, default=1, help="threads, with --url")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent on each route")
+    parser.add_argument("--only", help="only run routes whose name contains this")
+    parser.add_argument("--cache", action="store_true", help="keep the response cache enabled")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    os.environ.setdefault("TASK_QUEUE_EAGER", "1")
+
+    import tasks
+    from app import create_app
+
+    tasks.send_simple_message = lambda *a, **kw: 200
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    app = create_app(database_url)
+    counts = parse_scale(args.scale)
+    with app.app_context():
+        seeded = seed(*counts)
+    print(f"Seeded {seeded}")
+
+    client = HTTPClient(args.url) if args.url else TestClient(app)
+    results = []
+    for name, scenario in scenarios(client, app, counts):
+        if args.only and args.only not in name:
+            continue
+
+        if args.url and args.concurrency > 1:
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                runs = list(pool.map(lambda _: run_for(scenario, args.seconds), range(args.concurrency)))
+            samples = [sample for run, _ in runs for sample in run]
+            elapsed = max(elapsed for _, elapsed in runs)
+        else:
+            samples, elapsed = run_for(scenario, args.seconds)
+
+        result = summarize(name, samples, elapsed)
+        results.append(result)
+        print_result(result)
+
+    save_results(
+        args.output, "api", results,
+        scale=args.scale, database=database_url.split(":")[0], url=args.url,
+        concurrency=args.concurrency, cache=args.cache, seeded=seeded,
+    )
+
+
+if __name__ == "__main__":
+    main()
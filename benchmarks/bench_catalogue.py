@@ -0,0 +1,88 @@
+"""
+Catalogue import and export (catalogue.py): writes a generated CSV file of
+items spread over stores and tags, imports it into an empty database, imports
+it again with upsert, and exports it back as CSV and NDJSON. Reports rows/s and
+the peak resident memory, which should not grow with the number of rows.
+
+    python -m benchmarks.bench_catalogue --rows 1000000 --output results/catalogue.json
+    python -m benchmarks.bench_catalogue --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import csv
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.common import save_results
+
+
+def write_file(path, rows, stores, tags_per_store):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["name", "description", "price", "store", "tags"])
+        for i in range(rows):
+            store = i % stores
+            tags = [f"tag-{store}-{(i + t) % tags_per_store}" for t in range(i % 3)]
+            writer.writerow([f"item-{i}", f"Item number {i}", i % 1000 + 0.99, f"store-{store}", "|".join(tags)])
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--tags-per-store", type=int, default=20)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["METRICS_ENABLED"] = "0"
+    from app import create_app
+    from catalogue import CatalogueImport, export_lines, read_rows
+    from db import db
+
+    directory = tempfile.mkdtemp()
+    database_url = args.database_url or "sqlite:///" + os.path.join(directory, "bench.db")
+    path = os.path.join(directory, "catalogue.csv")
+    write_file(path, args.rows, args.stores, args.tags_per_store)
+
+    app = create_app(database_url)
+    results = []
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        for name, upsert in (("import", False), ("import upsert", True)):
+            start = time.perf_counter()
+            with open(path, newline="") as file:
+                result = CatalogueImport(upsert=upsert, create_missing=True).run(read_rows(file, "csv"))
+            elapsed = time.perf_counter() - start
+            assert result["failed"] == 0, result["errors"]
+            results.append({"name": name, "rows": result["rows"], "seconds": round(elapsed, 2)})
+
+        for format in ("csv", "ndjson"):
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in export_lines(format))
+            elapsed = time.perf_counter() - start
+            results.append(
+                {"name": f"export {format}", "rows": args.rows, "seconds": round(elapsed, 2), "bytes": size}
+            )
+
+    for result in results:
+        result["rows_per_second"] = round(result["rows"] / result["seconds"])
+        print(f"{result['name']:<20} {result['rows']:>9} rows {result['seconds']:>8} s {result['rows_per_second']:>9} rows/s")
+    print(f"Peak RSS {peak_rss_mb()} MB")
+
+    save_results(
+        args.output, "catalogue", results,
+        rows=args.rows, database=database_url.split(":")[0], peak_rss_mb=peak_rss_mb(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Micro-benchmarks for the per-request building blocks: dumping items and stores
+with their response schemas, and the JWT check done by jwt_required_with_doc,
+with the claims and user caches of jwt_cache.py and without them (every
+request verifying the token and reading its user).
+
+    python -m benchmarks.bench_micro --items 10000 --output results/micro.json
+"""
+
+import argparse
+import os
+
+from benchmarks.common import print_result, run_for, save_results, summarize
+
+
+def build_catalogue(items, tags_per_item=2):
+    from models import ItemModel, StoreModel, TagModel
+
+    store = StoreModel(id=1, name="store")
+    tags = [TagModel(id=t, name=f"tag-{t}", store=store) for t in range(1, 21)]
+    catalogue = [
+        ItemModel(
+            id=i,
+            name=f"item-{i}",
+            price=i * 1.25,
+            store=store,
+            tags=[tags[(i + n) % len(tags)] for n in range(tags_per_item)],
+        )
+        for i in range(1, items + 1)
+    ]
+    return store, catalogue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="items per dump")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["METRICS_ENABLED"] = "0"
+    from flask_jwt_extended import create_access_token
+
+    from app import create_app
+    from custom_decorators import jwt_required_with_doc
+    from db import db
+    from jwt_cache import CLAIMS_CACHE, USER_CACHE
+    from models import UserModel
+    from schemas import ItemSchema, StoreSchema
+
+    app = create_app("sqlite://")
+    results = []
+
+    with app.app_context():
+        store, catalogue = build_catalogue(args.items)
+        item_schema = ItemSchema(many=True)
+        store_schema = StoreSchema()
+
+        benchmarks = [
+            (f"ItemSchema(many=True).dump x{args.items}", lambda: item_schema.dump(catalogue)),
+            (f"StoreSchema().dump ({args.items} items)", lambda: store_schema.dump(store)),
+        ]
+
+        db.create_all()
+        user = UserModel(username="bench", email="bench@example.com", password="-")
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=user.id, fresh=True)
+
+    protected = jwt_required_with_doc()(lambda: None)
+    protected_fresh = jwt_required_with_doc(fresh=True)(lambda: None)
+
+    with app.test_request_context(headers={"Authorization": f"Bearer {token}"}):
+        for name, func in benchmarks:
+            result = summarize(name, *run_for(func, args.seconds))
+            results.append(result)
+            print_result(result)
+
+        for cached in (False, True):
+            size = app.config["JWT_CLAIMS_CACHE_SIZE"] if cached else 0
+            CLAIMS_CACHE.size, USER_CACHE.size = size, size
+            CLAIMS_CACHE.clear()
+            USER_CACHE.clear()
+
+            label = "cached" if cached else "uncached"
+            for name, func in [
+                (f"jwt_required_with_doc() {label}", protected),
+                (f"jwt_required_with_doc(fresh=True) {label}", protected_fresh),
+            ]:
+                result = summarize(name, *run_for(func, args.seconds))
+                results.append(result)
+                print_result(result)
+
+    save_results(args.output, "micro", results, items=args.items)
+
+
+if __name__ == "__main__":
+    main()
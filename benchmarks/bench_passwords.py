@@ -0,0 +1,66 @@
+"""
+Logins per second per core for each password hashing configuration.
+
+Measures `verify_and_update`, the work done by /login, on a single core:
+
+    python -m benchmarks.bench_passwords
+    python -m benchmarks.bench_passwords --scheme pbkdf2_sha256:29000 --scheme bcrypt:12
+"""
+
+import argparse
+import time
+
+from benchmarks.common import save_results
+from passwords import crypt_context
+
+DEFAULT_SCHEMES = ["pbkdf2_sha256:29000", "pbkdf2_sha256:100000", "bcrypt:12", "argon2:3"]
+
+
+def bench(scheme, rounds, seconds):
+    settings = {"schemes": (scheme,), "deprecated": "auto"}
+    if rounds:
+        settings[f"{scheme}__default_rounds"] = rounds
+    context = crypt_context(tuple(sorted(settings.items())))
+
+    password_hash = context.hash("correct horse battery staple")
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        context.verify_and_update("correct horse battery staple", password_hash)
+        logins += 1
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scheme": scheme,
+        "rounds": rounds,
+        "logins_per_sec_per_core": round(logins / elapsed, 2),
+        "ms_per_login": round(elapsed / logins * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scheme", action="append", help="scheme:rounds")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    for spec in args.scheme or DEFAULT_SCHEMES:
+        scheme, _, rounds = spec.partition(":")
+        try:
+            result = bench(scheme, int(rounds) if rounds else None, args.seconds)
+        except Exception as e:  # backend not installed (bcrypt, argon2-cffi)
+            print(f"{spec:<24} skipped: {e}")
+            continue
+        results.append(result)
+        print(
+            f"{spec:<24} {result['logins_per_sec_per_core']:>10} logins/s/core"
+            f" {result['ms_per_login']:>10} ms/login"
+        )
+
+    save_results(args.output, "passwords", results, seconds=args.seconds)
+
+
+if __name__ == "__main__":
+    main()
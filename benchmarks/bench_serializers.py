@@ -0,0 +1,92 @@
+"""
+Compiled serializers against marshmallow: checks that every response schema
+produces byte-identical JSON both ways, then times dump + encode of each.
+
+    python -m benchmarks.bench_serializers --items 10000 --output results/serializers.json
+
+Exits with status 1 if any output differs.
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks.bench_micro import build_catalogue
+from benchmarks.common import print_result, run_for, save_results, summarize
+
+
+def add_edge_cases(store, catalogue):
+    """Values whose formatting is easy to get wrong: non-ASCII text, large and
+    small floats, and an item without tags."""
+    from models import ItemModel
+
+    catalogue[0].name = "café ☕"
+    catalogue[1].price = 1e16
+    catalogue[2].price = 0.1 + 0.2
+    catalogue.append(ItemModel(id=len(catalogue) + 1, name="untagged", price=1, store=store, tags=[]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000, help="items per dump")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["METRICS_ENABLED"] = "0"
+    from flask import jsonify
+
+    from app import create_app
+    from schemas import ItemSchema, StoreSchema, TagAndItemSchema, TagSchema
+    from serializers import SERIALIZER, OrjsonEncoder
+
+    app = create_app("sqlite://")
+    store, catalogue = build_catalogue(args.items)
+    add_edge_cases(store, catalogue)
+    tag = catalogue[0].tags[0]
+
+    cases = [
+        (f"ItemSchema(many=True) x{len(catalogue)}", ItemSchema(many=True), catalogue),
+        (f"StoreSchema ({len(catalogue)} items)", StoreSchema(), store),
+        (f"TagSchema ({len(tag.items)} items)", TagSchema(), tag),
+        ("TagAndItemSchema", TagAndItemSchema(), {"message": "ok", "item": catalogue[0], "tag": tag}),
+    ]
+
+    def respond(schema, obj):
+        return jsonify(schema.dump(obj)).get_data()
+
+    results = []
+    mismatches = []
+    json_encoder = app.json_encoder
+    with app.app_context():
+        for name, schema, obj in cases:
+            SERIALIZER.compiled = False
+            expected = respond(schema, obj)
+            SERIALIZER.compiled = True
+            if respond(schema, obj) != expected:
+                mismatches.append(name)
+
+            for label, compiled, encoder in (
+                ("marshmallow", False, json_encoder),
+                ("compiled", True, json_encoder),
+                ("compiled + orjson", True, OrjsonEncoder),
+            ):
+                SERIALIZER.compiled = compiled
+                app.json_encoder = encoder
+                samples, elapsed = run_for(lambda: respond(schema, obj), args.seconds)
+                result = summarize(f"{name} [{label}]", samples, elapsed)
+                results.append(result)
+                print_result(result)
+
+    SERIALIZER.compiled = True
+    app.json_encoder = json_encoder
+    save_results(args.output, "serializers", results, items=args.items)
+
+    for name in mismatches:
+        print(f"{name}: compiled output differs from marshmallow")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Sync (gunicorn) against async (uvicorn + asgi.py) serving, one worker each:
+seeds a database, starts each server on it, sends the public read routes with
+increasing numbers of concurrent clients and reports requests/s, latency
+percentiles and the resident memory of the server processes.
+
+    python -m benchmarks.bench_serving --scale 10x1000x20 --concurrency 1,16,64
+    python -m benchmarks.bench_serving --database-url postgresql://localhost/bench \\
+        --output results/serving.json
+
+The response cache is disabled so that every request reaches the database.
+"""
+
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_api import HTTPClient
+from benchmarks.common import print_result, run_for, save_results, summarize
+from benchmarks.seed import parse_scale, seed
+
+SERVERS = {
+    "gunicorn sync": [
+        "gunicorn", "--workers", "1", "--worker-class", "sync", "app:create_app()",
+    ],
+    "gunicorn gthread": [
+        "gunicorn", "--workers", "1", "--worker-class", "gthread", "--threads", "8",
+        "app:create_app()",
+    ],
+    "uvicorn": [sys.executable, "-m", "uvicorn", "--factory", "asgi:create_asgi_app"],
+}
+
+
+def bind_args(name, port):
+    if name.startswith("gunicorn"):
+        return ["--bind", f"127.0.0.1:{port}"]
+    return ["--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+
+
+def rss_kb(pid):
+    """Resident memory of a process and all of its children, in kB."""
+    total = 0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                total += int(line.split()[1])
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as children:
+            total += sum(rss_kb(int(child)) for child in children.read().split())
+    return total
+
+
+def wait_until_up(client, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The server exited before answering.")
+        try:
+            if client.request("GET", "/store?limit=1")[0] == 200:
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError("The server did not answer in time.")
+
+
+def read_paths(counts):
+    stores, items_per_store, tags_per_store = counts
+    items, tags = stores * items_per_store, stores * tags_per_store
+    paths = itertools.cycle(
+        [
+            "/item?limit=20",
+            f"/item/{items // 2}",
+            f"/item?store_id={stores}&limit=20&sort=-price",
+            f"/tag/{tags // 2}",
+            f"/store/{stores}/stats",
+            "/stats/stores?limit=20",
+        ]
+    )
+    return lambda: next(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", default="10x1000x20", help="stores x items per store x tags per store")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--concurrency", default="1,16,64", help="comma separated numbers of clients")
+    parser.add_argument("--seconds", type=float, default=5.0, help="time spent on each level")
+    parser.add_argument("--servers", default=",".join(SERVERS), help="comma separated, of: " + ", ".join(SERVERS))
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    from app import create_app
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+    counts = parse_scale(args.scale)
+    app = create_app(database_url)
+    with app.app_context():
+        seeded = seed(*counts)
+    print(f"Seeded {seeded}")
+
+    env = dict(os.environ, DATABASE_URL=database_url, METRICS_ENABLED="0")
+    client = HTTPClient(f"http://127.0.0.1:{args.port}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    next_path = read_paths(counts)
+
+    results = []
+    for name in args.servers.split(","):
+        process = subprocess.Popen(
+            SERVERS[name] + bind_args(name, args.port), env=env, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_up(client, process)
+            for concurrency in levels:
+                def scenario():
+                    status, _ = client.request("GET", next_path())
+                    assert status == 200, status
+
+                with ThreadPoolExecutor(concurrency) as pool:
+                    runs = list(pool.map(lambda _: run_for(scenario, args.seconds), range(concurrency)))
+                samples = [sample for run, _ in runs for sample in run]
+                elapsed = max(elapsed for _, elapsed in runs)
+
+                result = summarize(f"{name} x{concurrency}", samples, elapsed)
+                result["rss_mb"] = round(rss_kb(process.pid) / 1024, 1)
+                results.append(result)
+                print_result(result)
+                print(f"{'':<40} rss {result['rss_mb']} MB")
+        finally:
+            process.terminate()
+            process.wait()
+
+    save_results(
+        args.output, "serving", results,
+        scale=args.scale, database=database_url.split(":")[0], seeded=seeded,
+    )
+
+
+if __name__ == "__main__":
+    main()
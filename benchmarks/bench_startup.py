@@ -0,0 +1,115 @@
+"""
+Cold start of the app: time to import `app`, to run `create_app()`, to serve
+the first request (on empty tables) and the first
+/openapi.json, each measured in a fresh interpreter, plus the modules that take
+longest to import.
+
+    python -m benchmarks.bench_startup --runs 5 --budget 600 --output results/startup.json
+
+Exits with status 1 if the median cold start (import + create_app) is over the
+budget in milliseconds, so a slow new import fails loudly.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import save_results
+
+STARTUP = """
+import json, os, time
+os.environ["METRICS_ENABLED"] = "0"
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app("sqlite://")
+created = time.perf_counter()
+from db import db
+with app.app_context():
+    db.create_all()
+client = app.test_client()
+tables_created = time.perf_counter()
+client.get("/tag/1")
+served = time.perf_counter()
+client.get("/openapi.json")
+documented = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - tables_created) * 1000,
+    "first_spec_ms": (documented - served) * 1000,
+}))
+"""
+
+
+def imported_modules(importtime_output):
+    """(cumulative ms, module) of the top-level imports in the output of
+    `python -X importtime`."""
+    modules = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Direct imports of app.py are indented by exactly three spaces
+        if name.startswith("   ") and not name.startswith("    "):
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return modules
+
+
+def slowest_imports(importtime_output, count):
+    """The top-level imports of the app that took longest, leaving out the
+    ones the interpreter makes at startup (site, .pth files)."""
+    baseline = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True
+    )
+    skipped = {module for _, module in imported_modules(baseline.stderr)}
+    modules = [each for each in imported_modules(importtime_output) if each[1] not in skipped]
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, help="fail if import + create_app takes longer, in ms")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+
+    result = {"name": "startup", "runs": args.runs}
+    for key in ("import_ms", "create_app_ms", "first_request_ms", "first_spec_ms"):
+        result[key] = round(statistics.median(run[key] for run in runs), 1)
+    result["cold_start_ms"] = round(
+        statistics.median(run["import_ms"] + run["create_app_ms"] for run in runs), 1
+    )
+
+    print(
+        f"import {result['import_ms']} ms, create_app {result['create_app_ms']} ms,"
+        f" first request {result['first_request_ms']} ms,"
+        f" first /openapi.json {result['first_spec_ms']} ms"
+        f" (median of {args.runs} runs)"
+    )
+    print("Slowest imports (last run, cumulative):")
+    for milliseconds, module in slowest_imports(process.stderr, args.top):
+        print(f"  {milliseconds:>8.1f} ms  {module}")
+
+    save_results(args.output, "startup", [result], budget_ms=args.budget)
+
+    if args.budget is not None and result["cold_start_ms"] > args.budget:
+        print(f"Cold start {result['cold_start_ms']} ms is over the budget of {args.budget} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(name, samples, elapsed):
+    """Latency percentiles in milliseconds and throughput for one benchmark."""
+    if not samples:
+        return {"name": name, "requests": 0}
+    return {
+        "name": name,
+        "requests": len(samples),
+        "throughput": round(len(samples) / elapsed, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def run_for(func, seconds=None, iterations=None):
+    """Calls func repeatedly, for a number of seconds or of iterations, and
+    returns the duration of each call and the total elapsed time. func can
+    return False to stop early when it has nothing left to do."""
+    samples = []
+    start = time.perf_counter()
+    while True:
+        call_start = time.perf_counter()
+        if func() is False:
+            break
+        now = time.perf_counter()
+        samples.append(now - call_start)
+        if iterations is not None and len(samples) >= iterations:
+            break
+        if seconds is not None and now - start >= seconds:
+            break
+    return samples, time.perf_counter() - start
+
+
+def print_result(result):
+    if not result["requests"]:
+        print(f"{result['name']:<40} no requests made")
+        return
+    print(
+        f"{result['name']:<40} {result['throughput']:>10} req/s"
+        f" p50 {result['p50_ms']:>9} ms  p95 {result['p95_ms']:>9} ms"
+        f"  p99 {result['p99_ms']:>9} ms"
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, benchmark, results, **parameters):
+    if not path:
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "benchmark": benchmark,
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "parameters": parameters,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
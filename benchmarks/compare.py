@@ -0,0 +1,51 @@
+"""
+Compares two benchmark result files, e.g. from two commits:
+
+    python -m benchmarks.compare results/before.json results/after.json --threshold 10
+
+Exits with status 1 if any benchmark's p95 latency got worse by more than
+--threshold percent.
+"""
+
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed p95 regression, in %%")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    previous = {result["name"]: result for result in before["results"]}
+    regressions = []
+    for result in after["results"]:
+        old = previous.get(result["name"])
+        if not old or "p95_ms" not in old or "p95_ms" not in result:
+            continue
+
+        p95 = change(old["p95_ms"], result["p95_ms"])
+        throughput = change(old["throughput"], result["throughput"])
+        flag = ""
+        if p95 > args.threshold:
+            regressions.append(result["name"])
+            flag = "  REGRESSION"
+        print(f"{result['name']:<40} p95 {p95:+7.1f}%  throughput {throughput:+7.1f}%{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Runs EXPLAIN on every SQL statement the API routes execute, and fails when one
+of them reads a whole table holding more than --threshold rows.
+
+Each route of bench_api is called once against seeded data while its statements
+are recorded, then every statement is explained with its parameters
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN (FORMAT JSON) on PostgreSQL). A scan
+that a LIMIT stops early without sorting first (reading a page in primary key
+order) is not counted as a full scan. Statements on the temporary tables of a
+connection (such as the change feed's staged deletions) are skipped: they
+only exist on the connection that ran them, and hold one transaction's rows.
+
+    python -m benchmarks.explain --scale 10x1000x20 --threshold 1000
+    python -m benchmarks.explain --database-url postgresql://localhost/bench
+
+The exit status is 1 if any full scan is found, so it can run in CI.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+from sqlalchemy import event, func, inspect, select, table
+
+from benchmarks.bench_api import TestClient, scenarios
+from benchmarks.seed import parse_scale, seed
+from changes import STAGED
+
+EXPLAINED = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+TEMPORARY_TABLES = re.compile(rf"\b(?:{STAGED.name})\b")
+
+
+def explained(statement):
+    return statement.lstrip().upper().startswith(EXPLAINED) and not TEMPORARY_TABLES.search(
+        statement
+    )
+
+
+def record_statements(engine):
+    """Returns a list that collects (statement, parameters) while the listener is set,
+    and the listener itself so it can be removed."""
+    recorded = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if explained(statement):
+            recorded.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    return recorded, before_cursor_execute
+
+
+def sqlite_scans(connection, statement, parameters):
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    details = [row[-1] for row in plan]
+    bounded = " LIMIT " in statement.upper() and not any("TEMP B-TREE" in d for d in details)
+    if bounded:
+        return []
+    return [match.group(1) for match in map(SQLITE_SCAN.match, details) if match]
+
+
+def postgresql_scans(connection, statement, parameters):
+    plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+    scans = []
+
+    def walk(node, bounded):
+        node_type = node["Node Type"]
+        if node_type == "Limit":
+            bounded = True
+        elif node_type in ("Sort", "Aggregate", "Hash", "Materialize"):
+            bounded = False
+        if node_type == "Seq Scan" and not bounded:
+            scans.append(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child, bounded)
+
+    walk(plan[0]["Plan"], False)
+    return scans
+
+
+EXPLAINERS = {"sqlite": sqlite_scans, "postgresql": postgresql_scans}
+
+
+def table_sizes(connection):
+    return {
+        name: connection.execute(select(func.count()).select_from(table(name))).scalar()
+        for name in inspect(connection).get_table_names()
+    }
+
+
+def resolve_table(name, sizes):
+    # Aliases such as "stores_1" (joined eager loads) scan the aliased table
+    while name not in sizes and "_" in name:
+        name = name.rsplit("_", 1)[0]
+    return name
+
+
+def explain_routes(app, client, counts, threshold, only=None):
+    """Calls every route once and returns (route, table, rows, statement) for
+    each full scan of a table larger than `threshold`."""
+    from db import db
+
+    failures = []
+    for name, scenario in scenarios(client, app, counts):
+        if only and only not in name:
+            continue
+
+        with app.app_context():
+            engine = db.engine
+            explain = EXPLAINERS[engine.dialect.name]
+            recorded, listener = record_statements(engine)
+            try:
+                scenario()
+            finally:
+                event.remove(engine, "before_cursor_execute", listener)
+
+            with engine.connect() as connection:
+                sizes = table_sizes(connection)
+                for statement, parameters in recorded:
+                    for scanned in explain(connection, statement, parameters):
+                        scanned = resolve_table(scanned, sizes)
+                        if sizes.get(scanned, 0) > threshold:
+                            failures.append((name, scanned, sizes[scanned], statement))
+
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", default="10x1000x20", help="stores x items per store x tags per store")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--threshold", type=int, default=1000, help="largest table a query may scan")
+    parser.add_argument("--only", help="only explain routes whose name contains this")
+    args = parser.parse_args()
+
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    os.environ.setdefault("TASK_QUEUE_EAGER", "1")
+
+    import tasks
+    from app import create_app
+
+    tasks.send_simple_message = lambda *a, **kw: 200
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "explain.db")
+
+    app = create_app(database_url)
+    counts = parse_scale(args.scale)
+    with app.app_context():
+        seed(*counts)
+
+    failures = explain_routes(app, TestClient(app), counts, args.threshold, args.only)
+
+    for route, scanned, rows, statement in failures:
+        print(f"{route}: full scan of {scanned} ({rows} rows)\n    {' '.join(statement.split())}")
+    if failures:
+        sys.exit(1)
+    print(f"No full scans of tables over {args.threshold} rows.")
+
+
+if __name__ == "__main__":
+    main()
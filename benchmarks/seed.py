@@ -0,0 +1,64 @@
+"""
+Seeds a database with stores x items x tags for the benchmarks, using one
+multi-row INSERT per table so that large scales load quickly.
+"""
+
+import random
+
+from sqlalchemy import insert
+
+from db import db
+from models import ItemModel, ItemsTags, StoreModel, TagModel
+from stats import rebuild_stores, rebuild_tags
+
+
+def parse_scale(scale):
+    """"10x1000x20" -> 10 stores, 1000 items and 20 tags per store."""
+    stores, items, tags = (int(part) for part in scale.split("x"))
+    return stores, items, tags
+
+
+def seed(stores, items_per_store, tags_per_store, tags_per_item=2, batch_size=5000):
+    random.seed(42)
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(
+        insert(StoreModel.__table__),
+        [{"id": s, "name": f"store-{s}"} for s in range(1, stores + 1)],
+    )
+    db.session.execute(
+        insert(TagModel.__table__),
+        [
+            {"id": (s - 1) * tags_per_store + t, "name": f"tag-{s}-{t}", "store_id": s}
+            for s in range(1, stores + 1)
+            for t in range(1, tags_per_store + 1)
+        ],
+    )
+
+    items, links = [], []
+    for s in range(1, stores + 1):
+        store_tags = range((s - 1) * tags_per_store + 1, s * tags_per_store + 1)
+        for i in range(1, items_per_store + 1):
+            item_id = (s - 1) * items_per_store + i
+            items.append(
+                {
+                    "id": item_id,
+                    "name": f"item-{s}-{i}",
+                    "description": f"Item {i} of store {s}",
+                    "price": round(random.uniform(1, 500), 2),
+                    "store_id": s,
+                }
+            )
+            for tag_id in random.sample(store_tags, min(tags_per_item, tags_per_store)):
+                links.append({"item_id": item_id, "tag_id": tag_id})
+
+    for start in range(0, len(items), batch_size):
+        db.session.execute(insert(ItemModel.__table__), items[start : start + batch_size])
+    for start in range(0, len(links), batch_size):
+        db.session.execute(insert(ItemsTags.__table__), links[start : start + batch_size])
+
+    rebuild_stores()
+    rebuild_tags()
+    db.session.commit()
+    return {"stores": stores, "items": len(items), "tags": stores * tags_per_store, "links": len(links)}
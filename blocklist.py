@@ -1,9 +1,140 @@
 """
 blocklist.py
 
-This file just contains the blocklist of the JWT tokens. It will be imported by
+This file contains the blocklist of revoked JWT tokens. It will be imported by
 app and the logout resource so that tokens can be added to the blocklist when the
 user logs out.
+
+Revoked token ids are kept in a backend shared by every worker (Redis or the SQL
+database) until the token expires, since an expired token is rejected anyway.
+The "memory" backend is process-local and only suitable for a single worker.
+
+Each worker keeps a small LRU front in memory: ids it knows are revoked are never
+looked up again, and ids found not revoked are trusted for
+`BLOCKLIST_NEGATIVE_TTL` seconds, which keeps the common case off the network.
 """
 
-BLOCKLIST = set()
\ No newline at end of file
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from jwt_cache import CLAIMS_CACHE
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._entries[jti] = expires_at
+            self._prune()
+
+    def contains(self, jti):
+        expires_at = self._entries.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    def _prune(self):
+        now = time.time()
+        for jti in [jti for jti, exp in self._entries.items() if exp <= now]:
+            del self._entries[jti]
+
+
+class RedisBackend:
+    def __init__(self, url, prefix="blocklist:"):
+        import redis
+
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+
+    def add(self, jti, expires_at):
+        ttl = max(int(expires_at - time.time()), 1)
+        self._redis.set(self._prefix + jti, 1, ex=ttl)
+
+    def contains(self, jti):
+        return self._redis.exists(self._prefix + jti) > 0
+
+
+class SQLBackend:
+    def add(self, jti, expires_at):
+        from db import db
+        from models import RevokedTokenModel
+
+        RevokedTokenModel.query.filter(
+            RevokedTokenModel.expires_at <= int(time.time())
+        ).delete()
+        db.session.merge(RevokedTokenModel(jti=jti, expires_at=int(expires_at)))
+        db.session.commit()
+
+    def contains(self, jti):
+        from models import RevokedTokenModel
+
+        return (
+            RevokedTokenModel.query.filter(
+                RevokedTokenModel.jti == jti,
+                RevokedTokenModel.expires_at > int(time.time()),
+            ).first()
+            is not None
+        )
+
+
+class Blocklist:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.cache_size = 10000
+        self.negative_ttl = 0
+        self.default_ttl = 30 * 24 * 3600
+        self._cache = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        backend = app.config.get("BLOCKLIST_BACKEND", "memory")
+        if backend == "redis":
+            self.backend = RedisBackend(app.config["BLOCKLIST_REDIS_URL"])
+        elif backend == "sql":
+            self.backend = SQLBackend()
+        elif backend == "memory":
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f"Unknown blocklist backend: {backend}")
+
+        self.cache_size = app.config.get("BLOCKLIST_CACHE_SIZE", self.cache_size)
+        self.negative_ttl = app.config.get("BLOCKLIST_NEGATIVE_TTL", self.negative_ttl)
+        self._cache.clear()
+
+    def add(self, jti, expires_at=None):
+        """Revokes a token until `expires_at` (epoch seconds, the `exp` claim)."""
+        if expires_at is None:
+            expires_at = time.time() + self.default_ttl
+
+        self.backend.add(jti, expires_at)
+        self._remember(jti, (True, expires_at))
+        CLAIMS_CACHE.revoke(jti)
+
+    def __contains__(self, jti):
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(jti)
+            if entry is not None:
+                self._cache.move_to_end(jti)
+
+        if entry is not None:
+            revoked, valid_until = entry
+            if now < valid_until:
+                return revoked
+
+        revoked = self.backend.contains(jti)
+        if not revoked and self.negative_ttl > 0:
+            self._remember(jti, (False, now + self.negative_ttl))
+        return revoked
+
+    def _remember(self, jti, entry):
+        with self._lock:
+            self._cache[jti] = entry
+            self._cache.move_to_end(jti)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+
+BLOCKLIST = Blocklist()
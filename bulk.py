@@ -0,0 +1,226 @@
+"""
+bulk.py
+
+Set-based writes of many items at once for the bulk endpoints. Rows are
+validated with `ItemSchema(many=True)` and written in batches of
+`BULK_BATCH_SIZE` with one multi-row statement each, instead of one ORM flush
+per item. Upserts use `INSERT ... ON CONFLICT (name) DO UPDATE` on PostgreSQL
+and SQLite.
+"""
+
+from flask import current_app
+from marshmallow import ValidationError
+from sqlalchemy import delete, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+from changes import record_changed, record_deleted
+from db import db
+from models import ItemModel, ItemsTags
+from reference_cache import REFERENCE_CACHE
+from schemas import ItemSchema
+from stats import items_changed, links_of_items, tags_changed
+
+ON_CONFLICT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def batches(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start : start + size]
+
+
+def write_items(rows, upsert=False, atomic=True, store_id=None):
+    """Validates and inserts (or upserts by name) a list of item dicts.
+
+    Returns one result per input row, in order. With `atomic` everything is
+    committed at once and any database error fails the whole request; otherwise
+    each batch is committed on its own and a failing batch only fails its rows.
+    """
+    if store_id is not None:
+        rows = [{**row, "store_id": store_id} if isinstance(row, dict) else row for row in rows]
+
+    try:
+        loaded = ItemSchema(many=True).load(rows)
+        errors = {}
+    except ValidationError as err:
+        loaded, errors = err.valid_data, err.messages
+
+    results = [{"index": index} for index in range(len(rows))]
+    for index, messages in errors.items():
+        results[index].update(status="error", errors=messages)
+
+    store_ids = {data["store_id"] for index, data in enumerate(loaded) if index not in errors}
+    known_stores = set(REFERENCE_CACHE.stores.get_many(store_ids, cached=False))
+
+    seen_names = set()
+    pending = []
+    for index, data in enumerate(loaded):
+        if index in errors:
+            continue
+        if data["store_id"] not in known_stores:
+            fail(results[index], {"store_id": ["Store not found."]})
+        elif data["name"] in seen_names:
+            fail(results[index], {"name": ["Duplicate name in request."]})
+        else:
+            seen_names.add(data["name"])
+            pending.append((index, data))
+
+    for batch in batches(pending, current_app.config["BULK_BATCH_SIZE"]):
+        try:
+            write_batch(batch, results, upsert)
+            if not atomic:
+                db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            if atomic:
+                raise
+            for index, _ in batch:
+                if results[index].get("status") != "error":
+                    fail(results[index], {"_schema": ["An Error occurred while writing the item."]})
+
+    if atomic:
+        db.session.commit()
+
+    return summarize(results)
+
+
+def write_batch(batch, results, upsert):
+    names = [data["name"] for _, data in batch]
+    existing = {
+        name: (store_id, price)
+        for name, store_id, price in db.session.execute(
+            select(ItemModel.name, ItemModel.store_id, ItemModel.price).where(
+                ItemModel.name.in_(names)
+            )
+        )
+    }
+
+    if upsert:
+        values = [data for _, data in batch]
+    else:
+        values = []
+        for index, data in batch:
+            if data["name"] in existing:
+                fail(results[index], {"name": ["An item with that name already exists."]})
+            else:
+                values.append(data)
+
+    if not values:
+        return
+
+    dialect_insert = ON_CONFLICT_INSERTS.get(db.engine.dialect.name)
+    if upsert and dialect_insert is not None:
+        statement = dialect_insert(ItemModel.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=[ItemModel.name],
+            set_={"price": statement.excluded.price, "version": ItemModel.version + 1},
+        )
+        db.session.execute(statement, values)
+    else:
+        updates = [data for data in values if data["name"] in existing]
+        inserts = [data for data in values if data["name"] not in existing]
+        if inserts:
+            db.session.execute(insert(ItemModel.__table__), inserts)
+        for data in updates:
+            db.session.execute(
+                ItemModel.__table__.update()
+                .where(ItemModel.name == data["name"])
+                .values(price=data["price"], version=ItemModel.version + 1)
+            )
+
+    # An upsert keeps the store of an existing item and only changes its price
+    deltas = {}
+    for data in values:
+        if data["name"] in existing:
+            store_id, price = existing[data["name"]]
+            count, total = deltas.get(store_id, (0, 0.0))
+            deltas[store_id] = (count, total + data["price"] - price)
+        else:
+            count, total = deltas.get(data["store_id"], (0, 0.0))
+            deltas[data["store_id"]] = (count + 1, total + data["price"])
+    items_changed(deltas)
+
+    ids = dict(
+        db.session.execute(
+            select(ItemModel.name, ItemModel.id).where(
+                ItemModel.name.in_([data["name"] for data in values])
+            )
+        ).all()
+    )
+    record_changed("item", [ids[data["name"]] for data in values])
+    for index, data in batch:
+        if "status" not in results[index]:
+            results[index].update(
+                id=ids[data["name"]],
+                status="updated" if data["name"] in existing else "created",
+            )
+
+
+def delete_items(ids, atomic=True):
+    """Deletes items (and their tag links) by ID, one statement per table and batch."""
+    results = [{"index": index, "id": item_id} for index, item_id in enumerate(ids)]
+    positions = {}
+    for index, item_id in enumerate(ids):
+        if item_id in positions:
+            fail(results[index], {"id": ["Duplicate id in request."]})
+        else:
+            positions[item_id] = index
+
+    for batch in batches(list(positions), current_app.config["BULK_BATCH_SIZE"]):
+        try:
+            rows = db.session.execute(
+                select(ItemModel.id, ItemModel.store_id, ItemModel.price).where(
+                    ItemModel.id.in_(batch)
+                )
+            ).all()
+            found = {item_id for item_id, _, _ in rows}
+            links = links_of_items(found)
+            db.session.execute(delete(ItemsTags).where(ItemsTags.item_id.in_(found)))
+            db.session.execute(delete(ItemModel).where(ItemModel.id.in_(found)))
+            record_deleted("item", found)
+
+            deltas = {}
+            for _, store_id, price in rows:
+                count, total = deltas.get(store_id, (0, 0.0))
+                deltas[store_id] = (count - 1, total - price)
+            items_changed(deltas)
+            tags_changed({tag_id: -count for tag_id, count in links.items()})
+            if not atomic:
+                db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            if atomic:
+                raise
+            for item_id in batch:
+                error = {"_schema": ["An Error occurred while deleting the item."]}
+                fail(results[positions[item_id]], error)
+            continue
+
+        for item_id in batch:
+            if item_id in found:
+                results[positions[item_id]]["status"] = "deleted"
+            else:
+                fail(results[positions[item_id]], {"id": ["Item not found."]})
+
+    if atomic:
+        db.session.commit()
+
+    return summarize(results)
+
+
+def fail(result, errors):
+    result.update(status="error", errors=errors)
+
+
+def summarize(results):
+    counts = {"created": 0, "updated": 0, "deleted": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] += 1
+
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "deleted": counts["deleted"],
+        "failed": counts["error"],
+        "results": results,
+    }
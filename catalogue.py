@@ -0,0 +1,484 @@
+"""
+catalogue.py
+
+Import and export of the whole catalogue as CSV or NDJSON files, with
+`flask catalogue import/export` and the /catalogue endpoints.
+
+A row is one item: its name, description, price, store and tags, with the
+store and tags given by name. In CSV the tags of an item are separated by "|".
+
+Imports read the file incrementally, in batches of `CATALOGUE_BATCH_SIZE` rows
+that are each validated, written and committed on their own. New items are
+loaded with COPY on PostgreSQL and with one executemany INSERT elsewhere;
+with `upsert` the items whose name exists in the same store get their price
+and (if given) description updated by one executemany UPDATE. Tags are only ever
+added to an item. The store and tag stats are adjusted by deltas, as in bulk.py.
+
+Stores and tags are resolved by name from lookup tables read once at the
+start. With `create_missing` unknown ones are created, otherwise their rows
+fail. Memory use depends on the batch size and on the number of stores and
+tags, not on the size of the file, and only the first `CATALOGUE_MAX_ERRORS`
+row errors are kept.
+
+Exports stream the items with their store and tags from a server-side cursor.
+"""
+
+import csv
+import io
+import json
+import math
+import os
+import sys
+import time
+from contextlib import nullcontext
+from itertools import groupby
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from marshmallow import ValidationError
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from changes import record_changed
+from db import db
+from models import ItemModel, ItemsTags, StoreModel, TagModel
+from schemas import CatalogueRowSchema
+from stats import items_changed, store_created, tag_created, tags_changed
+
+COLUMNS = ["name", "description", "price", "store", "tags"]
+MIMETYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+TAG_SEPARATOR = "|"
+COUNTS = ["created", "updated", "failed", "linked", "stores_created", "tags_created"]
+
+catalogue_cli = AppGroup("catalogue", help="Import and export the catalogue as CSV or NDJSON.")
+
+
+def read_rows(lines, format):
+    """(line number, row dict) of a CSV or NDJSON file, given as an iterable
+    of text lines. Rows that cannot be parsed are yielded as a string error."""
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            row = {key: value for key, value in row.items() if key is not None}
+            if row.get("description") == "":
+                row["description"] = None
+            if "tags" in row:
+                row["tags"] = [tag for tag in (row["tags"] or "").split(TAG_SEPARATOR) if tag]
+            yield reader.line_num, row
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, "Not valid JSON."
+            continue
+        yield number, row if isinstance(row, dict) else "Not a JSON object."
+
+
+def plain_name(value):
+    return type(value) is str and 0 < len(value) <= 80
+
+
+def plain_row(row):
+    """What `CatalogueRowSchema` loads from a row that is plainly valid, built
+    without marshmallow, which takes most of the time of an import; None for
+    any other row, which the schema then loads or explains."""
+    price = row.get("price")
+    if type(price) is str:
+        try:
+            price = float(price)
+        except ValueError:
+            return None
+    elif type(price) is int or type(price) is float:
+        price = float(price)
+    else:
+        return None
+    tags = row.get("tags", [])
+    description = row.get("description")
+    if not (
+        math.isfinite(price)
+        and plain_name(row.get("name"))
+        and plain_name(row.get("store"))
+        and (description is None or type(description) is str)
+        and type(tags) is list
+        and all(plain_name(tag) for tag in tags)
+    ):
+        return None
+
+    data = {"name": row["name"], "price": price, "store": row["store"], "tags": tags}
+    if "description" in row:
+        data["description"] = description
+    return data
+
+
+class CatalogueImport:
+    def __init__(self, upsert=False, create_missing=False, progress=None):
+        self.upsert = upsert
+        self.create_missing = create_missing
+        self.progress = progress
+        self.batch_size = current_app.config["CATALOGUE_BATCH_SIZE"]
+        self.max_errors = current_app.config["CATALOGUE_MAX_ERRORS"]
+        self.schema = CatalogueRowSchema()
+        self.result = {
+            "rows": 0, "created": 0, "updated": 0, "failed": 0, "linked": 0,
+            "stores_created": 0, "tags_created": 0, "errors": [],
+        }
+        self.load_lookups()
+
+    def load_lookups(self):
+        self.stores = dict(db.session.execute(select(StoreModel.name, StoreModel.id)).all())
+        self.tags = {
+            name: (tag_id, store_id)
+            for name, tag_id, store_id in db.session.execute(
+                select(TagModel.name, TagModel.id, TagModel.store_id)
+            )
+        }
+
+    def run(self, rows):
+        """Imports an iterable of (line number, row) and returns the counts."""
+        for batch in batches_of(rows, self.batch_size):
+            before = {key: self.result[key] for key in COUNTS}
+            errors = len(self.result["errors"])
+            self.result["rows"] += len(batch)
+            try:
+                self.write_batch(batch)
+                db.session.commit()
+            except SQLAlchemyError as error:
+                db.session.rollback()
+                # The whole batch failed, including the stores and tags it created
+                self.result.update(before)
+                del self.result["errors"][errors:]
+                self.load_lookups()
+                for number, _ in batch:
+                    self.fail(number, {"_schema": [f"Database error: {type(error).__name__}"]})
+            if self.progress is not None:
+                self.progress(self.result)
+        self.result["errors"].sort(key=lambda error: error["line"])
+        return self.result
+
+    def fail(self, number, errors):
+        self.result["failed"] += 1
+        if len(self.result["errors"]) < self.max_errors:
+            self.result["errors"].append({"line": number, "errors": errors})
+
+    def write_batch(self, batch):
+        valid = []
+        names = set()
+        for number, row in batch:
+            if isinstance(row, str):
+                self.fail(number, {"_schema": [row]})
+                continue
+            data = plain_row(row)
+            if data is None:
+                try:
+                    data = self.schema.load(row, unknown="exclude")
+                except ValidationError as error:
+                    self.fail(number, error.messages)
+                    continue
+            if data["name"] in names:
+                self.fail(number, {"name": ["Duplicate name in the batch."]})
+                continue
+            names.add(data["name"])
+            valid.append((number, data))
+
+        valid = self.resolve(valid)
+        if not valid:
+            return
+
+        existing = {
+            name: (item_id, store_id, price)
+            for name, item_id, store_id, price in db.session.execute(
+                select(ItemModel.name, ItemModel.id, ItemModel.store_id, ItemModel.price).where(
+                    ItemModel.name.in_([data["name"] for _, data in valid])
+                )
+            )
+        }
+
+        inserts, updates, deltas = [], [], {}
+        for number, data in valid:
+            if data["name"] not in existing:
+                inserts.append(data)
+                count, total = deltas.get(data["store_id"], (0, 0.0))
+                deltas[data["store_id"]] = (count + 1, total + data["price"])
+            elif not self.upsert:
+                self.fail(number, {"name": ["An item with that name already exists."]})
+            elif existing[data["name"]][1] != data["store_id"]:
+                self.fail(number, {"store": ["The item exists in another store."]})
+            else:
+                updates.append(data)
+                _, store_id, price = existing[data["name"]]
+                count, total = deltas.get(store_id, (0, 0.0))
+                deltas[store_id] = (count, total + data["price"] - price)
+
+        if inserts:
+            load_items(inserts)
+        if updates:
+            items = ItemModel.__table__
+            db.session.execute(
+                update(items)
+                .where(items.c.name == bindparam("item_name"))
+                .values(
+                    price=bindparam("item_price"),
+                    description=func.coalesce(bindparam("item_description"), items.c.description),
+                    version=items.c.version + 1,
+                ),
+                [
+                    {
+                        "item_name": data["name"],
+                        "item_price": data["price"],
+                        "item_description": data.get("description"),
+                    }
+                    for data in updates
+                ],
+            )
+        items_changed(deltas)
+
+        written = inserts + updates
+        ids = dict(
+            db.session.execute(
+                select(ItemModel.name, ItemModel.id).where(
+                    ItemModel.name.in_([data["name"] for data in written])
+                )
+            ).all()
+        )
+        record_changed("item", ids.values())
+        self.link_tags(written, ids)
+        self.result["created"] += len(inserts)
+        self.result["updated"] += len(updates)
+
+    def resolve(self, valid):
+        """Sets the store_id and tag_ids of the rows from the lookup tables,
+        creating the missing stores and tags if asked to."""
+        resolved = []
+        for number, data in valid:
+            store_id = self.stores.get(data["store"])
+            if store_id is None:
+                if not self.create_missing:
+                    self.fail(number, {"store": ["Store not found."]})
+                    continue
+                store_id = self.create_store(data["store"])
+
+            tag_ids, errors = [], []
+            for name in dict.fromkeys(data["tags"]):
+                tag_id, tag_store_id = self.tags.get(name, (None, None))
+                if tag_id is None:
+                    if not self.create_missing:
+                        errors.append(f"Tag {name} not found.")
+                        continue
+                    tag_id, tag_store_id = self.create_tag(name, store_id), store_id
+                if tag_store_id != store_id:
+                    errors.append(f"Tag {name} belongs to another store.")
+                    continue
+                tag_ids.append(tag_id)
+            if errors:
+                self.fail(number, {"tags": errors})
+                continue
+
+            data["store_id"], data["tag_ids"] = store_id, tag_ids
+            resolved.append((number, data))
+        return resolved
+
+    def create_store(self, name):
+        store_id = db.session.execute(
+            insert(StoreModel.__table__).values(name=name)
+        ).inserted_primary_key[0]
+        store_created(store_id)
+        record_changed("store", [store_id])
+        self.stores[name] = store_id
+        self.result["stores_created"] += 1
+        return store_id
+
+    def create_tag(self, name, store_id):
+        tag_id = db.session.execute(
+            insert(TagModel.__table__).values(name=name, store_id=store_id)
+        ).inserted_primary_key[0]
+        tag_created(tag_id, store_id)
+        record_changed("tag", [tag_id])
+        self.tags[name] = (tag_id, store_id)
+        self.result["tags_created"] += 1
+        return tag_id
+
+    def link_tags(self, written, ids):
+        wanted = [data for data in written if data["tag_ids"]]
+        if not wanted:
+            return
+        linked = set(
+            db.session.execute(
+                select(ItemsTags.item_id, ItemsTags.tag_id).where(
+                    ItemsTags.item_id.in_([ids[data["name"]] for data in wanted])
+                )
+            ).all()
+        )
+        pairs = [
+            (ids[data["name"]], tag_id)
+            for data in wanted
+            for tag_id in data["tag_ids"]
+            if (ids[data["name"]], tag_id) not in linked
+        ]
+        if not pairs:
+            return
+
+        load_rows(ItemsTags.__table__, ["item_id", "tag_id"], pairs)
+        deltas = {}
+        for _, tag_id in pairs:
+            deltas[tag_id] = deltas.get(tag_id, 0) + 1
+        tags_changed(deltas)
+        self.result["linked"] += len(pairs)
+
+
+def batches_of(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_items(rows):
+    load_rows(
+        ItemModel.__table__,
+        ["name", "description", "price", "store_id"],
+        [(data["name"], data.get("description"), data["price"], data["store_id"]) for data in rows],
+    )
+
+
+def load_rows(table, columns, rows):
+    """Inserts tuples of values into the columns of a table: COPY on
+    PostgreSQL, one executemany INSERT elsewhere."""
+    if db.engine.dialect.name != "postgresql":
+        db.session.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+        return
+
+    db.session.flush()
+    buffer = io.StringIO()
+    # Unquoted empty fields are NULL in COPY's CSV format
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def export_statement(store_id=None):
+    """One row per (item, tag), ordered by item, with the item's store."""
+    statement = (
+        select(
+            ItemModel.id,
+            ItemModel.name,
+            ItemModel.description,
+            ItemModel.price,
+            StoreModel.name,
+            TagModel.name,
+        )
+        .select_from(ItemModel)
+        .join(StoreModel, StoreModel.id == ItemModel.store_id)
+        .outerjoin(ItemsTags, ItemsTags.item_id == ItemModel.id)
+        .outerjoin(TagModel, TagModel.id == ItemsTags.tag_id)
+        .order_by(ItemModel.id, TagModel.name)
+    )
+    if store_id is not None:
+        statement = statement.where(ItemModel.store_id == store_id)
+    return statement
+
+
+def export_rows(store_id=None):
+    """Row dicts of the catalogue, read from a server-side cursor."""
+    result = db.session.execute(
+        export_statement(store_id).execution_options(stream_results=True)
+    ).yield_per(current_app.config["STREAM_CHUNK_SIZE"])
+
+    for _, rows in groupby(result, key=lambda row: row[0]):
+        rows = list(rows)
+        _, name, description, price, store, _ = rows[0]
+        yield {
+            "name": name,
+            "description": description,
+            "price": price,
+            "store": store,
+            "tags": [row[5] for row in rows if row[5] is not None],
+        }
+
+
+def export_lines(format, store_id=None):
+    """Text chunks of the exported file, `STREAM_CHUNK_SIZE` rows each."""
+    size = current_app.config["STREAM_CHUNK_SIZE"]
+    if format == "ndjson":
+        for rows in batches_of(export_rows(store_id), size):
+            yield "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in batches_of(export_rows(store_id), size):
+        for row in rows:
+            writer.writerow(
+                [row["name"], row["description"], row["price"], row["store"], TAG_SEPARATOR.join(row["tags"])]
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def open_path(path, mode):
+    """The file at `path`, or stdin/stdout for "-"."""
+    if path == "-":
+        return nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def file_format(path, format):
+    if format:
+        return format
+    return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "ndjson"
+
+
+@catalogue_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option("--format", type=click.Choice(list(MIMETYPES)), help="Read from the file extension by default.")
+@click.option("--upsert", is_flag=True, help="Update the items whose name already exists.")
+@click.option("--create-missing", is_flag=True, help="Create the stores and tags that do not exist.")
+def import_command(path, format, upsert, create_missing):
+    """Imports a CSV or NDJSON catalogue file ("-" for stdin)."""
+    start = time.monotonic()
+
+    def progress(result):
+        rate = result["rows"] / max(time.monotonic() - start, 1e-9)
+        click.echo(
+            f"{result['rows']} rows: {result['created']} created, {result['updated']} updated,"
+            f" {result['failed']} failed ({rate:.0f} rows/s)",
+            err=True,
+        )
+
+    with open_path(path, "r") as file:
+        result = CatalogueImport(upsert, create_missing, progress).run(
+            read_rows(file, file_format(path, format))
+        )
+
+    for error in result["errors"]:
+        click.echo(f"line {error['line']}: {json.dumps(error['errors'])}", err=True)
+    click.echo(json.dumps({key: value for key, value in result.items() if key != "errors"}))
+
+
+@catalogue_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, allow_dash=True), default="-")
+@click.option("--format", type=click.Choice(list(MIMETYPES)), help="Read from the file extension by default.")
+@click.option("--store-id", type=int, help="Only the items of this store.")
+def export_command(path, format, store_id):
+    """Exports the catalogue as CSV or NDJSON (to stdout by default)."""
+    with open_path(path, "w") as file:
+        for chunk in export_lines(file_format(path, format), store_id):
+            file.write(chunk)
@@ -0,0 +1,325 @@
+"""
+changes.py
+
+Change feed of the items, stores and tags, so that downstream caches and search
+indexes fetch what changed since they last looked instead of every list in
+full.
+
+Write handlers call `record_changed` and `record_deleted` with the ids they
+wrote, in the same transaction, like the stats functions. Set-based deletes
+call `record_deleted_rows` with the statement selecting the ids instead, which
+copies them with one INSERT ... SELECT into a temporary table of the connection
+without loading them. The entries are kept in the session (or that table) and
+written to the `changes` table (a transactional outbox) as
+the last statements before the commit, so an entry exists if and only if its
+write committed. Each entry gets a `seq`. On PostgreSQL the outbox writes take a
+transaction-level advisory lock, so seqs become visible in commit order and a
+reader that has seen seq N never later finds an entry below N; SQLite has a
+single writer anyway.
+
+`GET /changes?since=<seq>` returns the entries after `since` in order, each with
+the current representation of its row (none for deletions). With `wait` the
+request blocks until there are entries or the time is up (long-poll), and with
+`Accept: text/event-stream` the entries are streamed as Server-Sent Events.
+Commits in the same worker wake the waiting readers at once; the other workers'
+commits are seen within `CHANGES_POLL_INTERVAL` seconds. The feed needs a JWT,
+as it lists every write, deletions included.
+
+A waiting request holds a gunicorn worker thread, so waits are capped at
+`CHANGES_MAX_WAIT` (10) seconds and streams end after
+`CHANGES_SSE_MAX_DURATION` (15), well under `GUNICORN_TIMEOUT`; clients poll
+or reconnect from `last_seq`. Size `GUNICORN_THREADS` for the readers waiting
+at once.
+
+`flask changes compact` removes the entries superseded by a later one for the
+same row, which no consumer needs, and with `--deleted-older-than DAYS` the
+deletion entries older than that. Consumers behind the last deletion entry
+removed get 410 and have to sync in full again.
+"""
+
+import json
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    event,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    true,
+)
+from sqlalchemy.orm import joinedload
+
+from db import db
+from models import ChangeCompactionModel, ChangeModel, ItemModel, StoreModel, TagModel
+from query_shaping import LOAD_OPTIONS
+from schemas import ItemSchema, PlainStoreSchema, TagSchema
+
+# Arbitrary key of the PostgreSQL advisory lock serializing the outbox writes
+LOCK_KEY = 0x6368616E676573
+
+# What a change entry carries for each kind of row
+ENTITIES = {
+    "item": (ItemModel, LOAD_OPTIONS[ItemSchema], ItemSchema()),
+    "store": (StoreModel, (), PlainStoreSchema()),
+    "tag": (TagModel, (joinedload(TagModel.store),), TagSchema(only=("id", "name", "store"))),
+}
+
+# Deletion entries staged by `record_deleted_rows`, per connection. Not in the
+# app's metadata: it is created on demand and never migrated.
+STAGED = Table(
+    "changes_staged",
+    MetaData(),
+    Column("entity", String(16), nullable=False),
+    Column("entity_id", Integer, nullable=False),
+)
+CREATE_STAGED = text(
+    "CREATE TEMPORARY TABLE IF NOT EXISTS changes_staged "
+    "(entity VARCHAR(16) NOT NULL, entity_id INTEGER NOT NULL)"
+)
+
+changes_cli = AppGroup("changes", help="Change feed of items, stores and tags.")
+
+
+def record_changed(entity, ids):
+    """Adds the rows to the feed as created or updated."""
+    _record(entity, ids, False)
+
+
+def record_deleted(entity, ids):
+    _record(entity, ids, True)
+
+
+def record_deleted_rows(entity, ids):
+    """`record_deleted` of the ids selected by the `ids` statement. Call it
+    before the statement that deletes them."""
+    if not db.session.info.get("changes_staged"):
+        db.session.execute(CREATE_STAGED)
+        db.session.info["changes_staged"] = True
+    selected = ids.subquery()
+    db.session.execute(
+        insert(STAGED).from_select(["entity", "entity_id"], select(literal(entity), *selected.c))
+    )
+
+
+def _record(entity, ids, deleted):
+    pending = db.session.info.setdefault("changes", {})
+    for entity_id in ids:
+        # Only the last write of a row in the transaction counts
+        pending.pop((entity, entity_id), None)
+        pending[(entity, entity_id)] = deleted
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.poll_interval = 1.0
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def init_app(self, app):
+        self.poll_interval = app.config.get("CHANGES_POLL_INTERVAL", self.poll_interval)
+
+        if not event.contains(db.session, "before_commit", _write_pending):
+            event.listen(db.session, "before_commit", _write_pending)
+            event.listen(db.session, "after_commit", _notify_on_commit)
+            event.listen(db.session, "after_rollback", _drop_pending)
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def head(self):
+        """The seq of the newest entry. Not below the horizon: compaction may
+        have removed the newest entries, and reading from there must work."""
+        newest = db.session.execute(select(func.max(ChangeModel.seq))).scalar() or 0
+        return max(newest, self.horizon())
+
+    def horizon(self):
+        """The seq below which deletion entries may have been compacted away."""
+        return (
+            db.session.execute(select(func.max(ChangeCompactionModel.compacted_through))).scalar()
+            or 0
+        )
+
+    def read(self, since, limit, entities=None):
+        """The entries after `since`, with their rows dumped, and the seq to
+        read from next."""
+        statement = (
+            select(ChangeModel).where(ChangeModel.seq > since).order_by(ChangeModel.seq).limit(limit)
+        )
+        if entities:
+            statement = statement.where(ChangeModel.entity.in_(entities))
+        changes = db.session.execute(statement).scalars().all()
+
+        data = {}
+        for entity, (model, options, schema) in ENTITIES.items():
+            ids = {c.entity_id for c in changes if c.entity == entity and not c.deleted}
+            if ids:
+                for row in model.query.options(*options).filter(model.id.in_(ids)):
+                    data[entity, row.id] = schema.dump(row)
+
+        entries = [
+            {
+                "seq": change.seq,
+                "entity": change.entity,
+                "id": change.entity_id,
+                "deleted": change.deleted,
+                "changed_at": change.changed_at,
+                # None if the row was deleted since; its deletion comes later
+                "data": data.get((change.entity, change.entity_id)),
+            }
+            for change in changes
+        ]
+        return entries, changes[-1].seq if changes else since
+
+    def wait(self, since, limit, timeout, entities=None):
+        """`read`, blocking for up to `timeout` seconds until there is
+        something to return."""
+        deadline = time.monotonic() + timeout
+        while True:
+            generation = self._generation
+            entries, last_seq = self.read(since, limit, entities)
+            # Ends the transaction, so that the next read sees new commits
+            db.session.close()
+            remaining = deadline - time.monotonic()
+            if entries or remaining <= 0:
+                return entries, last_seq
+
+            with self._condition:
+                if generation == self._generation:
+                    self._condition.wait(min(self.poll_interval, remaining))
+
+    def stream(self, since, entities=None):
+        """Server-Sent Events of the entries after `since`, with a comment
+        every `CHANGES_SSE_HEARTBEAT` seconds while there are none. Ends after
+        `CHANGES_SSE_MAX_DURATION` seconds; EventSource clients reconnect with
+        the Last-Event-ID."""
+        config = current_app.config
+        limit = config["PAGINATION_MAX_LIMIT"]
+        ends = time.monotonic() + config["CHANGES_SSE_MAX_DURATION"]
+
+        yield f"retry: {int(self.poll_interval * 1000)}\n\n"
+        while time.monotonic() < ends:
+            timeout = min(config["CHANGES_SSE_HEARTBEAT"], ends - time.monotonic())
+            entries, since = self.wait(since, limit, timeout, entities)
+            if not entries:
+                yield ": keep-alive\n\n"
+            for entry in entries:
+                yield f"id: {entry['seq']}\ndata: {json.dumps(entry, separators=(',', ':'))}\n\n"
+
+    def compact(self, deleted_before=None):
+        """Deletes the superseded entries, and the deletion entries older than
+        the `deleted_before` timestamp, one chunk of seqs per transaction.
+        Returns the number of entries deleted."""
+        size = current_app.config["CHANGES_COMPACT_CHUNK_SIZE"]
+        changes = ChangeModel.__table__
+        later = changes.alias("later")
+        superseded = (
+            select(later.c.seq)
+            .where(
+                later.c.entity == changes.c.entity,
+                later.c.entity_id == changes.c.entity_id,
+                later.c.seq > changes.c.seq,
+            )
+            .exists()
+        )
+
+        removed = 0
+        head = self.head()
+        for start in range(0, head, size):
+            in_chunk = changes.c.seq.between(start + 1, start + size)
+            removed += db.session.execute(delete(changes).where(in_chunk, superseded)).rowcount
+            db.session.commit()
+
+        if deleted_before is not None:
+            # The newest deletion entry removed is the new horizon
+            old_deletions = (changes.c.deleted.is_(True), changes.c.changed_at < deleted_before)
+            through = db.session.execute(
+                select(func.max(changes.c.seq)).where(*old_deletions)
+            ).scalar()
+            if through is not None:
+                removed += db.session.execute(
+                    delete(changes).where(*old_deletions, changes.c.seq <= through)
+                ).rowcount
+                db.session.execute(
+                    insert(ChangeCompactionModel.__table__).values(
+                        compacted_through=through, compacted_at=int(time.time())
+                    )
+                )
+                db.session.commit()
+        return removed
+
+
+CHANGE_FEED = ChangeFeed()
+
+
+def _write_pending(session):
+    pending = session.info.pop("changes", None)
+    staged = session.info.pop("changes_staged", False)
+    if not pending and not staged:
+        return
+
+    # Everything else is written first, so that nothing waits on a row lock
+    # while holding the outbox lock
+    session.flush()
+    if db.engine.dialect.name == "postgresql":
+        session.execute(select(func.pg_advisory_xact_lock(LOCK_KEY)))
+    now = int(time.time())
+    changes = ChangeModel.__table__
+    if pending:
+        session.execute(
+            insert(changes),
+            [
+                {"entity": entity, "entity_id": entity_id, "deleted": deleted, "changed_at": now}
+                for (entity, entity_id), deleted in pending.items()
+            ],
+        )
+    if staged:
+        # After the other entries: a staged row is deleted, whatever else
+        # the transaction did to it
+        session.execute(
+            insert(changes).from_select(
+                ["entity", "entity_id", "deleted", "changed_at"],
+                select(STAGED.c.entity, STAGED.c.entity_id, true(), literal(now)),
+            )
+        )
+        session.execute(delete(STAGED))
+    session.info["changes_written"] = True
+
+
+def _notify_on_commit(session):
+    if session.info.pop("changes_written", False):
+        CHANGE_FEED.notify()
+
+
+def _drop_pending(session):
+    session.info.pop("changes", None)
+    session.info.pop("changes_staged", None)
+    session.info.pop("changes_written", None)
+
+
+@changes_cli.command("compact")
+@click.option(
+    "--deleted-older-than",
+    type=float,
+    default=None,
+    metavar="DAYS",
+    help="Also removes the deletion entries older than this many days.",
+)
+def compact_command(deleted_older_than):
+    """Removes superseded (and old deletion) entries from the change feed."""
+    cutoff = None if deleted_older_than is None else time.time() - deleted_older_than * 86400
+    removed = CHANGE_FEED.compact(cutoff)
+    click.echo(f"Removed {removed} change entries.")
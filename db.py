@@ -1,3 +1,213 @@
-from flask_sqlalchemy import SQLAlchemy
+import os
+import random
+import threading
+import time
 
-db = SQLAlchemy()
+import click
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long requests wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.checkout_wait_max = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_wait_seconds += waited
+                self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+
+class RoutingSession(SignallingSession):
+    """Sends the queries of GET/HEAD requests to a read replica, and everything
+    else (writes, flushes, other methods) to the primary.
+
+    A client that just committed reads from the primary for
+    `DATABASE_STICKY_SECONDS`, so it always sees its own writes even if the
+    replicas lag behind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        replicas = self.app.config.get("DATABASE_REPLICAS")
+        if (
+            replicas
+            and not self._flushing
+            and not isinstance(clause, UpdateBase)
+            and has_request_context()
+            and g.get("db_read_only")
+        ):
+            return db.get_engine(self.app, bind=random.choice(replicas))
+
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_routing(self, app):
+        @app.before_request
+        def route_reads_to_replicas():
+            sticky_until = request.cookies.get(app.config["DATABASE_STICKY_COOKIE"], "")
+            sticky = sticky_until.isdigit() and int(sticky_until) > time.time()
+            g.db_read_only = request.method in ("GET", "HEAD") and not sticky
+
+        @app.after_request
+        def stick_to_primary_after_write(response):
+            if g.get("db_committed"):
+                seconds = app.config["DATABASE_STICKY_SECONDS"]
+                response.set_cookie(
+                    app.config["DATABASE_STICKY_COOKIE"],
+                    str(int(time.time()) + seconds),
+                    max_age=seconds,
+                    httponly=True,
+                )
+            return response
+
+        if not event.contains(self.session, "after_commit", _remember_commit):
+            event.listen(self.session, "after_commit", _remember_commit)
+
+
+def _remember_commit(session):
+    if has_request_context():
+        g.db_committed = True
+        g.db_read_only = False
+
+
+db = RoutingSQLAlchemy()
+
+
+def reads_from_replica():
+    """Whether the current request's reads go to a replica, which may lag
+    behind the primary."""
+    return bool(current_app.config.get("DATABASE_REPLICAS") and g.get("db_read_only"))
+
+
+def engine_config(app):
+    """Reads the engine and replica settings from the environment into app.config."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {}
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        options = {
+            "poolclass": TimedQueuePool,
+            "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+        }
+        statement_timeout = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+        if statement_timeout:
+            options["connect_args"] = {
+                "options": f"-c statement_timeout={int(statement_timeout)}"
+            }
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+    replica_urls = [
+        url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url
+    ]
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"replica_{index}": url for index, url in enumerate(replica_urls)
+    }
+    app.config["DATABASE_REPLICAS"] = list(app.config["SQLALCHEMY_BINDS"])
+    app.config["DATABASE_STICKY_SECONDS"] = int(os.getenv("DATABASE_STICKY_SECONDS", 5))
+    app.config["DATABASE_STICKY_COOKIE"] = "db_primary_until"
+
+
+class LazyGroup(click.Group):
+    """Command group whose commands are loaded the first time it is used."""
+
+    def __init__(self, name, load, **kwargs):
+        super().__init__(name, **kwargs)
+        self._load = load
+        self._group = None
+
+    def group(self):
+        if self._group is None:
+            self._group = self._load()
+        return self._group
+
+    def list_commands(self, ctx):
+        return self.group().list_commands(ctx)
+
+    def get_command(self, ctx, cmd_name):
+        return self.group().get_command(ctx, cmd_name)
+
+
+def migrate_cli(app):
+    """The `flask db` commands of Flask-Migrate. Alembic takes a large share of
+    the app's import time and only the CLI uses it, so it is imported when a
+    `flask db` command runs."""
+
+    def load():
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_cli
+
+        Migrate(app, db, include_object=include_in_migrations)
+        return db_cli
+
+    return LazyGroup("db", load, help="Perform database migrations.")
+
+
+def include_in_migrations(object, name, type_, reflected, compare_to):
+    """Alembic's `include_object`: leaves out of autogenerate the database
+    objects no model declares, so that `flask db migrate` does not drop them.
+    Those are SQLite's own tables, and the full-text search index of items that
+    its migration creates by hand (see item_search.py).
+
+    Foreign keys are not compared on SQLite either: the ON DELETE CASCADE
+    migration leaves them as they are there, and rebuilding the tables to
+    change them would drop the search index's triggers."""
+    if type_ == "foreign_key_constraint":
+        return db.engine.dialect.name != "sqlite"
+    if not reflected or compare_to is not None:
+        return True
+    if type_ == "table":
+        return not name.startswith(("sqlite_", "items_fts"))
+    if type_ == "index":
+        return name != "ix_items_search"
+    return True
+
+
+def dispose_engines(app):
+    """Closes the pooled connections of the primary and replica engines, so a
+    process forked afterwards does not share any of them."""
+    with app.app_context():
+        for bind in [None] + app.config.get("DATABASE_REPLICAS", []):
+            db.get_engine(app, bind=bind).dispose()
+
+
+def pool_stats(app):
+    """Connection pool usage of the primary and every replica engine."""
+    stats = []
+    for bind in [None] + app.config.get("DATABASE_REPLICAS", []):
+        pool = db.get_engine(app, bind=bind).pool
+        if not isinstance(pool, TimedQueuePool):
+            continue
+        stats.append(
+            {
+                "bind": bind or "primary",
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_connections": pool.size() + pool._max_overflow,
+                "checkouts": pool.checkouts,
+                "checkout_wait_seconds": pool.checkout_wait_seconds,
+                "checkout_wait_max_seconds": pool.checkout_wait_max,
+            }
+        )
+    return stats
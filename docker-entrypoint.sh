@@ -1,5 +1,14 @@
 #!/bin/sh
 
-flask db upgrade
+# Set RUN_MIGRATIONS=0 when migrations run as a separate release step, so that
+# restarts do not repeat them.
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    flask db upgrade
+fi
 
-exec gunicorn --bind 0.0.0.0:80 "app:create_app()"
+if [ "$SERVER" = "asgi" ]; then
+    exec uvicorn --factory asgi:create_asgi_app --host 0.0.0.0 --port 80
+fi
+
+# Workers, threads and the rest come from gunicorn.conf.py
+exec gunicorn "app:create_app()"
@@ -0,0 +1,89 @@
+"""
+gunicorn.conf.py
+
+Gunicorn settings, read by `gunicorn "app:create_app()"` from the working
+directory. Every setting can be changed per host through the environment:
+
+- GUNICORN_BIND: address to listen on, "0.0.0.0:80" by default.
+- GUNICORN_WORKER_CLASS: "gthread" (default) or "sync". For many concurrent
+  slow clients use the ASGI mode (SERVER=asgi, see asgi.py) instead.
+- GUNICORN_WORKERS: worker processes. Defaults to 2 x CPUs + 1 for sync
+  workers, and CPUs + 1 for gthread workers, which serve several requests
+  each.
+- GUNICORN_THREADS: threads per gthread worker, 4 by default.
+- GUNICORN_PRELOAD: "1" (default) imports the app once in the master before
+  forking the workers, so they start quickly and share its memory.
+- GUNICORN_MAX_REQUESTS, GUNICORN_MAX_REQUESTS_JITTER: a worker is restarted
+  gracefully after this many requests (plus a random jitter, so they do not
+  all restart at once). 0 disables it.
+- GUNICORN_TIMEOUT, GUNICORN_GRACEFUL_TIMEOUT, GUNICORN_KEEPALIVE: seconds.
+
+The master logs how long it took to load the app and to get ready, and every
+worker how long it took to boot.
+"""
+
+import multiprocessing
+import os
+import time
+
+CONFIG_LOADED = time.monotonic()
+CPUS = multiprocessing.cpu_count()
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:80")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", 0)) or (
+    CPUS * 2 + 1 if worker_class == "sync" else CPUS + 1
+)
+threads = int(os.getenv("GUNICORN_THREADS", 4)) if worker_class == "gthread" else 1
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+
+def on_starting(server):
+    if server.cfg.preload_app:
+        server.log.info("Preloaded the app in %.2fs", time.monotonic() - CONFIG_LOADED)
+
+
+def when_ready(server):
+    server.log.info(
+        "Ready in %.2fs: %s %s worker(s), %s thread(s) each",
+        time.monotonic() - CONFIG_LOADED,
+        server.cfg.workers,
+        server.cfg.worker_class_str,
+        server.cfg.threads,
+    )
+
+
+def pre_fork(server, worker):
+    # A preloaded app may have opened database connections in the master;
+    # close them so that no worker inherits a socket another process uses.
+    if server.cfg.preload_app:
+        from db import dispose_engines
+
+        dispose_engines(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    worker.log.info(
+        "Worker %s booted in %.2fs", worker.pid, time.monotonic() - worker.forked_at
+    )
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of the exited worker from the shared metrics
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
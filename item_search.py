@@ -0,0 +1,135 @@
+"""
+item_search.py
+
+Filters, sort orders and full-text search for `GET /item`. Every filter is a
+condition the database answers from an index, never a Python-side filter:
+
+- store_id and price range: the (store_id, price), (store_id, name),
+  (store_id, id) and (price, id) indexes on items
+- name prefix: a range `name >= 'ab' AND name < 'ac'` on the name (or
+  store_id, name) index, rechecked with an exact prefix comparison
+- tag: a semi-join on the (tag_id, item_id) index of items_tags, matching
+  items linked to any of the tags, or to all of them
+- q: full-text search over name and description, with a GIN index on a
+  tsvector expression on PostgreSQL and an FTS5 table on SQLite. Both use the
+  same tokenization (lowercase words, no stemming), and every word has to match.
+
+The FTS objects are created with the items table (`db.create_all`) and by the
+migration for existing databases. On SQLite, triggers keep items_fts in sync
+with items.
+"""
+
+import re
+
+from sqlalchemy import DDL, Column, Integer, MetaData, Table, Text, event, func, select, text
+
+from db import db
+from models import ItemModel, ItemsTags
+
+SORTS = {
+    "id": (ItemModel.id,),
+    "name": (ItemModel.name, ItemModel.id),
+    "price": (ItemModel.price, ItemModel.id),
+}
+
+SEARCH_DOCUMENT = "coalesce({0}name, '') || ' ' || coalesce({0}description, '')"
+
+POSTGRESQL_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_items_search ON items "
+    f"USING gin (to_tsvector('simple', {SEARCH_DOCUMENT.format('')}))",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5("
+    "name, description, content='items', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name, description ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO items_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+]
+
+WORDS = re.compile(r"\w+")
+
+# Kept out of db.Model.metadata, the DDL above creates it. The hidden column
+# named after an FTS5 table matches against all of its columns.
+ITEMS_FTS = Table(
+    "items_fts", MetaData(), Column("rowid", Integer), Column("items_fts", Text)
+)
+
+for statement in POSTGRESQL_DDL:
+    event.listen(
+        ItemModel.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql")
+    )
+for statement in SQLITE_DDL:
+    event.listen(
+        ItemModel.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite")
+    )
+# The triggers go with the items table, the FTS table has to be dropped with it
+event.listen(
+    ItemModel.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS items_fts").execute_if(dialect="sqlite"),
+)
+
+
+def filter_items(query, args):
+    """Applies the filters of `ItemListArgsSchema` to an ItemModel query."""
+    if "store_id" in args:
+        query = query.filter(ItemModel.store_id == args["store_id"])
+    if "price_min" in args:
+        query = query.filter(ItemModel.price >= args["price_min"])
+    if "price_max" in args:
+        query = query.filter(ItemModel.price <= args["price_max"])
+    if args.get("name_prefix"):
+        query = query.filter(*prefix_conditions(ItemModel.name, args["name_prefix"]))
+    if args.get("tag"):
+        query = query.filter(ItemModel.id.in_(tagged_items(args["tag"], args["tag_match"])))
+    if args.get("q"):
+        query = query.filter(search_condition(args["q"]))
+    return query
+
+
+def prefix_conditions(column, prefix):
+    # The range lets a btree index do the work; the exact comparison keeps the
+    # result right under collations that do not sort by code point.
+    conditions = [column >= prefix, func.substr(column, 1, len(prefix)) == prefix]
+    if ord(prefix[-1]) < 0x10FFFF:
+        conditions.append(column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return conditions
+
+
+def tagged_items(tag_ids, match="any"):
+    tag_ids = sorted(set(tag_ids))
+    links = select(ItemsTags.item_id).where(ItemsTags.tag_id.in_(tag_ids))
+    if match == "all":
+        links = links.group_by(ItemsTags.item_id).having(
+            func.count(ItemsTags.tag_id.distinct()) == len(tag_ids)
+        )
+    return links
+
+
+def search_condition(q):
+    words = WORDS.findall(q.lower())
+    if not words:
+        # Nothing searchable, e.g. only punctuation: no item matches
+        return ItemModel.id.is_(None)
+
+    if db.engine.dialect.name == "postgresql":
+        # Written exactly like the indexed expression, so the GIN index is used
+        return text(
+            f"to_tsvector('simple', {SEARCH_DOCUMENT.format('items.')}) "
+            "@@ to_tsquery('simple', :search)"
+        ).bindparams(search=" & ".join(words))
+
+    # Quoted so that words like AND, OR or NEAR are not read as FTS5 operators
+    match = " ".join(f'"{word}"' for word in words)
+    return ItemModel.id.in_(
+        select(ITEMS_FTS.c.rowid).where(ITEMS_FTS.c.items_fts.op("MATCH")(match))
+    )
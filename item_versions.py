@@ -0,0 +1,87 @@
+"""
+item_versions.py
+
+Optimistic concurrency for items. Every item has a `version`, bumped by each
+write that changes its representation (name, price, description, tag links),
+and the version is the item's ETag. A PUT with `If-Match` only applies if the
+item is still at one of the given versions, and 412 tells the client that it
+was changed in between.
+
+`update_item` writes with one conditional `UPDATE ... WHERE id = ? AND
+version = ?` and no prior SELECT of the item on PostgreSQL: a self-join on the
+same row returns the old price that the store stats need. Other databases read
+the row first and guard the UPDATE on the version that was read.
+"""
+
+from flask import request
+from sqlalchemy import select, update
+from werkzeug.http import quote_etag
+
+from db import db
+from models import ItemModel
+
+
+def etag(version):
+    return quote_etag(str(version))
+
+
+def if_match_versions():
+    """The versions listed in the request's If-Match header: None without the
+    header or with `If-Match: *`. Weak ETags never match, as If-Match uses
+    the strong comparison."""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return {int(tag) for tag in request.if_match.as_set() if tag.isdigit()}
+
+
+def bump_versions(item_ids):
+    """Bumps the version of items whose representation changed without a
+    write to their row, such as new tag links."""
+    items = ItemModel.__table__
+    db.session.execute(
+        update(items).where(items.c.id.in_(item_ids)).values(version=items.c.version + 1)
+    )
+
+
+def update_item(item_id, values, versions=None):
+    """Writes `values` (name, price) to the item and bumps its version,
+    without committing. With `versions`, only if the item is at one of them.
+
+    Returns (new version, store id, old price), or None if no row was
+    written: the item does not exist, is at another version, or was changed
+    by a concurrent transaction in the meantime."""
+    items = ItemModel.__table__
+    if db.engine.dialect.name == "postgresql":
+        # `old` is the row as the statement's snapshot saw it. If a concurrent
+        # update commits first, the re-checked row no longer has old's version
+        # and nothing is written.
+        old = items.alias("old")
+        statement = (
+            update(items)
+            .where(items.c.id == item_id, old.c.id == items.c.id, items.c.version == old.c.version)
+            .values(**values, version=items.c.version + 1)
+            .returning(items.c.version, items.c.store_id, old.c.price)
+        )
+        if versions is not None:
+            statement = statement.where(items.c.version.in_(versions))
+        return db.session.execute(statement).first()
+
+    current = db.session.execute(
+        select(items.c.version, items.c.store_id, items.c.price).where(items.c.id == item_id)
+    ).first()
+    if current is None or (versions is not None and current.version not in versions):
+        return None
+    written = db.session.execute(
+        update(items)
+        .where(items.c.id == item_id, items.c.version == current.version)
+        .values(**values, version=items.c.version + 1)
+    ).rowcount
+    if not written:
+        return None
+    return current.version + 1, current.store_id, current.price
+
+
+def item_exists(item_id):
+    return db.session.execute(
+        select(ItemModel.id).where(ItemModel.id == item_id)
+    ).first() is not None
@@ -0,0 +1,173 @@
+"""
+jwt_cache.py
+
+Per-worker caches that let repeat requests from the same client skip the work
+of authenticating them again.
+
+`CLAIMS_CACHE` keeps the claims of tokens whose signature has been verified,
+keyed by the signature and kept until the token's `exp` (or until its signing
+key retires, see keys.py), so the next request
+with the same token neither parses nor verifies it. The whole token is stored
+with the claims and compared on every hit: a cached signature pasted onto other
+claims is verified from scratch (and fails). The blocklist is still checked on
+every request, cached claims or not, so a token revoked by another worker is
+rejected too; the revoking worker also drops its own cached entry. A change
+of the key set empties the cache.
+
+`USER_CACHE` keeps the user a token identifies (`current_user`) for
+`JWT_USER_CACHE_TTL` seconds, so the users table is not read on every request.
+A deleted user's tokens are rejected by the worker that deleted it right away,
+and by the others once their entry expires.
+
+Both caches are bounded LRUs; a size of 0 disables them.
+"""
+
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+
+import jwt
+from flask_jwt_extended import JWTManager
+
+from keys import KEY_SET
+from models import UserModel
+
+AuthenticatedUser = namedtuple("AuthenticatedUser", ["id", "username"])
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, now):
+        """The value stored under `key` if it is still valid at `now`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, valid_until = entry
+            if now >= valid_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, valid_until):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return None if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ClaimsCache(LRUCache):
+    def __init__(self):
+        super().__init__(10000)
+        self._signatures = {}
+
+    def init_app(self, app):
+        self.size = app.config.get("JWT_CLAIMS_CACHE_SIZE", self.size)
+        self.clear()
+        with self._lock:
+            self._signatures.clear()
+
+    def claims(self, encoded_token):
+        """A copy of the verified claims of the token, or None."""
+        signature = encoded_token.rpartition(".")[2]
+        entry = self.get(signature, time.time())
+        if entry is None or entry[0] != encoded_token:
+            return None
+        return dict(entry[1])
+
+    def remember(self, encoded_token, claims, valid_until=None):
+        if "exp" not in claims:
+            return
+        if valid_until is None or claims["exp"] < valid_until:
+            valid_until = claims["exp"]
+        signature = encoded_token.rpartition(".")[2]
+        self.put(signature, (encoded_token, dict(claims)), valid_until)
+        if "jti" not in claims or self.size <= 0:
+            return
+        with self._lock:
+            self._signatures[claims["jti"]] = signature
+            if len(self._signatures) > 2 * self.size:
+                # Forgets the ids of tokens the LRU has evicted
+                self._signatures = {
+                    jti: cached
+                    for jti, cached in self._signatures.items()
+                    if cached in self._entries
+                }
+
+    def revoke(self, jti):
+        """Drops the cached claims of a revoked token."""
+        with self._lock:
+            signature = self._signatures.pop(jti, None)
+        if signature is not None:
+            self.pop(signature)
+
+
+class UserCache(LRUCache):
+    def __init__(self):
+        super().__init__(10000)
+        self.ttl = 60
+
+    def init_app(self, app):
+        self.size = app.config.get("JWT_USER_CACHE_SIZE", self.size)
+        self.ttl = app.config.get("JWT_USER_CACHE_TTL", self.ttl)
+        self.clear()
+
+    def load(self, identity):
+        """The user with this id (an `AuthenticatedUser`), or None if there is
+        none. Users found are cached, missing ones are not."""
+        now = time.time()
+        user = self.get(identity, now)
+        if user is None:
+            model = UserModel.query.get(identity)
+            if model is None:
+                return None
+            user = AuthenticatedUser(model.id, model.username)
+            self.put(identity, user, now + self.ttl)
+        return user
+
+
+class CachedJWTManager(JWTManager):
+    """JWTManager that looks the claims of the tokens it is given up in
+    `CLAIMS_CACHE` before decoding them."""
+
+    def __init__(self, app=None, **kwargs):
+        self._key_generation = KEY_SET.generation
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        # Tokens with a CSRF value or decoded while expired are never cached
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        KEY_SET.reload()
+        if KEY_SET.generation != self._key_generation:
+            self._key_generation = KEY_SET.generation
+            CLAIMS_CACHE.clear()
+
+        claims = CLAIMS_CACHE.claims(encoded_token)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            kid = jwt.get_unverified_header(encoded_token).get("kid")
+            CLAIMS_CACHE.remember(encoded_token, claims, KEY_SET.verify_until(kid))
+        return claims
+
+
+CLAIMS_CACHE = ClaimsCache()
+USER_CACHE = UserCache()
@@ -0,0 +1,320 @@
+"""
+keys.py
+
+Asymmetric keys (RS256, ES256, EdDSA, ...) for signing and verifying the JWTs,
+read from a key set file. Nodes that only verify tokens, like read-only
+replicas, hold the public keys alone, and keys are rotated on a schedule
+without logging anyone out.
+
+JWT_KEYS_FILE points to a JSON file shaped like a JWKS:
+
+    {"keys": [
+        {"kid": "2026-09", "alg": "RS256",
+         "public_key": "2026-09.pub.pem", "private_key": "2026-09.pem",
+         "sign_from": "2026-09-01T00:00:00+00:00",
+         "sign_until": "2026-10-01T00:00:00+00:00"},
+        {"kid": "2026-10", "alg": "RS256",
+         "public_key": "2026-10.pub.pem", "private_key": "2026-10.pem",
+         "sign_from": "2026-10-01T00:00:00+00:00"}
+    ]}
+
+Paths are relative to the file. New tokens are signed with the key whose
+`sign_from` is the latest to have passed, among the keys whose `sign_until` has
+not, and name it in their `kid` header, by which verifiers find the key. A key
+keeps verifying for an overlap window after its `sign_until`, so the tokens it
+signed stay valid until they expire: JWT_KEY_OVERLAP seconds, by default the
+lifetime of a refresh token, or until its own `verify_until`. A key set without
+any `private_key` only verifies.
+
+Keys are parsed once and kept in memory by id. The file is checked for changes
+every JWT_KEYS_RELOAD_INTERVAL seconds, so the next key can be added ahead of
+its `sign_from` without restarting (`flask keys generate` does it). The
+signing algorithm is read at startup; switching to another one takes a restart.
+
+Without JWT_KEYS_FILE tokens are signed with the shared JWT_SECRET_KEY (HS256).
+"""
+
+import json
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from jwt import InvalidTokenError
+
+ASYMMETRIC_ALGORITHMS = [
+    "RS256", "RS384", "RS512", "PS256", "PS384", "PS512", "ES256", "ES384", "ES512", "EdDSA",
+]
+
+Key = namedtuple(
+    "Key",
+    ["kid", "algorithm", "public_key", "private_key", "sign_from", "sign_until", "verify_until"],
+)
+
+keys_cli = AppGroup("keys", help="Keys signing and verifying the JWTs.")
+
+
+def parse_time(value):
+    """Epoch seconds of an ISO 8601 date, or None."""
+    if value is None:
+        return None
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_pem(path, private):
+    from cryptography.hazmat.primitives import serialization
+
+    with open(path, "rb") as file:
+        data = file.read()
+    if private:
+        return serialization.load_pem_private_key(data, password=None)
+    return serialization.load_pem_public_key(data)
+
+
+def read_key_set(path, overlap):
+    """{kid: Key} of the key set file, with the PEM files parsed."""
+    with open(path) as file:
+        entries = json.load(file)["keys"]
+
+    base = os.path.dirname(os.path.abspath(path))
+    keys = {}
+    for entry in entries:
+        algorithm = entry["alg"]
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise ValueError(f"Key {entry['kid']}: unsupported algorithm {algorithm}")
+
+        private_key = None
+        if entry.get("private_key"):
+            private_key = load_pem(os.path.join(base, entry["private_key"]), private=True)
+        if entry.get("public_key"):
+            public_key = load_pem(os.path.join(base, entry["public_key"]), private=False)
+        elif private_key is not None:
+            public_key = private_key.public_key()
+        else:
+            raise ValueError(f"Key {entry['kid']} has neither a public nor a private key")
+
+        sign_until = parse_time(entry.get("sign_until"))
+        verify_until = parse_time(entry.get("verify_until"))
+        if verify_until is None and sign_until is not None:
+            verify_until = sign_until + overlap
+
+        keys[entry["kid"]] = Key(
+            entry["kid"],
+            algorithm,
+            public_key,
+            private_key,
+            parse_time(entry.get("sign_from")) or 0,
+            sign_until,
+            verify_until,
+        )
+    return keys
+
+
+def key_status(key, now):
+    if key.verify_until is not None and now >= key.verify_until:
+        return "retired"
+    if key.private_key is None:
+        return "verifying"
+    if now < key.sign_from:
+        return "scheduled"
+    if key.sign_until is not None and now >= key.sign_until:
+        return "verifying"
+    return "signing"
+
+
+class KeySet:
+    def __init__(self):
+        self.path = None
+        self.overlap = 30 * 24 * 3600
+        self.reload_interval = 60
+        self.keys = {}
+        self.generation = 0
+        self._mtime = None
+        self._next_check = 0
+        self._lock = Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def init_app(self, app):
+        """Loads the key set and sets the JWT algorithms to match. Call after
+        the JWTManager is set up, which fills in the token lifetimes."""
+        self.path = app.config.get("JWT_KEYS_FILE")
+        self.keys = {}
+        self._mtime = None
+        if not self.path:
+            return
+
+        overlap = app.config.get("JWT_KEY_OVERLAP")
+        if overlap is None:
+            refresh_expires = app.config["JWT_REFRESH_TOKEN_EXPIRES"]
+            if isinstance(refresh_expires, timedelta):
+                overlap = refresh_expires.total_seconds()
+            else:
+                overlap = refresh_expires or float("inf")
+        self.overlap = overlap
+        self.reload_interval = app.config.get("JWT_KEYS_RELOAD_INTERVAL", self.reload_interval)
+        self._load()
+
+        signing = {key.algorithm for key in self.keys.values() if key.private_key is not None}
+        if len(signing) > 1:
+            raise ValueError(f"The signing keys use several algorithms: {sorted(signing)}")
+        app.config["JWT_ALGORITHM"] = (
+            signing or {key.algorithm for key in self.keys.values()} or {"RS256"}
+        ).pop()
+        app.config["JWT_DECODE_ALGORITHMS"] = list(ASYMMETRIC_ALGORITHMS)
+
+    def _load(self):
+        # A missing file is an empty key set, until `flask keys generate`
+        mtime = os.stat(self.path).st_mtime if os.path.exists(self.path) else None
+        self.keys = read_key_set(self.path, self.overlap) if mtime is not None else {}
+        self._mtime = mtime
+        self.generation += 1
+        self._next_check = time.monotonic() + self.reload_interval
+
+    def reload(self):
+        """Reads the key set file again if it changed, checking at most once
+        per reload interval. A file that fails to load is logged and the keys
+        already loaded are kept."""
+        if not self.path or time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                exists = os.path.exists(self.path)
+                if (os.stat(self.path).st_mtime if exists else None) != self._mtime:
+                    self._load()
+            except (OSError, ValueError, KeyError):
+                current_app.logger.exception("Could not reload the JWT key set")
+
+    def signing_key(self):
+        """The key new tokens are signed with."""
+        self.reload()
+        now = time.time()
+        active = [key for key in self.keys.values() if key_status(key, now) == "signing"]
+        if not active:
+            raise RuntimeError("No JWT signing key is active.")
+        key = max(active, key=lambda key: key.sign_from)
+        if key.algorithm != current_app.config["JWT_ALGORITHM"]:
+            raise RuntimeError(
+                f"Key {key.kid} uses {key.algorithm}, the app signs with"
+                f" {current_app.config['JWT_ALGORITHM']}; restart to switch."
+            )
+        return key
+
+    def key_id_header(self):
+        """The `kid` header of a new token. The key is kept for
+        `signing_secret`, so that both agree even across a rotation."""
+        g.jwt_signing_key = self.signing_key()
+        return {"kid": g.jwt_signing_key.kid}
+
+    def signing_secret(self):
+        key = g.pop("jwt_signing_key", None) or self.signing_key()
+        return key.private_key
+
+    def verification_key(self, jwt_header):
+        """The public key of the token's `kid`, if it is still verifying and
+        matches the token's algorithm."""
+        key = self.keys.get(jwt_header.get("kid"))
+        if key is None or key.algorithm != jwt_header.get("alg"):
+            raise InvalidTokenError("Unknown signing key.")
+        if key.verify_until is not None and time.time() >= key.verify_until:
+            raise InvalidTokenError("Retired signing key.")
+        return key.public_key
+
+    def verify_until(self, kid):
+        key = self.keys.get(kid)
+        return None if key is None else key.verify_until
+
+
+KEY_SET = KeySet()
+
+
+def generate_key_pair(algorithm):
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm.startswith(("RS", "PS")):
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm.startswith("ES"):
+        curve = {"ES256": ec.SECP256R1, "ES384": ec.SECP384R1, "ES512": ec.SECP521R1}[algorithm]
+        return ec.generate_private_key(curve())
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+@keys_cli.command("generate")
+@click.argument("kid")
+@click.option("--algorithm", default="RS256", type=click.Choice(ASYMMETRIC_ALGORITHMS))
+@click.option("--sign-from", help="ISO 8601 date the key starts signing at, now by default.")
+def generate_key(kid, algorithm, sign_from):
+    """Adds a new key pair to the key set file. The key that signs until then
+    stops signing at the new key's `sign_from` and keeps verifying for the
+    overlap window."""
+    from cryptography.hazmat.primitives import serialization
+
+    path = current_app.config.get("JWT_KEYS_FILE")
+    if not path:
+        raise click.UsageError("JWT_KEYS_FILE is not set.")
+    key_set = {"keys": []}
+    if os.path.exists(path):
+        with open(path) as file:
+            key_set = json.load(file)
+    if any(entry["kid"] == kid for entry in key_set["keys"]):
+        raise click.UsageError(f"Key {kid} already exists.")
+
+    sign_from = sign_from or datetime.now(timezone.utc).isoformat(timespec="seconds")
+    starts = parse_time(sign_from)
+
+    private_key = generate_key_pair(algorithm)
+    base = os.path.dirname(os.path.abspath(path))
+    files = {"private_key": f"{kid}.pem", "public_key": f"{kid}.pub.pem"}
+    with open(os.path.join(base, files["private_key"]), "wb") as file:
+        file.write(private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    os.chmod(os.path.join(base, files["private_key"]), 0o600)
+    with open(os.path.join(base, files["public_key"]), "wb") as file:
+        file.write(private_key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+
+    for entry in key_set["keys"]:
+        # Signing keys without an end, started before the new one, hand over to it
+        if (
+            entry.get("private_key")
+            and entry.get("sign_until") is None
+            and (parse_time(entry.get("sign_from")) or 0) < starts
+        ):
+            entry["sign_until"] = sign_from
+    key_set["keys"].append({"kid": kid, "alg": algorithm, **files, "sign_from": sign_from})
+
+    with open(path, "w") as file:
+        json.dump(key_set, file, indent=2)
+    click.echo(f"Added key {kid} ({algorithm}), signing from {sign_from}.")
+
+
+@keys_cli.command("list")
+def list_keys():
+    """Lists the keys of the key set and what each is used for now."""
+    if not KEY_SET.enabled:
+        click.echo("JWT_KEYS_FILE is not set: tokens are signed with JWT_SECRET_KEY.")
+        return
+    KEY_SET.reload()
+    now = time.time()
+    for key in sorted(KEY_SET.keys.values(), key=lambda key: key.sign_from):
+        until = key.verify_until and datetime.fromtimestamp(key.verify_until, timezone.utc)
+        click.echo(
+            f"{key.kid:<20} {key.algorithm:<6} {key_status(key, now):<10}"
+            f" verifies until {until.isoformat() if until else 'further notice'}"
+        )
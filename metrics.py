@@ -0,0 +1,166 @@
+"""
+metrics.py
+
+Prometheus metrics for the API, served on `/metrics`:
+
+- request latency per blueprint, endpoint, method and status
+- SQL statements and SQL time per request, from SQLAlchemy engine events
+- time spent dumping response schemas and verifying JWTs
+- rq queue depth and database connection pool usage, read at scrape time
+
+Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory before the workers start, so every worker writes its samples there and
+`/metrics` aggregates all of them. Scrape-time gauges (queue depth, pool usage)
+describe the worker that answered the scrape.
+"""
+
+import os
+import time
+
+from flask import current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from db import pool_stats
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ["blueprint", "endpoint", "method", "status"],
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request.",
+    ["blueprint", "endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "Time spent in SQL statements per request.",
+    ["blueprint", "endpoint"],
+)
+SCHEMA_DUMP_DURATION = Histogram(
+    "schema_dump_duration_seconds",
+    "Time spent dumping a response with a marshmallow schema.",
+    ["schema"],
+)
+JWT_VERIFY_DURATION = Histogram(
+    "jwt_verify_duration_seconds",
+    "Time spent verifying the JWT of a protected request.",
+)
+
+
+class ScrapeTimeCollector:
+    """Gauges that are cheaper to read on demand than to keep up to date."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "task_queue_depth", "Jobs waiting in the task queue.", labels=["queue"]
+        )
+        queue = getattr(self.app, "queue", None)
+        if hasattr(queue, "queue"):
+            from rq import Queue
+
+            depth.add_metric([queue.queue.name], queue.queue.count)
+            dead_letter = Queue(queue.dead_letter_name, connection=queue.queue.connection)
+            depth.add_metric([queue.dead_letter_name], dead_letter.count)
+        elif queue is not None:
+            depth.add_metric(["dead-letter"], len(queue.dead_letters))
+        yield depth
+
+        gauges = {
+            name: GaugeMetricFamily(f"db_pool_{name}", help_text, labels=["bind"])
+            for name, help_text in (
+                ("size", "Connections kept open by the pool."),
+                ("checked_out", "Connections currently in use."),
+                ("overflow", "Connections open beyond the pool size."),
+                ("max_connections", "Pool size plus allowed overflow."),
+                ("checkouts", "Connections handed out since start."),
+                ("checkout_wait_seconds", "Total time spent waiting for a connection."),
+                ("checkout_wait_max_seconds", "Longest wait for a connection."),
+            )
+        }
+        with self.app.app_context():
+            for stats in pool_stats(self.app):
+                for name, gauge in gauges.items():
+                    gauge.add_metric([stats["bind"]], stats[name])
+        yield from gauges.values()
+
+
+def observe_schema_dump(schema_name, seconds):
+    SCHEMA_DUMP_DURATION.labels(schema_name).observe(seconds)
+
+
+def init_metrics(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    scrape_collector = ScrapeTimeCollector(app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.sql_statements = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def observe_request(response):
+        if request.endpoint == "metrics" or "request_start" not in g:
+            return response
+
+        blueprint = request.blueprint or ""
+        endpoint = request.endpoint or "unknown"
+        REQUEST_LATENCY.labels(
+            blueprint, endpoint, request.method, response.status_code
+        ).observe(time.perf_counter() - g.request_start)
+        REQUEST_SQL_STATEMENTS.labels(blueprint, endpoint).observe(g.sql_statements)
+        REQUEST_SQL_DURATION.labels(blueprint, endpoint).observe(g.sql_seconds)
+        return response
+
+    def metrics():
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+
+        scrape_registry = CollectorRegistry()
+        scrape_registry.register(scrape_collector)
+        body = generate_latest(registry) + generate_latest(scrape_registry)
+        return current_app.response_class(body, mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule("/metrics", "metrics", metrics)
+
+    if not event.contains(Engine, "before_cursor_execute", _start_statement_timer):
+        event.listen(Engine, "before_cursor_execute", _start_statement_timer)
+        event.listen(Engine, "after_cursor_execute", _stop_statement_timer)
+
+
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's execution context, which is dropped with it: a
+    # statement that raises never reaches after_cursor_execute, and must not
+    # leave its start time behind on the pooled connection
+    if context is not None:
+        context.metrics_start = time.perf_counter()
+
+
+def _stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if has_request_context() and "sql_statements" in g:
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
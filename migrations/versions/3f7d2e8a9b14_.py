@@ -0,0 +1,77 @@
+"""indexes for item filters and sorting, and full-text search on items
+
+Revision ID: 3f7d2e8a9b14
+Revises: e6a3b59c1f02
+Create Date: 2026-10-17 16:48:22.905133
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f7d2e8a9b14"
+down_revision = "e6a3b59c1f02"
+branch_labels = None
+depends_on = None
+
+POSTGRESQL_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_items_search ON items USING gin "
+    "(to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '')))",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5("
+    "name, description, content='items', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_insert AFTER INSERT ON items BEGIN "
+    "INSERT INTO items_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_delete AFTER DELETE ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS items_fts_update AFTER UPDATE OF name, description ON items BEGIN "
+    "INSERT INTO items_fts(items_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO items_fts(rowid, name, description) "
+    "VALUES (new.id, new.name, new.description); END",
+]
+
+
+def upgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.create_index("ix_items_store_id_name", ["store_id", "name"], unique=False)
+        batch_op.create_index("ix_items_store_id_id", ["store_id", "id"], unique=False)
+        batch_op.create_index("ix_items_price_id", ["price", "id"], unique=False)
+
+    # (tag_id, item_id) covers the tag filters, and every lookup by tag_id
+    with op.batch_alter_table("items_tags", schema=None) as batch_op:
+        batch_op.drop_index("ix_items_tags_tag_id")
+        batch_op.create_index(
+            "ix_items_tags_tag_id_item_id", ["tag_id", "item_id"], unique=False
+        )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        for statement in POSTGRESQL_DDL:
+            op.execute(statement)
+    elif dialect == "sqlite":
+        for statement in SQLITE_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO items_fts(items_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_items_search")
+    elif dialect == "sqlite":
+        for trigger in ("items_fts_insert", "items_fts_delete", "items_fts_update"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS items_fts")
+
+    with op.batch_alter_table("items_tags", schema=None) as batch_op:
+        batch_op.drop_index("ix_items_tags_tag_id_item_id")
+        batch_op.create_index("ix_items_tags_tag_id", ["tag_id"], unique=False)
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_index("ix_items_price_id")
+        batch_op.drop_index("ix_items_store_id_id")
+        batch_op.drop_index("ix_items_store_id_name")
@@ -0,0 +1,54 @@
+"""ON DELETE CASCADE on the foreign keys to stores, items and tags, and
+stores.deleting for the background store deletions
+
+Revision ID: 7a9c4e2d6b31
+Revises: 3f7d2e8a9b14
+Create Date: 2026-10-17 19:12:40.517208
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7a9c4e2d6b31"
+down_revision = "3f7d2e8a9b14"
+branch_labels = None
+depends_on = None
+
+# (table, column, referenced table), named as PostgreSQL names unnamed constraints
+FOREIGN_KEYS = [
+    ("items", "store_id", "stores"),
+    ("tags", "store_id", "stores"),
+    ("items_tags", "item_id", "items"),
+    ("items_tags", "tag_id", "tags"),
+    ("store_stats", "store_id", "stores"),
+    ("tag_stats", "store_id", "stores"),
+    ("tag_stats", "tag_id", "tags"),
+]
+
+
+def replace_foreign_keys(ondelete):
+    # SQLite does not enforce foreign keys here (no PRAGMA foreign_keys), and
+    # the app deletes the dependent rows itself, so only PostgreSQL changes.
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for table, column, referenced in FOREIGN_KEYS:
+        name = f"{table}_{column}_fkey"
+        op.drop_constraint(name, table, type_="foreignkey")
+        op.create_foreign_key(name, table, referenced, [column], ["id"], ondelete=ondelete)
+
+
+def upgrade():
+    with op.batch_alter_table("stores", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("deleting", sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+
+    replace_foreign_keys("CASCADE")
+
+
+def downgrade():
+    replace_foreign_keys(None)
+
+    with op.batch_alter_table("stores", schema=None) as batch_op:
+        batch_op.drop_column("deleting")
@@ -0,0 +1,52 @@
+"""index foreign keys, and make (item_id, tag_id) unique on items_tags
+
+Revision ID: 8c41e9b07d25
+Revises: 5d2f8c1a7e43
+Create Date: 2026-10-17 14:03:48.771502
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c41e9b07d25"
+down_revision = "5d2f8c1a7e43"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Links could be duplicated until now; keep the oldest row of each pair so
+    # the unique index can be created.
+    op.execute(
+        sa.text(
+            "DELETE FROM items_tags WHERE id NOT IN ("
+            "SELECT MIN(id) FROM items_tags GROUP BY item_id, tag_id)"
+        )
+    )
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_items_store_id_price", ["store_id", "price"], unique=False
+        )
+
+    with op.batch_alter_table("tags", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_tags_store_id"), ["store_id"], unique=False)
+
+    with op.batch_alter_table("items_tags", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_items_tags_item_id_tag_id", ["item_id", "tag_id"], unique=True
+        )
+        batch_op.create_index("ix_items_tags_tag_id", ["tag_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("items_tags", schema=None) as batch_op:
+        batch_op.drop_index("ix_items_tags_tag_id")
+        batch_op.drop_index("ix_items_tags_item_id_tag_id")
+
+    with op.batch_alter_table("tags", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_tags_store_id"))
+
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_index("ix_items_store_id_price")
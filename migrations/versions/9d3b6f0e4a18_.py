@@ -0,0 +1,48 @@
+"""changes outbox table and change_compactions for the change feed
+
+Revision ID: 9d3b6f0e4a18
+Revises: c5e81f3a2d97
+Create Date: 2026-10-17 22:31:47.105826
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9d3b6f0e4a18"
+down_revision = "c5e81f3a2d97"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "changes",
+        sa.Column("seq", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), nullable=False),
+        sa.Column("entity", sa.String(length=16), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("deleted", sa.Boolean(), nullable=False),
+        sa.Column("changed_at", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("seq"),
+        sqlite_autoincrement=True,
+    )
+    with op.batch_alter_table("changes", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_changes_entity_entity_id_seq", ["entity", "entity_id", "seq"], unique=False
+        )
+
+    op.create_table(
+        "change_compactions",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("compacted_through", sa.BigInteger(), nullable=False),
+        sa.Column("compacted_at", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("change_compactions")
+    with op.batch_alter_table("changes", schema=None) as batch_op:
+        batch_op.drop_index("ix_changes_entity_entity_id_seq")
+
+    op.drop_table("changes")
@@ -0,0 +1,27 @@
+"""items.version for optimistic concurrency on item updates
+
+Revision ID: c5e81f3a2d97
+Revises: 7a9c4e2d6b31
+Create Date: 2026-10-17 21:05:13.448291
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c5e81f3a2d97"
+down_revision = "7a9c4e2d6b31"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("version", sa.Integer(), nullable=False, server_default="1")
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("items", schema=None) as batch_op:
+        batch_op.drop_column("version")
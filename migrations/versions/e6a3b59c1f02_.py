@@ -0,0 +1,66 @@
+"""store_stats and tag_stats summary tables
+
+Revision ID: e6a3b59c1f02
+Revises: 8c41e9b07d25
+Create Date: 2026-10-17 15:27:09.318764
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6a3b59c1f02"
+down_revision = "8c41e9b07d25"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "store_stats",
+        sa.Column("store_id", sa.Integer(), nullable=False),
+        sa.Column("item_count", sa.Integer(), nullable=False),
+        sa.Column("price_total", sa.Float(), nullable=False),
+        sa.Column("price_min", sa.Float(), nullable=True),
+        sa.Column("price_max", sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(["store_id"], ["stores.id"]),
+        sa.PrimaryKeyConstraint("store_id"),
+    )
+    op.create_table(
+        "tag_stats",
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.Column("store_id", sa.Integer(), nullable=False),
+        sa.Column("item_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["store_id"], ["stores.id"]),
+        sa.ForeignKeyConstraint(["tag_id"], ["tags.id"]),
+        sa.PrimaryKeyConstraint("tag_id"),
+    )
+    with op.batch_alter_table("tag_stats", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_tag_stats_store_id"), ["store_id"], unique=False)
+
+    # Same queries as `flask stats rebuild`
+    op.execute(
+        sa.text(
+            "INSERT INTO store_stats (store_id, item_count, price_total, price_min, price_max) "
+            "SELECT stores.id, COUNT(items.id), COALESCE(SUM(items.price), 0), "
+            "MIN(items.price), MAX(items.price) "
+            "FROM stores LEFT OUTER JOIN items ON items.store_id = stores.id "
+            "GROUP BY stores.id"
+        )
+    )
+    op.execute(
+        sa.text(
+            "INSERT INTO tag_stats (tag_id, store_id, item_count) "
+            "SELECT tags.id, tags.store_id, COUNT(items_tags.id) "
+            "FROM tags LEFT OUTER JOIN items_tags ON items_tags.tag_id = tags.id "
+            "GROUP BY tags.id, tags.store_id"
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("tag_stats", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_tag_stats_store_id"))
+
+    op.drop_table("tag_stats")
+    op.drop_table("store_stats")
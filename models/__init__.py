@@ -1,5 +1,9 @@
+from models.change import ChangeCompactionModel, ChangeModel
 from models.item import ItemModel
 from models.items_tags import ItemsTags
+from models.revoked_token import RevokedTokenModel
 from models.store import StoreModel
+from models.store_stats import StoreStatsModel
 from models.tag import TagModel
+from models.tag_stats import TagStatsModel
 from models.user import UserModel
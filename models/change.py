@@ -0,0 +1,25 @@
+from db import db
+
+
+class ChangeModel(db.Model):
+    __tablename__ = "changes"
+    __table_args__ = (
+        db.Index("ix_changes_entity_entity_id_seq", "entity", "entity_id", "seq"),
+        # seqs of deleted rows are never handed out again
+        {"sqlite_autoincrement": True},
+    )
+
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True)
+    entity = db.Column(db.String(16), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.Integer, nullable=False)
+
+
+class ChangeCompactionModel(db.Model):
+    __tablename__ = "change_compactions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Deletion entries up to this seq were removed
+    compacted_through = db.Column(db.BigInteger, nullable=False)
+    compacted_at = db.Column(db.Integer, nullable=False)
@@ -3,12 +3,19 @@ from db import db
 
 class ItemModel(db.Model):
     __tablename__ = "items"
+    __table_args__ = (
+        db.Index("ix_items_store_id_price", "store_id", "price"),
+        db.Index("ix_items_store_id_name", "store_id", "name"),
+        db.Index("ix_items_store_id_id", "store_id", "id"),
+        db.Index("ix_items_price_id", "price", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key = True)
     name = db.Column(db.String(80), unique = True, nullable = False)
     description = db.Column(db.String())
     price = db.Column(db.Float(precision = 2), unique = False, nullable = False)
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), unique = False, nullable = False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete = "CASCADE"), unique = False, nullable = False)
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1")
 
     store = db.relationship("StoreModel", back_populates = "items")
     tags = db.relationship("TagModel", back_populates = "items", secondary = "items_tags")
\ No newline at end of file
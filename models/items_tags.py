@@ -3,7 +3,11 @@ from db import db
 
 class ItemsTags(db.Model):
     __tablename__ = "items_tags"
+    __table_args__ = (
+        db.Index("ix_items_tags_item_id_tag_id", "item_id", "tag_id", unique = True),
+        db.Index("ix_items_tags_tag_id_item_id", "tag_id", "item_id"),
+    )
 
     id = db.Column(db.Integer, primary_key = True)
-    tag_id = db.Column(db.Integer, db.ForeignKey("tags.id"))
-    item_id = db.Column(db.Integer, db.ForeignKey("items.id"))
\ No newline at end of file
+    tag_id = db.Column(db.Integer, db.ForeignKey("tags.id", ondelete = "CASCADE"))
+    item_id = db.Column(db.Integer, db.ForeignKey("items.id", ondelete = "CASCADE"))
\ No newline at end of file
@@ -0,0 +1,8 @@
+from db import db
+
+
+class RevokedTokenModel(db.Model):
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(36), primary_key=True)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
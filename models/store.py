@@ -6,6 +6,7 @@ class StoreModel(db.Model):
 
     id = db.Column(db.Integer, primary_key = True)
     name = db.Column(db.String(80), unique = True, nullable = False)
+    deleting = db.Column(db.Boolean, nullable = False, default = False, server_default = db.false())
 
-    items = db.relationship("ItemModel", back_populates = "store", lazy = "dynamic", cascade = "all, delete")
-    tags = db.relationship("TagModel", back_populates = "store", lazy = "dynamic")
\ No newline at end of file
+    items = db.relationship("ItemModel", back_populates = "store", cascade = "all, delete", passive_deletes = True)
+    tags = db.relationship("TagModel", back_populates = "store", cascade = "all, delete", passive_deletes = True)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from db import db
+
+
+class StoreStatsModel(db.Model):
+    __tablename__ = "store_stats"
+
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    price_total = db.Column(db.Float, nullable=False, default=0)
+    price_min = db.Column(db.Float)
+    price_max = db.Column(db.Float)
+
+    tags = db.relationship(
+        "TagStatsModel",
+        primaryjoin="StoreStatsModel.store_id == foreign(TagStatsModel.store_id)",
+        order_by="TagStatsModel.tag_id",
+        viewonly=True,
+    )
+
+    @property
+    def price_avg(self):
+        if not self.item_count:
+            return None
+        return self.price_total / self.item_count
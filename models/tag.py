@@ -6,7 +6,7 @@ class TagModel(db.Model):
 
     id = db.Column(db.Integer, primary_key = True)
     name = db.Column(db.String(80), unique = True, nullable = False)
-    store_id = db.Column(db.Integer, db.ForeignKey("stores.id"), nullable = False)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete = "CASCADE"), nullable = False, index = True)
 
     store = db.relationship("StoreModel", back_populates = "tags")
     items = db.relationship("ItemModel", back_populates = "tags", secondary = "items_tags")
\ No newline at end of file
@@ -0,0 +1,9 @@
+from db import db
+
+
+class TagStatsModel(db.Model):
+    __tablename__ = "tag_stats"
+
+    tag_id = db.Column(db.Integer, db.ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
+    store_id = db.Column(db.Integer, db.ForeignKey("stores.id", ondelete="CASCADE"), nullable=False, index=True)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
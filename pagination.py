@@ -0,0 +1,134 @@
+"""
+pagination.py
+
+Keyset (cursor) pagination for the list endpoints. Pages are selected with
+`WHERE id > <last id> ORDER BY id LIMIT n` so every page costs the same no matter
+how deep into the table it is. The cursor handed out to clients is opaque, so
+the ordering it encodes can grow without breaking them.
+
+Lists sorted on a non-unique column are paged on (column, id), with a row value
+comparison `WHERE (price, id) > (?, ?)` that an index on (price, id) serves.
+"""
+
+import base64
+import json
+
+from flask import Response, current_app, request, stream_with_context, url_for
+from flask_smorest import abort
+from sqlalchemy import tuple_
+
+PAGINATION_HEADERS = {
+    "Link": {
+        "description": 'Link to the next page, with `rel="next"`.',
+        "schema": {"type": "string"},
+    },
+    "X-Next-Cursor": {
+        "description": "Cursor to pass as `after` to get the next page. Absent on the last page.",
+        "schema": {"type": "string"},
+    },
+}
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length=None):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        abort(400, message="Invalid pagination cursor.")
+
+    if not isinstance(values, list) or not values:
+        abort(400, message="Invalid pagination cursor.")
+    if length is not None and len(values) != length:
+        abort(400, message="Invalid pagination cursor.")
+
+    return values
+
+
+def after_cursor(query, columns, after, descending=False):
+    """Filters `query` to the rows that come after the cursor in the ordering."""
+    if after is None:
+        return query
+
+    values = decode_cursor(after, len(columns))
+    if len(columns) == 1:
+        key, values = columns[0], values[0]
+    else:
+        key = tuple_(*columns)
+    return query.filter(key < values if descending else key > values)
+
+
+def ordered(query, columns, descending=False):
+    return query.order_by(*(column.desc() if descending else column for column in columns))
+
+
+def page_limit(limit):
+    default = current_app.config["PAGINATION_DEFAULT_LIMIT"]
+    return min(limit or default, current_app.config["PAGINATION_MAX_LIMIT"])
+
+
+def keyset_paginate(query, columns, limit=None, after=None, descending=False):
+    """Returns one page of `query` ordered by `columns` and the response headers
+    pointing at the next page.
+
+    `columns` is a column, or a tuple of columns whose last one is unique.
+    One extra row is fetched to know whether a next page exists without a COUNT.
+    """
+    query, columns, limit = page_query(query, columns, limit, after, descending)
+    return page_of(query.all(), columns, limit)
+
+
+def page_query(query, columns, limit=None, after=None, descending=False):
+    """The query (or select) of one page, plus one row, and the columns and
+    limit to pass to `page_of` with its rows."""
+    columns = columns if isinstance(columns, tuple) else (columns,)
+    limit = page_limit(limit)
+
+    query = after_cursor(query, columns, after, descending)
+    return ordered(query, columns, descending).limit(limit + 1), columns, limit
+
+
+def page_of(rows, columns, limit):
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{next_page_url(cursor, limit)}>; rel="next"'
+
+    return rows, headers
+
+
+def next_page_url(cursor, limit):
+    # Repeated arguments (`tag=1&tag=2`) are all kept
+    args = request.args.to_dict(flat=False)
+    args.update(after=cursor, limit=limit)
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
+
+
+def stream_ndjson(query, columns, schema, after=None, descending=False):
+    """Streams every row of `query` after the cursor as newline delimited JSON.
+
+    Rows are pulled from a server-side cursor in chunks of `STREAM_CHUNK_SIZE`,
+    so memory use does not depend on the size of the table.
+    """
+    columns = columns if isinstance(columns, tuple) else (columns,)
+    query = after_cursor(query, columns, after, descending)
+
+    query = (
+        ordered(query, columns, descending)
+        .execution_options(stream_results=True)
+        .yield_per(current_app.config["STREAM_CHUNK_SIZE"])
+    )
+
+    def generate():
+        for row in query:
+            yield json.dumps(schema.dump(row), separators=(",", ":")) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
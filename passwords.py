@@ -0,0 +1,99 @@
+"""
+passwords.py
+
+Password hashing for /register and /login, configured from the app config:
+
+- PASSWORD_SCHEMES: comma separated passlib schemes. The first one hashes new
+  passwords, the others are only accepted for verification. argon2 and bcrypt
+  need the `argon2-cffi` and `bcrypt` packages.
+- PASSWORD_ROUNDS: cost of the default scheme (passlib `rounds`: iterations
+  for pbkdf2, log2 rounds for bcrypt, time cost for argon2). Hashes made with
+  another scheme or cost are rehashed transparently on the next successful login.
+- PASSWORD_HASH_WORKERS: when > 0, hashing runs in a process pool of that size
+  instead of on the request thread, and at most PASSWORD_HASH_MAX_PENDING
+  hashes may be queued. Past that, `PasswordHasherBusy` is raised so that a login
+  storm is turned away instead of starving every other endpoint.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from threading import BoundedSemaphore, Lock
+
+from passlib.context import CryptContext
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+@lru_cache(maxsize=8)
+def crypt_context(settings):
+    """Builds the CryptContext once per process for a given settings tuple."""
+    return CryptContext(**dict(settings))
+
+
+def _hash(settings, password):
+    return crypt_context(settings).hash(password)
+
+
+def _verify_and_update(settings, password, password_hash):
+    return crypt_context(settings).verify_and_update(password, password_hash)
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.settings = (("schemes", ("pbkdf2_sha256",)), ("deprecated", "auto"))
+        self.workers = 0
+        self.max_pending = 0
+        self._pool = None
+        self._pool_pid = None
+        self._slots = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        schemes = tuple(app.config["PASSWORD_SCHEMES"])
+        settings = {"schemes": schemes, "deprecated": "auto"}
+
+        rounds = app.config.get("PASSWORD_ROUNDS")
+        if rounds:
+            # min and max desired bounds make hashes of any other cost "need
+            # update", so lowering the cost is picked up as well as raising it.
+            for name in ("default_rounds", "min_desired_rounds", "max_desired_rounds"):
+                settings[f"{schemes[0]}__{name}"] = rounds
+
+        self.settings = tuple(sorted(settings.items()))
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", 0)
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", 0)
+        self._slots = BoundedSemaphore(self.workers + self.max_pending)
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def verify_and_update(self, password, password_hash):
+        """Returns (valid, new_hash); new_hash is None unless the stored hash
+        uses outdated parameters and should be replaced."""
+        return self._run(_verify_and_update, password, password_hash)
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(self.settings, *args)
+
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._executor().submit(func, self.settings, *args).result()
+        finally:
+            self._slots.release()
+
+    def _executor(self):
+        # A pool inherited through fork (gunicorn preload) is unusable, so each
+        # process starts its own on first use.
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+
+PASSWORD_HASHER = PasswordHasher()
@@ -0,0 +1,31 @@
+"""
+query_shaping.py
+
+Eager loading options for each response schema. Schemas nest relationships
+(`ItemSchema.store`, `StoreSchema.items`, ...), and dumping a list of rows with
+lazy relationships fires one query per row and relationship. Querying through
+`shaped_query` loads everything a schema dumps in a fixed number of statements,
+whatever the number of rows, which tests/test_statement_counts.py checks for
+every list and detail endpoint.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from db import db
+from models import ItemModel, StoreModel, StoreStatsModel, TagModel
+from schemas import ItemSchema, StoreSchema, StoreStatsSchema, TagSchema
+
+# Many-to-one relationships are joined into the main query, collections are
+# loaded with one extra "SELECT ... WHERE id IN (...)" per relationship.
+LOAD_OPTIONS = {
+    ItemSchema: (joinedload(ItemModel.store), selectinload(ItemModel.tags)),
+    StoreSchema: (selectinload(StoreModel.items), selectinload(StoreModel.tags)),
+    TagSchema: (joinedload(TagModel.store), selectinload(TagModel.items)),
+    StoreStatsSchema: (selectinload(StoreStatsModel.tags),),
+}
+
+
+def shaped_query(model, schema):
+    """Returns a query on `model` that eagerly loads what `schema` dumps."""
+    return model.query.options(*LOAD_OPTIONS[schema])
+
@@ -0,0 +1,228 @@
+"""
+reference_cache.py
+
+Per-worker read-through cache of the small, hot reference rows that the write
+paths look up to validate requests: stores and tags, by id and by name.
+
+`REFERENCE_CACHE.stores` and `REFERENCE_CACHE.tags` keep the rows they read as
+plain named tuples (`StoreRef`, `TagRef`) in LRUs of `REFERENCE_CACHE_SIZE`
+rows each, for at most `REFERENCE_CACHE_TTL` seconds. Ids that do not exist are
+not cached. Write paths pass `cached=False`: the row they are about to write
+against must still exist, which only the database knows (SQLite does not
+enforce the foreign keys).
+
+A commit that wrote to the stores or tags table (through the ORM or a Core
+statement) empties that table's cache, and so does a rollback, so that rows
+read inside a transaction that never committed are not kept. With
+`REFERENCE_CACHE_REDIS_URL` set the tables to empty are also published on a
+Redis channel, and every worker drops them when it hears about it. Without it
+the other workers would keep serving deleted rows, so the cache is off unless
+`REFERENCE_CACHE_REDIS_URL` is set. Redis errors are logged and do not fail
+the request; a worker that lost the channel empties its cache when it is back.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import abort
+from sqlalchemy import event, select
+
+from db import db
+from models import StoreModel, TagModel
+
+CHANNEL = "reference-cache:invalidate"
+# Seconds between attempts to subscribe again after losing Redis
+LISTEN_RETRY_INTERVAL = 1
+
+StoreRef = namedtuple("StoreRef", ["id", "name"])
+TagRef = namedtuple("TagRef", ["id", "name", "store_id"])
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceTable:
+    def __init__(self, cache, model, ref):
+        self.cache = cache
+        self.model = model
+        self.ref = ref
+        self.columns = [getattr(model, field) for field in ref._fields]
+        self.size = 1024
+        self.ttl = 300
+        self._rows = OrderedDict()
+        self._ids = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def table_name(self):
+        return self.model.__tablename__
+
+    def get(self, row_id, cached=True):
+        """The row with this id, or None."""
+        return self.get_many([row_id], cached).get(row_id)
+
+    def get_or_404(self, row_id, cached=True):
+        row = self.get(row_id, cached)
+        if row is None:
+            abort(404)
+        return row
+
+    def get_many(self, row_ids, cached=True):
+        """{id: row} of the ids that exist, reading the missing ones (all of
+        them if not `cached`) in one query."""
+        self.cache.listen()
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            for row_id in row_ids:
+                entry = self._rows.get(row_id) if cached else None
+                if entry is not None and now < entry[1]:
+                    self._rows.move_to_end(row_id)
+                    found[row_id] = entry[0]
+                else:
+                    missing.append(row_id)
+
+        if missing:
+            for values in db.session.execute(
+                select(*self.columns).where(self.model.id.in_(missing))
+            ):
+                found[values[0]] = self._remember(self.ref(*values), now, generation)
+        return found
+
+    def id_for(self, name):
+        """The id of the row with this name, or None."""
+        with self._lock:
+            generation = self._generation
+            row_id = self._ids.get(name)
+        if row_id is not None:
+            row = self.get(row_id)
+            if row is not None and row.name == name:
+                return row_id
+
+        values = db.session.execute(
+            select(*self.columns).where(self.model.name == name)
+        ).first()
+        if values is None:
+            return None
+        return self._remember(self.ref(*values), time.monotonic(), generation).id
+
+    def _remember(self, row, now, generation):
+        with self._lock:
+            # Not kept if the table was invalidated while the row was read
+            if generation != self._generation:
+                return row
+            self._rows[row.id] = (row, now + self.ttl)
+            self._rows.move_to_end(row.id)
+            self._ids[row.name] = row.id
+            while len(self._rows) > self.size:
+                evicted, _ = self._rows.popitem(last=False)[1]
+                self._ids.pop(evicted.name, None)
+        return row
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._rows.clear()
+            self._ids.clear()
+
+
+class ReferenceCache:
+    def __init__(self):
+        self.enabled = False
+        self.stores = ReferenceTable(self, StoreModel, StoreRef)
+        self.tags = ReferenceTable(self, TagModel, TagRef)
+        self.tables = {table.table_name: table for table in (self.stores, self.tags)}
+        self.redis = None
+        self.redis_errors = ()
+        self._listener_pid = None
+
+    def init_app(self, app):
+        redis_url = app.config.get("REFERENCE_CACHE_REDIS_URL")
+        self.enabled = bool(app.config.get("REFERENCE_CACHE_ENABLED") and redis_url)
+        if app.config.get("REFERENCE_CACHE_ENABLED") and not redis_url:
+            logger.warning("The reference cache is off: it needs REFERENCE_CACHE_REDIS_URL")
+        for table in self.tables.values():
+            table.size = app.config.get("REFERENCE_CACHE_SIZE", table.size) if self.enabled else 0
+            table.ttl = app.config.get("REFERENCE_CACHE_TTL", table.ttl)
+            table.clear()
+
+        self.redis = None
+        if self.enabled:
+            import redis
+
+            self.redis = redis.from_url(redis_url)
+            self.redis_errors = (redis.exceptions.RedisError,)
+
+        if not event.contains(db.session, "after_flush", _mark_dirty_on_flush):
+            event.listen(db.session, "after_flush", _mark_dirty_on_flush)
+            event.listen(db.session, "do_orm_execute", _mark_dirty_on_execute)
+            event.listen(db.session, "after_commit", _invalidate_on_end)
+            event.listen(db.session, "after_rollback", _invalidate_on_end)
+
+    def invalidate(self, table_names, publish=True):
+        for name in table_names:
+            self.tables[name].clear()
+        if publish and self.redis is not None:
+            try:
+                self.redis.publish(CHANNEL, ",".join(sorted(table_names)))
+            except self.redis_errors as error:
+                # Runs after the commit: the write stands, the other workers
+                # see it when their entries expire
+                logger.warning("Reference cache invalidation not published: %s", error)
+
+    def listen(self):
+        """Starts the thread that applies the invalidations published by the
+        other workers, once per process (threads do not survive a fork)."""
+        if self.redis is None or self._listener_pid == os.getpid():
+            return
+        self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name="reference-cache", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Invalidations published while not subscribed are lost
+                self.invalidate(self.tables, publish=False)
+                for message in pubsub.listen():
+                    self._apply(message)
+            except self.redis_errors as error:
+                logger.warning("Reference cache lost its Redis channel: %s", error)
+                time.sleep(LISTEN_RETRY_INTERVAL)
+
+    def _apply(self, message):
+        try:
+            names = message["data"].decode().split(",")
+            self.invalidate([name for name in names if name in self.tables], publish=False)
+        except Exception:
+            logger.exception("Bad reference cache invalidation: %r", message)
+
+
+REFERENCE_CACHE = ReferenceCache()
+
+
+def _mark_dirty(session, table_name):
+    if table_name in REFERENCE_CACHE.tables:
+        session.info.setdefault("reference_cache_dirty", set()).add(table_name)
+
+
+def _mark_dirty_on_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        _mark_dirty(session, getattr(obj, "__tablename__", None))
+
+
+def _mark_dirty_on_execute(orm_execute_state):
+    if not orm_execute_state.is_select:
+        table = getattr(orm_execute_state.statement, "table", None)
+        _mark_dirty(orm_execute_state.session, getattr(table, "name", None))
+
+
+def _invalidate_on_end(session):
+    dirty = session.info.pop("reference_cache_dirty", None)
+    if dirty:
+        REFERENCE_CACHE.invalidate(dirty)
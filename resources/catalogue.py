@@ -0,0 +1,62 @@
+import io
+
+from flask import Response, request, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from catalogue import MIMETYPES, CatalogueImport, export_lines, read_rows
+from custom_decorators import jwt_required_with_doc
+from schemas import (
+    CatalogueExportArgsSchema,
+    CatalogueImportArgsSchema,
+    CatalogueImportResultSchema,
+)
+
+blp = Blueprint("catalogue", __name__, description="Import and export of the whole catalogue")
+
+FILE_BODY = {
+    "content": {
+        mimetype: {"schema": {"type": "string", "format": "binary"}}
+        for mimetype in MIMETYPES.values()
+    }
+}
+
+
+@blp.route("/catalogue/export")
+class CatalogueExport(MethodView):
+    @blp.arguments(CatalogueExportArgsSchema, location="query")
+    @blp.response(200, content_type="application/x-ndjson")
+    def get(self, args):
+        """Exports the catalogue
+
+        Streams every Item with its Store and Tag names, as CSV or newline delimited JSON.
+        """
+        mimetype = MIMETYPES[args["format"]]
+        return Response(
+            stream_with_context(export_lines(args["format"], args.get("store_id"))),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": f"attachment; filename=catalogue.{args['format']}"
+            },
+        )
+
+
+@blp.route("/catalogue/import")
+class CatalogueImportView(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(CatalogueImportArgsSchema, location="query")
+    @blp.doc(requestBody=FILE_BODY)
+    @blp.response(200, CatalogueImportResultSchema)
+    def post(self, args):
+        """Imports a catalogue file
+
+        Reads a CSV or newline delimited JSON file sent as the request body, with one
+        Item per row: `name`, `description`, `price`, `store` and `tags` (names, `|`
+        separated in CSV). <br>
+        Rows are written in batches, each committed on its own, and the answer counts
+        the rows created, updated and failed, with the first errors by line.
+        """
+        lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="")
+        return CatalogueImport(args["upsert"], args["create_missing"]).run(
+            read_rows(lines, args["format"])
+        )
@@ -0,0 +1,59 @@
+from flask import Response, current_app, request, stream_with_context
+from flask.views import MethodView
+from flask_smorest import Blueprint, abort
+
+from changes import CHANGE_FEED
+from custom_decorators import jwt_required_with_doc
+from schemas import ChangesArgsSchema, ChangesSchema
+
+blp = Blueprint("changes", __name__, description="Change feed of Items, Stores and Tags")
+
+
+@blp.route("/changes")
+class Changes(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(ChangesArgsSchema, location="query")
+    @blp.response(200, ChangesSchema)
+    @blp.alt_response(410, description="Changes after `since` were compacted away")
+    def get(self, args):
+        """Gets the changes since a position
+
+        Returns the Items, Stores and Tags created, updated or deleted after `since`, in
+        order, with the current data of each. Pass `last_seq` as `since` to get the next ones. <br>
+        With `wait`, waits that many seconds for changes if there are none yet. <br>
+        With `Accept: text/event-stream`, streams the changes as Server-Sent Events whose
+        `id` is the `seq`; reconnecting with `Last-Event-ID` resumes after it. <br>
+        A 410 means that the feed was compacted past `since`: sync in full again, then
+        follow the feed from the `last_seq` of a request without `since`.
+        """
+        config = current_app.config
+        since = args.get("since")
+        last_event_id = request.headers.get("Last-Event-ID", "")
+        if since is None and last_event_id.isdigit():
+            since = int(last_event_id)
+        streaming = (
+            request.accept_mimetypes.best_match(["application/json", "text/event-stream"])
+            == "text/event-stream"
+        )
+
+        if since is None:
+            if not streaming:
+                return {"changes": [], "last_seq": CHANGE_FEED.head()}
+            since = CHANGE_FEED.head()
+        elif since < CHANGE_FEED.horizon():
+            abort(410, message="The changes since then were compacted, sync in full again.")
+
+        if streaming:
+            return Response(
+                stream_with_context(CHANGE_FEED.stream(since, args.get("entity"))),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+        limit = min(
+            args.get("limit", config["PAGINATION_DEFAULT_LIMIT"]), config["PAGINATION_MAX_LIMIT"]
+        )
+        entries, last_seq = CHANGE_FEED.wait(
+            since, limit, min(args["wait"], config["CHANGES_MAX_WAIT"]), args.get("entity")
+        )
+        return {"changes": entries, "last_seq": last_seq}
@@ -1,50 +1,106 @@
+from flask import Response, request
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from sqlalchemy.exc import SQLAlchemyError
 
+from bulk import delete_items, write_items
+from changes import record_changed, record_deleted
 from custom_decorators import jwt_required_with_doc
 from db import db
+from item_search import SORTS, filter_items
+from item_versions import etag, if_match_versions, item_exists, update_item
 from models import ItemModel
-from schemas import ItemSchema, ItemUpdateSchema
+from pagination import PAGINATION_HEADERS, keyset_paginate, stream_ndjson
+from query_shaping import shaped_query
+from response_cache import RESPONSE_CACHE
+from schemas import (
+    BulkArgsSchema,
+    BulkResultSchema,
+    ItemBulkDeleteSchema,
+    ItemBulkSchema,
+    ItemListArgsSchema,
+    ItemSchema,
+    ItemUpdateSchema,
+)
+from stats import items_changed, links_of_items, tags_changed
 
 blp = Blueprint("items", __name__, description="Operations on Items")
 
+UPDATE_HEADERS = [
+    {
+        "in": "header",
+        "name": "If-Match",
+        "description": "ETag of the Item as last read; the update fails with 412 if it changed since",
+        "schema": {"type": "string"},
+    },
+    {
+        "in": "header",
+        "name": "Prefer",
+        "description": "`return=minimal` answers 204 with the new ETag instead of the Item",
+        "schema": {"type": "string"},
+    },
+]
+
 
 @blp.route("/item/<int:item_id>")
 class Item(MethodView):
+    @RESPONSE_CACHE.cached
     @blp.response(200, ItemSchema)
     def get(self, item_id):
         """Finds Item by ID
 
         Returns Item Based on ID.
         """
-        item = ItemModel.query.get_or_404(item_id)
-        return item
+        item = shaped_query(ItemModel, ItemSchema).get_or_404(item_id)
+        return item, 200, {"ETag": etag(item.version)}
 
     @jwt_required_with_doc()
     @blp.arguments(
         ItemUpdateSchema, example={"name": "Updated Item Name", "price": 14.69}
     )
+    @blp.doc(parameters=UPDATE_HEADERS)
     @blp.response(200, ItemSchema)
+    @blp.alt_response(204, description="Updated, with `Prefer: return=minimal`")
+    @blp.alt_response(412, description="The Item is not at the version given in `If-Match`")
     def put(self, item_data, item_id):
         """Updates the name and price of a specific Item
 
         Updates the name and price of an item with a particular item ID. <br>
         Store ID associated with an Item cannot be changed. <br>
         If no item with that ID exists, it creates a new item with that ID, but for that,
-        associated store ID also needs to passed in request.
+        associated store ID also needs to passed in request. <br>
+        With `If-Match` set to the Item's `ETag`, the update only applies if nobody changed
+        the Item since, and fails with 412 otherwise.
         """
-        item = ItemModel.query.get(item_id)
-        if item:
-            item.price = item_data["price"]
-            item.name = item_data["name"]
+        values = {key: item_data[key] for key in ("name", "price") if key in item_data}
+        versions = if_match_versions()
+        for _ in range(2):
+            written = update_item(item_id, values, versions)
+            if written is not None or request.if_match or not item_exists(item_id):
+                break
+            # Changed by a concurrent request between the read and the write
+        else:
+            abort(409, message="The item was changed concurrently, try again.")
+
+        if written is not None:
+            version, store_id, old_price = written
+            if values.get("price", old_price) != old_price:
+                items_changed({store_id: (0, values["price"] - old_price)})
+        elif request.if_match:
+            abort(412, message="The item was changed since it was read, or does not exist.")
         else:
             item = ItemModel(id=item_id, **item_data)
-
-        db.session.add(item)
+            db.session.add(item)
+            items_changed({item.store_id: (1, item.price)})
+            version = item.version
+        record_changed("item", [item_id])
         db.session.commit()
 
-        return item
+        headers = {"ETag": etag(version)}
+        if "return=minimal" in request.headers.get("Prefer", ""):
+            headers["Preference-Applied"] = "return=minimal"
+            return Response(status=204, headers=headers)
+        return shaped_query(ItemModel, ItemSchema).get(item_id), 200, headers
 
     @jwt_required_with_doc(fresh=True)
     def delete(self, item_id):
@@ -52,21 +108,44 @@ class Item(MethodView):
 
         Deletes items based on item IDs
         """
-        item = ItemModel.query.get(item_id)
+        item = ItemModel.query.get_or_404(item_id)
+        deltas = {item.store_id: (-1, -item.price)}
+        links = links_of_items([item_id])
+
         db.session.delete(item)
+        items_changed(deltas)
+        tags_changed({tag_id: -count for tag_id, count in links.items()})
+        record_deleted("item", [item_id])
         db.session.commit()
         return {"message": "Item Deleted"}
 
 
 @blp.route("/item")
 class ItemList(MethodView):
-    @blp.response(200, ItemSchema(many=True))
-    def get(self):
+    @RESPONSE_CACHE.cached
+    @blp.arguments(ItemListArgsSchema, location="query")
+    @blp.response(200, ItemSchema(many=True), headers=PAGINATION_HEADERS)
+    def get(self, args):
         """Gets all Items
 
-        Returns all Items present in Database.
+        Returns Items present in Database, one page at a time ordered by ID, or by `sort`. <br>
+        Items can be filtered by Store, Tags, price range and name prefix, and searched with `q`. <br>
+        Pass the `X-Next-Cursor` header of a page as `after` to get the next one. <br>
+        With `format=ndjson` all Items are streamed as newline delimited JSON.
         """
-        return ItemModel.query.all()
+        query = filter_items(shaped_query(ItemModel, ItemSchema), args)
+        columns = SORTS[args["sort"].lstrip("-")]
+        descending = args["sort"].startswith("-")
+
+        if args.get("format") == "ndjson":
+            return stream_ndjson(
+                query, columns, ItemSchema(), after=args.get("after"), descending=descending
+            )
+
+        items, headers = keyset_paginate(
+            query, columns, args.get("limit"), args.get("after"), descending
+        )
+        return items, 200, headers
 
     @jwt_required_with_doc()
     @blp.arguments(ItemSchema)
@@ -80,8 +159,65 @@ class ItemList(MethodView):
 
         try:
             db.session.add(item)
+            items_changed({item.store_id: (1, item.price)})
+            record_changed("item", [item.id])
             db.session.commit()
         except SQLAlchemyError:
             abort(500, "An Error occurred while inserting the item.")
 
-        return item, 201
+        return item, 201, {"ETag": etag(item.version)}
+
+
+@blp.route("/item/bulk")
+class ItemBulk(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(BulkArgsSchema, location="query")
+    @blp.arguments(
+        ItemBulkSchema,
+        example={"items": [{"name": "Chair", "price": 17.99, "store_id": 1}]},
+    )
+    @blp.response(200, BulkResultSchema)
+    def post(self, args, bulk_data):
+        """Creates many Items at once
+
+        Validates and inserts a list of Items in batches, returning a result or the
+        errors for each Item, in request order. <br>
+        With `upsert=true`, Items whose name already exists get their price updated.
+        """
+        try:
+            return write_items(bulk_data["items"], **args)
+        except SQLAlchemyError:
+            abort(500, message="An Error occurred while inserting the items.")
+
+    @jwt_required_with_doc(fresh=True)
+    @blp.arguments(BulkArgsSchema(only=("atomic",)), location="query")
+    @blp.arguments(ItemBulkDeleteSchema, example={"ids": [1, 2, 3]})
+    @blp.response(200, BulkResultSchema)
+    def delete(self, args, bulk_data):
+        """Deletes many Items at once
+
+        Deletes Items by ID, returning a result for each ID, in request order.
+        """
+        try:
+            return delete_items(bulk_data["ids"], **args)
+        except SQLAlchemyError:
+            abort(500, message="An Error occurred while deleting the items.")
+
+
+@blp.route("/store/<int:store_id>/items/bulk")
+class StoreItemBulk(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(BulkArgsSchema, location="query")
+    @blp.arguments(
+        ItemBulkSchema, example={"items": [{"name": "Chair", "price": 17.99}]}
+    )
+    @blp.response(200, BulkResultSchema)
+    def post(self, args, bulk_data, store_id):
+        """Creates many Items in a Store at once
+
+        Same as `/item/bulk`, with every Item created in the Store from the URL.
+        """
+        try:
+            return write_items(bulk_data["items"], store_id=store_id, **args)
+        except SQLAlchemyError:
+            abort(500, message="An Error occurred while inserting the items.")
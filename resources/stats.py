@@ -0,0 +1,52 @@
+from flask.views import MethodView
+from flask_smorest import Blueprint
+
+from models import StoreStatsModel
+from pagination import PAGINATION_HEADERS, keyset_paginate, stream_ndjson
+from query_shaping import shaped_query
+from response_cache import RESPONSE_CACHE
+from schemas import ListArgsSchema, StoreStatsSchema
+
+blp = Blueprint("stats", __name__, description="Inventory statistics of Stores")
+
+
+@blp.route("/store/<int:store_id>/stats")
+class StoreStats(MethodView):
+    @RESPONSE_CACHE.cached
+    @blp.response(200, StoreStatsSchema)
+    def get(self, store_id):
+        """Gets the inventory statistics of a Store
+
+        Returns the number of items, the min, max, average and total price of
+        the items, and the number of items linked to each tag of the Store.
+        """
+        return shaped_query(StoreStatsModel, StoreStatsSchema).get_or_404(store_id)
+
+
+@blp.route("/stats/stores")
+class StoreStatsList(MethodView):
+    @RESPONSE_CACHE.cached
+    @blp.arguments(ListArgsSchema, location="query")
+    @blp.response(200, StoreStatsSchema(many=True), headers=PAGINATION_HEADERS)
+    def get(self, args):
+        """Gets the inventory statistics of all Stores
+
+        Returns the statistics of every Store one page at a time ordered by Store ID. <br>
+        Pass the `X-Next-Cursor` header of a page as `after` to get the next one. <br>
+        With `format=ndjson` all of them are streamed as newline delimited JSON.
+        """
+        if args.get("format") == "ndjson":
+            return stream_ndjson(
+                shaped_query(StoreStatsModel, StoreStatsSchema),
+                StoreStatsModel.store_id,
+                StoreStatsSchema(),
+                after=args.get("after"),
+            )
+
+        stats, headers = keyset_paginate(
+            shaped_query(StoreStatsModel, StoreStatsSchema),
+            StoreStatsModel.store_id,
+            args.get("limit"),
+            args.get("after"),
+        )
+        return stats, 200, headers
@@ -1,47 +1,101 @@
+from flask import url_for
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from custom_decorators import jwt_required_with_doc
+from changes import record_changed
 from db import db
 from models import StoreModel
-from schemas import StoreSchema
+from pagination import PAGINATION_HEADERS, keyset_paginate, stream_ndjson
+from query_shaping import shaped_query
+from reference_cache import REFERENCE_CACHE
+from response_cache import RESPONSE_CACHE
+from schemas import ListArgsSchema, StoreDeleteArgsSchema, StoreDeletionSchema, StoreSchema
+from stats import store_created
+from store_deletion import delete_store, deletion_progress, start_deletion
 
 blp = Blueprint("stores", __name__, description="Operations on Stores")
 
 
 @blp.route("/store/<int:store_id>")
 class Store(MethodView):
+    @RESPONSE_CACHE.cached
     @blp.response(200, StoreSchema)
     def get(self, store_id):
         """Gets store by store ID
 
         Returns store based on Store ID.
         """
-        store = StoreModel.query.get_or_404(store_id)
+        store = shaped_query(StoreModel, StoreSchema).get_or_404(store_id)
         return store
 
     @jwt_required_with_doc(fresh=True)
-    def delete(self, store_id):
+    @blp.arguments(StoreDeleteArgsSchema, location="query")
+    def delete(self, args, store_id):
         """Deletes Store by Store ID
 
-        Deletes store based on Store ID
+        Deletes store based on Store ID, with its Items, Tags and their links. <br>
+        With `background=true` a job deletes it in chunks and the answer is 202,
+        with the progress at `/store/<store_id>/deletion`.
         """
-        store = StoreModel.query.get_or_404(store_id)
-        db.session.delete(store)
-        db.session.commit()
+        if args["background"]:
+            if not start_deletion(store_id):
+                abort(404)
+            location = url_for("stores.StoreDeletion", store_id=store_id)
+            return {"message": "Store deletion started"}, 202, {"Location": location}
+
+        REFERENCE_CACHE.stores.get_or_404(store_id, cached=False)
+        try:
+            delete_store(store_id)
+            db.session.commit()
+        except SQLAlchemyError:
+            abort(500, message="An Error occurred while deleting the store.")
         return {"message": "Store Deleted"}
 
 
+@blp.route("/store/<int:store_id>/deletion")
+class StoreDeletion(MethodView):
+    @blp.response(200, StoreDeletionSchema)
+    def get(self, store_id):
+        """Gets the progress of a Store deletion
+
+        Returns how many Items and Tags the Store still has. <br>
+        Once a background deletion is finished the Store is gone and this returns 404.
+        """
+        progress = deletion_progress(store_id)
+        if progress is None:
+            abort(404)
+        return progress
+
+
 @blp.route("/store")
 class StoreList(MethodView):
-    @blp.response(200, StoreSchema(many=True))
-    def get(self):
+    @RESPONSE_CACHE.cached
+    @blp.arguments(ListArgsSchema, location="query")
+    @blp.response(200, StoreSchema(many=True), headers=PAGINATION_HEADERS)
+    def get(self, args):
         """Gets all Stores
 
-        Returns all Stores
+        Returns Stores one page at a time ordered by ID. <br>
+        Pass the `X-Next-Cursor` header of a page as `after` to get the next one. <br>
+        With `format=ndjson` all Stores are streamed as newline delimited JSON.
         """
-        return StoreModel.query.all()
+        if args.get("format") == "ndjson":
+            return stream_ndjson(
+                shaped_query(StoreModel, StoreSchema),
+                StoreModel.id,
+                StoreSchema(),
+                after=args.get("after"),
+            )
+
+        stores, headers = keyset_paginate(
+            shaped_query(StoreModel, StoreSchema),
+            StoreModel.id,
+            args.get("limit"),
+            args.get("after"),
+        )
+        return stores, 200, headers
 
     @jwt_required_with_doc()
     @blp.arguments(StoreSchema)
@@ -54,6 +108,9 @@ class StoreList(MethodView):
         store = StoreModel(**store_data)
         try:
             db.session.add(store)
+            db.session.flush()
+            store_created(store.id)
+            record_changed("store", [store.id])
             db.session.commit()
         except IntegrityError:
             abort(400, "Store with this name already exists.")
@@ -1,25 +1,39 @@
 from flask.views import MethodView
 from flask_smorest import Blueprint, abort
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
+from changes import record_changed, record_deleted
 from custom_decorators import jwt_required_with_doc
 from db import db
-from models import ItemModel, StoreModel, TagModel
-from schemas import TagAndItemSchema, TagSchema
+from models import ItemModel, TagModel
+from query_shaping import shaped_query
+from reference_cache import REFERENCE_CACHE
+from response_cache import RESPONSE_CACHE
+from schemas import (
+    ItemIdsSchema,
+    ItemSchema,
+    LinksResultSchema,
+    TagAndItemSchema,
+    TagIdsSchema,
+    TagSchema,
+)
+from stats import tag_created, tag_deleted
+from tag_links import link, link_many, unlink, unlink_many
 
 blp = Blueprint("Tags", "tags", description="Operations on tags")
 
 
 @blp.route("/store/<int:store_id>/tag")
 class TagsInStore(MethodView):
+    @RESPONSE_CACHE.cached
     @blp.response(200, TagSchema(many=True))
     def get(self, store_id):
         """Gets all tags in a particular Store
 
         Returns all tags associated with a particular Store
         """
-        store = StoreModel.query.get_or_404(store_id)
-        return store.tags.all()
+        REFERENCE_CACHE.stores.get_or_404(store_id)
+        return shaped_query(TagModel, TagSchema).filter_by(store_id=store_id).all()
 
     @jwt_required_with_doc()
     @blp.arguments(TagSchema, example={"name": "Name of Tag"})
@@ -31,12 +45,15 @@ class TagsInStore(MethodView):
         """
 
         # checks whether the Store exists or not
-        StoreModel.get_or_404(store_id)
+        REFERENCE_CACHE.stores.get_or_404(store_id, cached=False)
 
         tag = TagModel(**tag_data, store_id=store_id)
 
         try:
             db.session.add(tag)
+            db.session.flush()
+            tag_created(tag.id, store_id)
+            record_changed("tag", [tag.id])
             db.session.commit()
         except SQLAlchemyError as e:
             abort(500, message=str(e))
@@ -51,25 +68,28 @@ class LinkTagsToItem(MethodView):
     def post(self, item_id, tag_id):
         """Associates a Tag to a particular Item
 
-        Creates a Link between a tag and an item (tags an Item).
+        Creates a Link between a tag and an item (tags an Item). Linking twice is a no-op.
         """
-        item = ItemModel.query.get_or_404(item_id)
-        tag = TagModel.query.get_or_404(tag_id)
-
-        if item.store.id != tag.store.id:
-            abort(
-                400,
-                message="Make sure item and tag belong to the same store bofore linking.",
-            )
-
-        item.tags.append(tag)
-
         try:
-            db.session.add(item)
+            linked = link(item_id, tag_id)
             db.session.commit()
+        except IntegrityError:
+            # Linked by a concurrent request in the meantime
+            db.session.rollback()
+            linked = False
         except SQLAlchemyError:
             abort(500, message="An Error occurred while inserting the tag.")
 
+        tag = shaped_query(TagModel, TagSchema).get_or_404(tag_id)
+        if not linked:
+            # Find out why nothing was inserted
+            item = ItemModel.query.get_or_404(item_id)
+            if item.store_id != tag.store_id:
+                abort(
+                    400,
+                    message="Make sure item and tag belong to the same store bofore linking.",
+                )
+
         return tag
 
     @jwt_required_with_doc(fresh=True)
@@ -77,31 +97,97 @@ class LinkTagsToItem(MethodView):
     def delete(self, item_id, tag_id):
         """Deletes Association between an Item and a Tag
 
-        Deletes the Link between Tag and Item (unTags an Item).
+        Deletes the Link between Tag and Item (unTags an Item). Unlinking twice is a no-op.
         """
-        item = ItemModel.query.get_or_404(item_id)
-        tag = TagModel.query.get_or_404(tag_id)
-
-        item.tags.remove(tag)
-
         try:
-            db.session.add(item)
+            unlink(item_id, tag_id)
             db.session.commit()
         except SQLAlchemyError:
             abort(500, message="An Error occurred while removing the tag.")
 
+        item = shaped_query(ItemModel, ItemSchema).get_or_404(item_id)
+        tag = shaped_query(TagModel, TagSchema).get_or_404(tag_id)
         return {"message": "Item Removed from Tag", "item": item, "tag": tag}
 
 
+def write_links(write, item_ids, tag_ids):
+    for _ in range(2):
+        try:
+            result = write(item_ids, tag_ids)
+            db.session.commit()
+            return result
+        except IntegrityError:
+            # A concurrent request linked some of the same pairs; the second
+            # attempt sees them as linked
+            db.session.rollback()
+        except SQLAlchemyError:
+            abort(500, message="An Error occurred while writing the links.")
+
+    abort(409, message="The links were changed concurrently, try again.")
+
+
+@blp.route("/item/<int:item_id>/tags")
+class ItemTags(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(TagIdsSchema, example={"tag_ids": [1, 2, 3]})
+    @blp.response(200, LinksResultSchema)
+    def post(self, link_data, item_id):
+        """Associates several Tags to an Item
+
+        Links every Tag of the list that belongs to the Item's Store, in one request.
+        Tags that are already linked are left as they are.
+        """
+        ItemModel.query.get_or_404(item_id)
+        return write_links(link_many, [item_id], link_data["tag_ids"])
+
+    @jwt_required_with_doc(fresh=True)
+    @blp.arguments(TagIdsSchema, example={"tag_ids": [1, 2, 3]})
+    @blp.response(200, LinksResultSchema)
+    def delete(self, link_data, item_id):
+        """Removes several Tags from an Item
+
+        Deletes the Links between the Item and every Tag of the list, in one request.
+        """
+        ItemModel.query.get_or_404(item_id)
+        return write_links(unlink_many, [item_id], link_data["tag_ids"])
+
+
+@blp.route("/tag/<int:tag_id>/items")
+class TagItems(MethodView):
+    @jwt_required_with_doc()
+    @blp.arguments(ItemIdsSchema, example={"item_ids": [1, 2, 3]})
+    @blp.response(200, LinksResultSchema)
+    def post(self, link_data, tag_id):
+        """Tags several Items
+
+        Links every Item of the list that belongs to the Tag's Store, in one request.
+        Items that are already linked are left as they are.
+        """
+        REFERENCE_CACHE.tags.get_or_404(tag_id, cached=False)
+        return write_links(link_many, link_data["item_ids"], [tag_id])
+
+    @jwt_required_with_doc(fresh=True)
+    @blp.arguments(ItemIdsSchema, example={"item_ids": [1, 2, 3]})
+    @blp.response(200, LinksResultSchema)
+    def delete(self, link_data, tag_id):
+        """unTags several Items
+
+        Deletes the Links between the Tag and every Item of the list, in one request.
+        """
+        REFERENCE_CACHE.tags.get_or_404(tag_id, cached=False)
+        return write_links(unlink_many, link_data["item_ids"], [tag_id])
+
+
 @blp.route("/tag/<int:tag_id>")
 class Tag(MethodView):
+    @RESPONSE_CACHE.cached
     @blp.response(200, TagSchema)
     def get(self, tag_id):
         """Gets a Tag by ID
 
         Returns tag by ID
         """
-        tag = TagModel.query.get_or_404(tag_id)
+        tag = shaped_query(TagModel, TagSchema).get_or_404(tag_id)
         return tag
 
     @jwt_required_with_doc(fresh=True)
@@ -123,6 +209,8 @@ class Tag(MethodView):
         tag = TagModel.query.get_or_404(tag_id)
 
         if not tag.items:
+            tag_deleted(tag.id)
+            record_deleted("tag", [tag.id])
             db.session.delete(tag)
             db.session.commit()
             return {"message": "Tag Deleted"}
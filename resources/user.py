@@ -1,3 +1,4 @@
+from flask import current_app
 from flask.views import MethodView
 from flask_jwt_extended import (
     create_access_token,
@@ -6,13 +7,14 @@ from flask_jwt_extended import (
     get_jwt_identity,
 )
 from flask_smorest import Blueprint, abort
-from passlib.hash import pbkdf2_sha256
 from sqlalchemy import or_
 
 from blocklist import BLOCKLIST
 from custom_decorators import jwt_required_with_doc
 from db import db
+from jwt_cache import USER_CACHE
 from models import UserModel
+from passwords import PASSWORD_HASHER, PasswordHasherBusy
 from schemas import UserRegisterSchema, UserSchema
 from tasks import send_user_registration_email
 
@@ -35,20 +37,22 @@ class UserRegister(MethodView):
         ).first():
             abort(409, message="A User with that username or email already exists")
 
+        try:
+            password = PASSWORD_HASHER.hash(user_data["password"])
+        except PasswordHasherBusy:
+            abort(503, message="Too many sign-ups at the moment, try again later.")
+
         user = UserModel(
             username=user_data["username"],
             email=user_data["email"],
-            password=pbkdf2_sha256.hash(user_data["password"]),
+            password=password,
         )
         db.session.add(user)
         db.session.commit()
 
-        send_user_registration_email(email=user.email, username=user.username)
-
-        # Uncomment this code to use background worker
-        # current_app.queue.enqueue(
-        #     send_user_registration_email, user.email, user.username
-        # )
+        current_app.queue.enqueue(
+            send_user_registration_email, user.email, user.username
+        )
 
         return {"message": "User Created Successfully"}, 201
 
@@ -67,7 +71,22 @@ class UserLogin(MethodView):
             UserModel.username == user_data["username"]
         ).first()
 
-        if user and pbkdf2_sha256.verify(user_data["password"], user.password):
+        if not user:
+            abort(401, message="Invalid Credentials")
+
+        try:
+            valid, new_hash = PASSWORD_HASHER.verify_and_update(
+                user_data["password"], user.password
+            )
+        except PasswordHasherBusy:
+            abort(503, message="Too many logins at the moment, try again later.")
+
+        if valid:
+            if new_hash:
+                # Hashing parameters changed since this password was stored
+                user.password = new_hash
+                db.session.commit()
+
             access_token = create_access_token(identity=user.id, fresh=True)
             refresh_token = create_refresh_token(identity=user.id)
             return {"access_token": access_token, "refresh_token": refresh_token}, 200
@@ -89,8 +108,8 @@ class TokenRefresh(MethodView):
         new_token = create_access_token(identity=current_user, fresh=False)
 
         # Adding refresh token to blocklist after refreshing token once
-        jti = get_jwt()["jti"]
-        BLOCKLIST.add(jti)
+        jwt_payload = get_jwt()
+        BLOCKLIST.add(jwt_payload["jti"], expires_at=jwt_payload.get("exp"))
 
         return {"access_token": new_token}, 200
 
@@ -103,8 +122,8 @@ class UserLogout(MethodView):
 
         Logs out the User rendering the Access Token invalid.
         """
-        jti = get_jwt()["jti"]
-        BLOCKLIST.add(jti)
+        jwt_payload = get_jwt()
+        BLOCKLIST.add(jwt_payload["jti"], expires_at=jwt_payload.get("exp"))
         return {"message": "Successfully logged out"}, 200
 
 
@@ -129,5 +148,6 @@ class User(MethodView):
 
         db.session.delete(user)
         db.session.commit()
+        USER_CACHE.pop(user_id)
 
         return {"message": "User Deleted"}, 200
@@ -0,0 +1,233 @@
+"""
+response_cache.py
+
+Cache of rendered GET responses for the read endpoints, with ETag support.
+
+Responses are kept in a per-worker LRU and in Redis, as JSON, so every worker
+shares them. Every key contains a generation number, kept in Redis and bumped
+after any commit that wrote to a cached table, so a response rendered before
+the commit can never be served after it, by any worker. Keys also say whether
+the response was read from a replica: a replica can render a body older than
+the generation, which is only served to other replica reads, never to the
+clients that read from the primary to see their own writes.
+
+The cache needs `RESPONSE_CACHE_REDIS_URL`: a worker cannot see the commits of
+the others without it, so it stays off (and the views always render) when that
+is not set. If Redis cannot be reached the views render without the cache, and
+a generation bump that failed is retried by the next request that reaches it.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from flask import current_app, request
+from sqlalchemy import event
+
+from db import db, reads_from_replica
+
+CACHED_TABLES = {"items", "stores", "tags", "items_tags", "store_stats", "tag_stats"}
+SKIPPED_HEADERS = {"Content-Length", "Date", "Set-Cookie", "ETag"}
+GENERATION_KEY = "response-cache:generation"
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    def __init__(self):
+        self.enabled = False
+        self.size = 1024
+        self.ttl = 60
+        self.redis = None
+        self.redis_errors = ()
+        self._missed_invalidation = False
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.size = app.config.get("RESPONSE_CACHE_SIZE", self.size)
+        self.ttl = app.config.get("RESPONSE_CACHE_TTL", self.ttl)
+        self._entries.clear()
+
+        redis_url = app.config.get("RESPONSE_CACHE_REDIS_URL")
+        self.enabled = bool(app.config.get("RESPONSE_CACHE_ENABLED", True) and redis_url)
+        if app.config.get("RESPONSE_CACHE_ENABLED") and not redis_url:
+            logger.warning("The response cache is off: it needs RESPONSE_CACHE_REDIS_URL")
+        self.redis = None
+        if self.enabled:
+            import redis
+
+            self.redis = redis.from_url(redis_url)
+            self.redis_errors = (redis.exceptions.RedisError,)
+
+        if not event.contains(db.session, "after_flush", _mark_dirty_on_flush):
+            event.listen(db.session, "after_flush", _mark_dirty_on_flush)
+            event.listen(db.session, "do_orm_execute", _mark_dirty_on_execute)
+            event.listen(db.session, "after_commit", _invalidate_on_commit)
+
+    def cached(self, func):
+        """Caches the response of a GET view. Apply it above the flask-smorest
+        decorators so that the rendered response is what gets stored."""
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            generation = self.generation() if self.enabled else None
+            if generation is None:
+                # Views that set their own ETag still answer If-None-Match
+                response = current_app.make_response(func(*args, **kwargs))
+                return response.make_conditional(request)
+
+            key = self._key(generation)
+            entry = self._get(key)
+            if entry is None:
+                response = current_app.make_response(func(*args, **kwargs))
+                entry = self._entry(response)
+                if entry is None:
+                    return response
+                self._set(key, entry)
+
+            return self._respond(entry)
+
+        return wrapper
+
+    def cached_async(self, func):
+        """`cached` for the coroutine views of the ASGI app."""
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # The Redis calls (and the LRU's lock) block, so they run in the
+            # loop's thread pool instead of stalling every other request
+            loop = asyncio.get_running_loop()
+            generation = None
+            if self.enabled:
+                generation = await loop.run_in_executor(None, self.generation)
+            if generation is None:
+                response = current_app.make_response(await func(*args, **kwargs))
+                return response.make_conditional(request)
+
+            key = self._key(generation)
+            entry = await loop.run_in_executor(None, self._get, key)
+            if entry is None:
+                response = current_app.make_response(await func(*args, **kwargs))
+                entry = self._entry(response)
+                if entry is None:
+                    return response
+                await loop.run_in_executor(None, self._set, key, entry)
+
+            return self._respond(entry)
+
+        return wrapper
+
+    def _key(self, generation):
+        source = "replica" if reads_from_replica() else "primary"
+        return f"response-cache:{generation}:{source}:{request.full_path}"
+
+    def _entry(self, response):
+        if response.status_code != 200 or response.is_streamed:
+            return None
+        try:
+            body = response.get_data().decode()
+        except UnicodeDecodeError:
+            return None
+
+        return {
+            "status": response.status_code,
+            "headers": [[k, v] for k, v in response.headers if k not in SKIPPED_HEADERS],
+            "body": body,
+            "etag": response.get_etag()[0] or hashlib.md5(response.get_data()).hexdigest(),
+        }
+
+    def _respond(self, entry):
+        response = current_app.response_class(
+            entry["body"], status=entry["status"], headers=entry["headers"]
+        )
+        response.set_etag(entry["etag"])
+        return response.make_conditional(request)
+
+    def generation(self):
+        """The current generation, or None if Redis cannot be reached."""
+        try:
+            if self._missed_invalidation:
+                self.redis.incr(GENERATION_KEY)
+                self._missed_invalidation = False
+            return int(self.redis.get(GENERATION_KEY) or 0)
+        except self.redis_errors as error:
+            logger.warning("Response cache bypassed, Redis is unavailable: %s", error)
+            return None
+
+    def invalidate(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries.clear()
+        try:
+            self.redis.incr(GENERATION_KEY)
+        except self.redis_errors as error:
+            # The write is committed already; the bump is retried later
+            logger.warning("Response cache invalidation failed, Redis is unavailable: %s", error)
+            self._missed_invalidation = True
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                entry, expires_at = cached
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    return entry
+                del self._entries[key]
+
+        try:
+            raw = self.redis.get(key)
+        except self.redis_errors as error:
+            logger.warning("Response cache read failed, Redis is unavailable: %s", error)
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self._set(key, entry, shared=False)
+        return entry
+
+    def _set(self, key, entry, shared=True):
+        with self._lock:
+            self._entries[key] = (entry, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+        if shared:
+            try:
+                self.redis.set(key, json.dumps(entry), ex=self.ttl)
+            except self.redis_errors as error:
+                logger.warning("Response cache write failed, Redis is unavailable: %s", error)
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
+def _mark_dirty_on_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if getattr(obj, "__tablename__", None) in CACHED_TABLES:
+            session.info["response_cache_dirty"] = True
+            return
+
+
+def _mark_dirty_on_execute(orm_execute_state):
+    # Bulk UPDATE/DELETE and Core statements run through the session bypass the
+    # flush. Those on other tables (outbox, revoked tokens, ...) are not
+    # writes to the cache; statements without a target table (text) count.
+    if not orm_execute_state.is_select:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is None or getattr(table, "name", None) in CACHED_TABLES:
+            orm_execute_state.session.info["response_cache_dirty"] = True
+
+
+def _invalidate_on_commit(session):
+    if session.info.pop("response_cache_dirty", False):
+        RESPONSE_CACHE.invalidate()
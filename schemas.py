@@ -1,23 +1,56 @@
-from marshmallow import Schema, fields
+import time
+from contextvars import ContextVar
 
+from marshmallow import Schema, fields, validate
 
-class PlainItemSchema(Schema):
+from metrics import observe_schema_dump
+from serializers import SERIALIZER
+
+_dumping = ContextVar("dumping", default=False)
+
+
+class BaseSchema(Schema):
+    def dump(self, obj, *, many=None):
+        # Nested schemas are dumped inside their parent and not timed separately
+        if _dumping.get():
+            return self._dump(obj, many)
+
+        token = _dumping.set(True)
+        start = time.perf_counter()
+        try:
+            return self._dump(obj, many)
+        finally:
+            _dumping.reset(token)
+            observe_schema_dump(type(self).__name__, time.perf_counter() - start)
+
+    def _dump(self, obj, many):
+        dump_one = SERIALIZER.dumper(self)
+        if dump_one is None:
+            return super().dump(obj, many=many)
+
+        many = self.many if many is None else bool(many)
+        if many and obj is not None:
+            return [dump_one(each) for each in obj]
+        return dump_one(obj)
+
+
+class PlainItemSchema(BaseSchema):
     id = fields.Int(dump_only=True)
     name = fields.Str(required=True)
     price = fields.Float(required=True)
 
 
-class PlainStoreSchema(Schema):
+class PlainStoreSchema(BaseSchema):
     id = fields.Int(dump_only=True)
     name = fields.Str(required=True)
 
 
-class PlainTagSchema(Schema):
+class PlainTagSchema(BaseSchema):
     id = fields.Int(dump_only=True)
     name = fields.Str()
 
 
-class ItemUpdateSchema(Schema):
+class ItemUpdateSchema(BaseSchema):
     name = fields.Str()
     price = fields.Float()
     store_id = fields.Int()
@@ -25,6 +58,7 @@ class ItemUpdateSchema(Schema):
 
 class ItemSchema(PlainItemSchema):
     store_id = fields.Int(required=True, load_only=True)
+    version = fields.Int(dump_only=True)
     store = fields.Nested(PlainStoreSchema(), dump_only=True)
     tags = fields.List(fields.Nested(PlainTagSchema()), dump_only=True)
 
@@ -40,13 +74,50 @@ class TagSchema(PlainTagSchema):
     items = fields.List(fields.Nested(PlainItemSchema()), dump_only=True)
 
 
-class TagAndItemSchema(Schema):
+class TagAndItemSchema(BaseSchema):
     message = fields.Str()
     item = fields.Nested(ItemSchema)
     tag = fields.Nested(TagSchema)
 
 
-class UserSchema(Schema):
+class TagIdsSchema(BaseSchema):
+    tag_ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1))
+
+
+class ItemIdsSchema(BaseSchema):
+    item_ids = fields.List(fields.Int(), required=True, validate=validate.Length(min=1))
+
+
+class LinksResultSchema(BaseSchema):
+    linked = fields.List(fields.Int(), metadata={"description": "IDs linked by this request."})
+    unlinked = fields.List(fields.Int(), metadata={"description": "IDs unlinked by this request."})
+    unchanged = fields.List(
+        fields.Int(), metadata={"description": "IDs that were already linked (or not linked)."}
+    )
+    not_found = fields.List(
+        fields.Int(), metadata={"description": "IDs that do not exist or belong to another store."}
+    )
+
+
+class TagStatsSchema(BaseSchema):
+    tag_id = fields.Int()
+    item_count = fields.Int()
+
+
+class StoreStatsSchema(BaseSchema):
+    store_id = fields.Int()
+    item_count = fields.Int()
+    price_min = fields.Float(metadata={"description": "Null when the store has no items."})
+    price_max = fields.Float(metadata={"description": "Null when the store has no items."})
+    price_avg = fields.Float(metadata={"description": "Null when the store has no items."})
+    price_total = fields.Float()
+    tags = fields.List(
+        fields.Nested(TagStatsSchema()),
+        metadata={"description": "Number of items linked to each tag of the store."},
+    )
+
+
+class UserSchema(BaseSchema):
     id = fields.Int(dump_only=True)
     username = fields.Str(required=True)
     password = fields.Str(required=True, load_only=True)
@@ -54,3 +125,181 @@ class UserSchema(Schema):
 
 class UserRegisterSchema(UserSchema):
     email = fields.Str(required=True)
+
+
+class ListArgsSchema(BaseSchema):
+    limit = fields.Int(
+        validate=validate.Range(min=1),
+        metadata={"description": "Maximum number of results in the page."},
+    )
+    after = fields.Str(
+        metadata={"description": "Cursor returned in `X-Next-Cursor` by the previous page."}
+    )
+    format = fields.Str(
+        validate=validate.OneOf(["json", "ndjson"]),
+        metadata={
+            "description": "`ndjson` streams every result as newline delimited JSON instead of returning a page."
+        },
+    )
+
+
+class ItemListArgsSchema(ListArgsSchema):
+    store_id = fields.Int(metadata={"description": "Only Items of this Store."})
+    tag = fields.List(
+        fields.Int(),
+        metadata={"description": "Only Items linked to these Tag IDs. Repeat the parameter for several tags."},
+    )
+    tag_match = fields.Str(
+        load_default="any",
+        validate=validate.OneOf(["any", "all"]),
+        metadata={"description": "Whether Items need to be linked to `any` or to `all` of the tags."},
+    )
+    price_min = fields.Float(metadata={"description": "Lowest price, inclusive."})
+    price_max = fields.Float(metadata={"description": "Highest price, inclusive."})
+    name_prefix = fields.Str(metadata={"description": "Only Items whose name starts with this (case sensitive)."})
+    q = fields.Str(
+        metadata={"description": "Full-text search over the name and description. Every word has to match."}
+    )
+    sort = fields.Str(
+        load_default="id",
+        validate=validate.OneOf(["id", "-id", "name", "-name", "price", "-price"]),
+        metadata={"description": "Sort order. A leading `-` sorts in descending order."},
+    )
+
+
+class ItemBulkSchema(BaseSchema):
+    items = fields.List(fields.Dict(), required=True)
+
+
+class ItemBulkDeleteSchema(BaseSchema):
+    ids = fields.List(fields.Int(), required=True)
+
+
+class BulkArgsSchema(BaseSchema):
+    upsert = fields.Bool(
+        load_default=False,
+        metadata={"description": "Update the price of items whose name already exists."},
+    )
+    atomic = fields.Bool(
+        load_default=True,
+        metadata={
+            "description": "Write everything in one transaction. If false, each batch is committed on its own."
+        },
+    )
+
+
+class StoreDeleteArgsSchema(BaseSchema):
+    background = fields.Bool(
+        load_default=False,
+        metadata={
+            "description": "Delete the Store in chunks in a background job and answer 202 right away."
+        },
+    )
+
+
+class StoreDeletionSchema(BaseSchema):
+    deleting = fields.Bool()
+    items_remaining = fields.Int()
+    tags_remaining = fields.Int()
+
+
+class CatalogueRowSchema(BaseSchema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=80))
+    description = fields.Str(allow_none=True)
+    price = fields.Float(required=True)
+    store = fields.Str(required=True, validate=validate.Length(min=1, max=80))
+    tags = fields.List(fields.Str(validate=validate.Length(min=1, max=80)), load_default=list)
+
+
+class CatalogueFormatArgsSchema(BaseSchema):
+    format = fields.Str(
+        load_default="ndjson",
+        validate=validate.OneOf(["csv", "ndjson"]),
+        metadata={"description": "`csv` or `ndjson`."},
+    )
+
+
+class CatalogueExportArgsSchema(CatalogueFormatArgsSchema):
+    store_id = fields.Int(metadata={"description": "Only the Items of this Store."})
+
+
+class CatalogueImportArgsSchema(CatalogueFormatArgsSchema):
+    upsert = fields.Bool(
+        load_default=False,
+        metadata={"description": "Update the price and description of items whose name already exists."},
+    )
+    create_missing = fields.Bool(
+        load_default=False,
+        metadata={"description": "Create the Stores and Tags that do not exist yet instead of rejecting their rows."},
+    )
+
+
+class CatalogueImportErrorSchema(BaseSchema):
+    line = fields.Int()
+    errors = fields.Dict()
+
+
+class CatalogueImportResultSchema(BaseSchema):
+    rows = fields.Int()
+    created = fields.Int()
+    updated = fields.Int()
+    failed = fields.Int()
+    linked = fields.Int()
+    stores_created = fields.Int()
+    tags_created = fields.Int()
+    errors = fields.List(fields.Nested(CatalogueImportErrorSchema))
+
+
+class BulkRowResultSchema(BaseSchema):
+    index = fields.Int()
+    id = fields.Int()
+    status = fields.Str()
+    errors = fields.Dict()
+
+
+class BulkResultSchema(BaseSchema):
+    created = fields.Int()
+    updated = fields.Int()
+    deleted = fields.Int()
+    failed = fields.Int()
+    results = fields.List(fields.Nested(BulkRowResultSchema()))
+
+
+class ChangesArgsSchema(BaseSchema):
+    since = fields.Int(
+        validate=validate.Range(min=0),
+        metadata={
+            "description": "Last `seq` seen. Without it (and without a Last-Event-ID header) the answer has no "
+            "changes and `last_seq` is the current position, to follow after a full sync."
+        },
+    )
+    limit = fields.Int(
+        validate=validate.Range(min=1),
+        metadata={"description": "Maximum number of changes in the answer."},
+    )
+    wait = fields.Float(
+        load_default=0,
+        validate=validate.Range(min=0),
+        metadata={"description": "Seconds to wait for changes if there are none yet (long-poll)."},
+    )
+    entity = fields.List(
+        fields.Str(validate=validate.OneOf(["item", "store", "tag"])),
+        metadata={"description": "Only changes of these kinds of rows. Repeat the parameter for several."},
+    )
+
+
+class ChangeSchema(BaseSchema):
+    seq = fields.Int()
+    entity = fields.Str(metadata={"description": "`item`, `store` or `tag`."})
+    id = fields.Int()
+    deleted = fields.Bool()
+    changed_at = fields.Int(metadata={"description": "Unix time of the commit."})
+    data = fields.Dict(
+        allow_none=True,
+        metadata={"description": "The row as it is now, as GET returns it. Null for deleted rows."},
+    )
+
+
+class ChangesSchema(BaseSchema):
+    changes = fields.List(fields.Nested(ChangeSchema()))
+    last_seq = fields.Int(metadata={"description": "`since` of the next request."})
@@ -0,0 +1,184 @@
+"""
+serializers.py
+
+Compiled dump functions for the response schemas. marshmallow's `Schema.dump`
+looks up and calls every field of every object through several layers of
+methods, which dominates CPU time on large lists. `compile_dump` turns a schema
+into a single generated Python function with the field accesses and conversions
+inlined, once per schema instance, and `BaseSchema.dump` uses it whenever the
+schema only has fields it knows how to compile (Int, Float, Str, Nested and
+List of those, without hooks, defaults or dotted attributes). Anything else
+goes through marshmallow unchanged, and the schemas still drive validation and
+the OpenAPI docs.
+
+The generated functions follow marshmallow's serialization rules exactly, so
+responses are byte-identical to the marshmallow path (see
+benchmarks/bench_serializers.py).
+
+Configuration:
+
+- SERIALIZER_COMPILED: "0" dumps everything through marshmallow again.
+- SERIALIZER_JSON: "orjson" encodes responses with orjson instead of the
+  standard library encoder. This is faster still, but not byte-identical:
+  non-ASCII characters are written as UTF-8 instead of \\u escapes, and some
+  floats are formatted differently (1e16 instead of 1e+16).
+"""
+
+from flask.json import JSONEncoder
+from marshmallow import Schema, fields
+from marshmallow.utils import ensure_text_type, get_value, missing
+
+CONVERSIONS = {
+    fields.Integer: "int({0})",
+    fields.Float: "float({0})",
+    fields.String: "{0} if type({0}) is str else ensure_text_type({0})",
+}
+
+
+class _Compiler:
+    def __init__(self):
+        self.namespace = {
+            "ensure_text_type": ensure_text_type,
+            "get_value": get_value,
+            "missing": missing,
+        }
+
+    def convert(self, field, value="value"):
+        """Expression serializing `value` like `field._serialize`, or None."""
+        field_type = type(field)
+        if field_type in CONVERSIONS:
+            if getattr(field, "as_string", False):
+                return None
+            expression = CONVERSIONS[field_type].format(value)
+        elif field_type is fields.Nested:
+            nested = compile_dump(field.schema)
+            if nested is None:
+                return None
+            name = f"nested_{len(self.namespace)}"
+            self.namespace[name] = nested
+            if field.schema.many or field.many:
+                expression = f"[{name}(each) for each in {value}]"
+            else:
+                expression = f"{name}({value})"
+        elif field_type is fields.List:
+            inner = self.convert(field.inner, "each")
+            if inner is None:
+                return None
+            expression = f"[{inner} for each in {value}]"
+        else:
+            return None
+        return f"None if {value} is None else {expression}"
+
+    def compile(self, schema):
+        if type(schema).get_attribute is not Schema.get_attribute:
+            return None
+        if any(schema._hooks[hook] for hook in schema._hooks):
+            return None
+
+        fields_code = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            if not field._CHECK_ATTRIBUTE or "." in attribute:
+                return None
+            if field.dump_default is not missing:
+                return None
+            expression = self.convert(field)
+            if expression is None:
+                return None
+            key = field.data_key if field.data_key is not None else name
+            fields_code.append((attribute, key, expression))
+
+        def function(name, access, prelude=()):
+            lines = [f"def {name}(obj):", "    out = {}", *prelude]
+            for attribute, key, expression in fields_code:
+                lines += [
+                    *(f"    {line}" for line in access(repr(attribute))),
+                    "    if value is not missing:",
+                    f"        out[{key!r}] = {expression}",
+                ]
+            return lines + ["    return out", ""]
+
+        source = "\n".join(
+            [
+                # Loaded column and relationship values of mapped instances
+                # sit in the instance __dict__; anything else (expired or
+                # unloaded) goes through the attribute and may lazy load.
+                *function(
+                    "dump_mapped",
+                    lambda attribute: [
+                        f"value = state.get({attribute}, missing)",
+                        "if value is missing:",
+                        f"    value = getattr(obj, {attribute}, missing)",
+                    ],
+                    prelude=["    state = obj.__dict__"],
+                ),
+                *function(
+                    "dump_object",
+                    lambda attribute: [f"value = getattr(obj, {attribute}, missing)"],
+                ),
+                *function(
+                    "dump_mapping",
+                    lambda attribute: [f"value = get_value(obj, {attribute}, missing)"],
+                ),
+                "def dump(obj):",
+                "    if hasattr(obj, '_sa_instance_state'):",
+                "        return dump_mapped(obj)",
+                "    if hasattr(obj, '__getitem__'):",
+                "        return dump_mapping(obj)",
+                "    return dump_object(obj)",
+            ]
+        )
+        exec(compile(source, f"<compiled {type(schema).__name__}>", "exec"), self.namespace)
+        return self.namespace["dump"]
+
+
+def compile_dump(schema):
+    """Returns a function that dumps one object exactly like
+    `schema.dump(obj, many=False)`, or None if the schema has fields that
+    cannot be compiled. The result is cached on the schema instance."""
+    try:
+        return schema.__dict__["_compiled_dump"]
+    except KeyError:
+        pass
+
+    dump = _Compiler().compile(schema)
+    schema.__dict__["_compiled_dump"] = dump
+    return dump
+
+
+class OrjsonEncoder(JSONEncoder):
+    """Flask JSON encoder that hands the whole document to orjson."""
+
+    def encode(self, o):
+        import orjson
+
+        if self.indent is not None:
+            return super().encode(o)
+
+        # Dates and dataclasses are left to Flask's `default`, as with json
+        option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
+
+class Serializer:
+    def __init__(self):
+        self.compiled = True
+
+    def init_app(self, app):
+        self.compiled = app.config.get("SERIALIZER_COMPILED", True)
+        if app.config.get("SERIALIZER_JSON") == "orjson":
+            app.json_encoder = OrjsonEncoder
+
+    def dumper(self, schema):
+        if not self.compiled:
+            return None
+        return compile_dump(schema)
+
+
+SERIALIZER = Serializer()
@@ -6,3 +6,4 @@ load_dotenv()
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 QUEUE = ["emails", "default"]
+DEAD_LETTER_QUEUE = "dead-letter"
@@ -0,0 +1,157 @@
+"""
+stats.py
+
+Per-store inventory statistics (item count, min/max/average/total price and
+items per tag), kept in the store_stats and tag_stats summary tables so that
+reading them costs one row per store instead of a scan of its items.
+
+Handlers that add, change or remove items or tag links call these functions in
+the same transaction, before committing. Counts and price totals are adjusted
+by deltas; min and max are read again with `SELECT MIN(price) ... WHERE
+store_id = ?`, a lookup on the (store_id, price) index. A missing summary row
+is rebuilt from the items tables, and `flask stats rebuild` recomputes every
+row if the summaries ever drift.
+"""
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, select, update
+
+from db import db
+from models import ItemModel, ItemsTags, StoreModel, StoreStatsModel, TagModel, TagStatsModel
+
+stats_cli = AppGroup("stats", help="Store statistics summary tables.")
+
+
+def store_created(store_id):
+    db.session.execute(
+        insert(StoreStatsModel.__table__).values(store_id=store_id, item_count=0, price_total=0)
+    )
+
+
+def store_deleted(store_id):
+    db.session.execute(delete(TagStatsModel.__table__).where(TagStatsModel.store_id == store_id))
+    db.session.execute(
+        delete(StoreStatsModel.__table__).where(StoreStatsModel.store_id == store_id)
+    )
+
+
+def tag_created(tag_id, store_id):
+    db.session.execute(
+        insert(TagStatsModel.__table__).values(tag_id=tag_id, store_id=store_id, item_count=0)
+    )
+
+
+def tag_deleted(tag_id):
+    db.session.execute(delete(TagStatsModel.__table__).where(TagStatsModel.tag_id == tag_id))
+
+
+def items_changed(deltas):
+    """Applies {store_id: (item count change, price total change)}."""
+    db.session.flush()
+    stats = StoreStatsModel.__table__.c
+
+    for store_id, (count, total) in deltas.items():
+        in_store = ItemModel.store_id == store_id
+        result = db.session.execute(
+            update(StoreStatsModel.__table__)
+            .where(stats.store_id == store_id)
+            .values(
+                item_count=stats.item_count + count,
+                # Reset the total of an empty store so float error cannot pile up
+                price_total=case(
+                    (stats.item_count + count == 0, 0.0),
+                    else_=stats.price_total + total,
+                ),
+                price_min=select(func.min(ItemModel.price)).where(in_store).scalar_subquery(),
+                price_max=select(func.max(ItemModel.price)).where(in_store).scalar_subquery(),
+            )
+        )
+        if result.rowcount == 0:
+            rebuild_stores([store_id])
+
+
+def tags_changed(deltas):
+    """Applies {tag_id: item count change}."""
+    db.session.flush()
+    stats = TagStatsModel.__table__.c
+
+    for tag_id, count in deltas.items():
+        result = db.session.execute(
+            update(TagStatsModel.__table__)
+            .where(stats.tag_id == tag_id)
+            .values(item_count=stats.item_count + count)
+        )
+        if result.rowcount == 0:
+            rebuild_tags([tag_id])
+
+
+def links_of_items(item_ids):
+    """{tag_id: number of the given items linked to it}, read before the items
+    (and their links) are deleted."""
+    return dict(
+        db.session.execute(
+            select(ItemsTags.tag_id, func.count())
+            .where(ItemsTags.item_id.in_(item_ids))
+            .group_by(ItemsTags.tag_id)
+        ).all()
+    )
+
+
+def store_aggregates():
+    return (
+        select(
+            StoreModel.id,
+            func.count(ItemModel.id),
+            func.coalesce(func.sum(ItemModel.price), 0.0),
+            func.min(ItemModel.price),
+            func.max(ItemModel.price),
+        )
+        .select_from(StoreModel)
+        .outerjoin(ItemModel, ItemModel.store_id == StoreModel.id)
+        .group_by(StoreModel.id)
+    )
+
+
+def tag_aggregates():
+    return (
+        select(TagModel.id, TagModel.store_id, func.count(ItemsTags.id))
+        .select_from(TagModel)
+        .outerjoin(ItemsTags, ItemsTags.tag_id == TagModel.id)
+        .group_by(TagModel.id, TagModel.store_id)
+    )
+
+
+def rebuild_stores(store_ids=None):
+    table = StoreStatsModel.__table__
+    aggregates = store_aggregates()
+    cleared = delete(table)
+    if store_ids is not None:
+        aggregates = aggregates.where(StoreModel.id.in_(store_ids))
+        cleared = cleared.where(table.c.store_id.in_(store_ids))
+
+    db.session.execute(cleared)
+    columns = ["store_id", "item_count", "price_total", "price_min", "price_max"]
+    return db.session.execute(insert(table).from_select(columns, aggregates)).rowcount
+
+
+def rebuild_tags(tag_ids=None):
+    table = TagStatsModel.__table__
+    aggregates = tag_aggregates()
+    cleared = delete(table)
+    if tag_ids is not None:
+        aggregates = aggregates.where(TagModel.id.in_(tag_ids))
+        cleared = cleared.where(table.c.tag_id.in_(tag_ids))
+
+    db.session.execute(cleared)
+    columns = ["tag_id", "store_id", "item_count"]
+    return db.session.execute(insert(table).from_select(columns, aggregates)).rowcount
+
+
+@stats_cli.command("rebuild")
+def rebuild_command():
+    """Recomputes store_stats and tag_stats from the items tables."""
+    stores = rebuild_stores()
+    tags = rebuild_tags()
+    db.session.commit()
+    click.echo(f"Rebuilt the stats of {stores} stores and {tags} tags.")
@@ -0,0 +1,109 @@
+"""
+store_deletion.py
+
+Deleting a store together with its items, tags, tag links and stats rows.
+
+`delete_store` does it in one transaction with one DELETE per table, so no
+item or tag is loaded. The foreign keys also cascade on PostgreSQL, but the
+statements are explicit so the same code works on SQLite, which does not
+enforce them.
+
+For stores too large to delete in one transaction, `delete_store_job` deletes
+the items in chunks of `STORE_DELETE_CHUNK_SIZE`, each committed on its own
+with the stats kept up to date, so the locks are short and the progress
+(`deletion_progress`) can be read in between. The store is flagged `deleting`
+while the job runs; items added to it meanwhile are deleted too.
+"""
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, func, select, update
+
+from bulk import delete_items
+from changes import record_deleted, record_deleted_rows
+from db import db
+from models import ItemModel, ItemsTags, StoreModel, TagModel
+from stats import store_deleted
+
+
+def delete_store(store_id):
+    """Deletes the store and everything in it, without committing. Returns
+    the number of items and tags deleted."""
+    store_items = select(ItemModel.id).where(ItemModel.store_id == store_id)
+    store_tags = select(TagModel.id).where(TagModel.store_id == store_id)
+    db.session.execute(delete(ItemsTags.__table__).where(ItemsTags.item_id.in_(store_items)))
+    db.session.execute(delete(ItemsTags.__table__).where(ItemsTags.tag_id.in_(store_tags)))
+    store_deleted(store_id)
+    record_deleted_rows("item", store_items)
+    record_deleted_rows("tag", store_tags)
+    record_deleted("store", [store_id])
+
+    items = db.session.execute(
+        delete(ItemModel.__table__).where(ItemModel.store_id == store_id)
+    ).rowcount
+    tags = db.session.execute(
+        delete(TagModel.__table__).where(TagModel.store_id == store_id)
+    ).rowcount
+    db.session.execute(delete(StoreModel.__table__).where(StoreModel.id == store_id))
+    return {"items": items, "tags": tags}
+
+
+def start_deletion(store_id):
+    """Flags the store as being deleted and queues the job, unless it already
+    was. Returns False if there is no such store."""
+    flagged = db.session.execute(
+        update(StoreModel.__table__)
+        .where(StoreModel.id == store_id, StoreModel.deleting == False)  # noqa: E712
+        .values(deleting=True)
+    ).rowcount
+    db.session.commit()
+    if flagged:
+        current_app.queue.enqueue(delete_store_job, store_id)
+        return True
+    return StoreModel.query.get(store_id) is not None
+
+
+def deletion_progress(store_id):
+    """{"deleting", "items_remaining", "tags_remaining"} of the store, or None
+    if it does not exist (any more)."""
+    store = StoreModel.query.get(store_id)
+    if store is None:
+        return None
+    items, tags = db.session.execute(
+        select(
+            select(func.count()).where(ItemModel.store_id == store_id).scalar_subquery(),
+            select(func.count()).where(TagModel.store_id == store_id).scalar_subquery(),
+        )
+    ).one()
+    return {"deleting": store.deleting, "items_remaining": items, "tags_remaining": tags}
+
+
+def delete_store_in_chunks(store_id):
+    size = current_app.config["STORE_DELETE_CHUNK_SIZE"]
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            select(ItemModel.id)
+            .where(ItemModel.store_id == store_id)
+            .order_by(ItemModel.id)
+            .limit(size)
+        ).scalars().all()
+        if not ids:
+            break
+        delete_items(ids)
+        deleted += len(ids)
+        current_app.logger.info("Store %s: deleted %s items", store_id, deleted)
+
+    result = delete_store(store_id)
+    db.session.commit()
+    return {"items": deleted + result["items"], "tags": result["tags"]}
+
+
+def delete_store_job(store_id):
+    """Queue entry point. rq workers have no app, so one is created."""
+    if has_app_context():
+        return delete_store_in_chunks(store_id)
+
+    from app import create_app
+
+    with create_app().app_context():
+        return delete_store_in_chunks(store_id)
@@ -0,0 +1,143 @@
+"""
+tag_links.py
+
+Set-based writes of the links between items and tags (items_tags rows). A link
+is added with one conditional `INSERT INTO items_tags ... SELECT` that joins the
+items to the tags of the same store and skips pairs that are already linked,
+and removed with one `DELETE`, so the store check happens in SQL, no
+relationship collection is loaded, and linking or unlinking twice is a no-op.
+
+The unique index on (item_id, tag_id) catches the one case the NOT EXISTS
+cannot: two transactions adding the same link at the same time. The loser gets
+an IntegrityError, and by then the link exists, so callers treat it as already
+linked.
+"""
+
+from flask import current_app
+from sqlalchemy import and_, delete, insert, select
+
+from bulk import batches
+from changes import record_changed
+from db import db
+from item_versions import bump_versions
+from models import ItemModel, ItemsTags, TagModel
+from stats import rebuild_tags, tags_changed
+
+
+def link_statement(item_ids, tag_ids):
+    """INSERT ... SELECT of every (item, tag) pair of the given ids whose item
+    and tag belong to the same store and are not linked yet."""
+    already_linked = (
+        select(ItemsTags.id)
+        .where(ItemsTags.item_id == ItemModel.id, ItemsTags.tag_id == TagModel.id)
+        .exists()
+    )
+    pairs = (
+        select(ItemModel.id, TagModel.id)
+        .select_from(ItemModel)
+        .join(TagModel, TagModel.store_id == ItemModel.store_id)
+        .where(ItemModel.id.in_(item_ids), TagModel.id.in_(tag_ids), ~already_linked)
+    )
+    return insert(ItemsTags.__table__).from_select(["item_id", "tag_id"], pairs)
+
+
+def unlink_statement(item_ids, tag_ids):
+    return delete(ItemsTags.__table__).where(
+        ItemsTags.item_id.in_(item_ids), ItemsTags.tag_id.in_(tag_ids)
+    )
+
+
+def link(item_id, tag_id):
+    """Links one item to one tag of its store. Returns False if nothing was
+    inserted: the link exists, or the item or tag does not, or they belong to
+    different stores."""
+    linked = db.session.execute(link_statement([item_id], [tag_id])).rowcount
+    if linked:
+        bump_versions([item_id])
+        record_changed("item", [item_id])
+        tags_changed({tag_id: linked})
+    return bool(linked)
+
+
+def unlink(item_id, tag_id):
+    """Removes one link. Returns False if there was none."""
+    unlinked = db.session.execute(unlink_statement([item_id], [tag_id])).rowcount
+    if unlinked:
+        bump_versions([item_id])
+        record_changed("item", [item_id])
+        tags_changed({tag_id: -unlinked})
+    return bool(unlinked)
+
+
+def link_states(item_ids, tag_ids):
+    """{(item_id, tag_id): linked?} for the pairs of the given ids whose item
+    and tag belong to the same store."""
+    rows = db.session.execute(
+        select(ItemModel.id, TagModel.id, ItemsTags.id)
+        .select_from(ItemModel)
+        .join(TagModel, TagModel.store_id == ItemModel.store_id)
+        .outerjoin(
+            ItemsTags,
+            and_(ItemsTags.item_id == ItemModel.id, ItemsTags.tag_id == TagModel.id),
+        )
+        .where(ItemModel.id.in_(item_ids), TagModel.id.in_(tag_ids))
+    )
+    return {(item_id, tag_id): link_id is not None for item_id, tag_id, link_id in rows}
+
+
+def link_many(item_ids, tag_ids):
+    """Links every given item to every given tag, where item and tag share a
+    store. One of the two lists has a single id; the result lists the ids of
+    the other one by outcome."""
+    return _write_many(item_ids, tag_ids, linking=True)
+
+
+def unlink_many(item_ids, tag_ids):
+    """Removes the links between the given items and tags. Same shape of
+    result as `link_many`."""
+    return _write_many(item_ids, tag_ids, linking=False)
+
+
+def _write_many(item_ids, tag_ids, linking):
+    by_item = len(item_ids) == 1
+    ids = tag_ids if by_item else item_ids
+    size = current_app.config["BULK_BATCH_SIZE"]
+
+    result = {"linked" if linking else "unlinked": [], "unchanged": [], "not_found": []}
+    for batch in batches(list(dict.fromkeys(ids)), size):
+        batch_items, batch_tags = (item_ids, batch) if by_item else (batch, tag_ids)
+        states = link_states(batch_items, batch_tags)
+
+        # Only the pairs whose state changes are written
+        pairs = [pair for pair, linked in states.items() if linked != linking]
+        found = {pair[1] if by_item else pair[0] for pair in states}
+        changed = {pair[1] if by_item else pair[0] for pair in pairs}
+        for other in batch:
+            if other not in found:
+                result["not_found"].append(other)
+            elif other in changed:
+                result["linked" if linking else "unlinked"].append(other)
+            else:
+                result["unchanged"].append(other)
+        if not pairs:
+            continue
+
+        changed_items = list({item_id for item_id, _ in pairs})
+        changed_tags = list({tag_id for _, tag_id in pairs})
+        if linking:
+            written = db.session.execute(link_statement(changed_items, changed_tags)).rowcount
+        else:
+            written = db.session.execute(unlink_statement(changed_items, changed_tags)).rowcount
+        bump_versions(changed_items)
+        record_changed("item", changed_items)
+
+        if written != len(pairs):
+            # Another transaction changed some of these links in between
+            rebuild_tags(changed_tags)
+            continue
+        deltas = {}
+        for _, tag_id in pairs:
+            deltas[tag_id] = deltas.get(tag_id, 0) + (1 if linking else -1)
+        tags_changed(deltas)
+
+    return result
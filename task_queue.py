@@ -0,0 +1,128 @@
+"""
+task_queue.py
+
+Background jobs. `create_app` attaches one of these queues to `app.queue`, and
+handlers call `current_app.queue.enqueue(func, *args)` so that slow work (like
+sending emails) happens outside the request.
+
+RQQueue puts jobs on the Redis-backed rq queue processed by `rq worker -c settings`.
+Failed jobs are retried with backoff, and once the retries are exhausted they are
+moved to the dead-letter queue, which no worker listens to. They can be replayed
+with `rq worker <dead-letter queue>` once the cause is fixed.
+
+ThreadQueue is used without Redis: jobs run once each on a small thread pool of
+the web process, in the app context they were enqueued from, so the request
+does not wait for them. Failed jobs are logged and kept in `dead_letters`, and
+are not retried.
+
+EagerQueue runs jobs immediately in the calling process, for tests
+(`TASK_QUEUE_EAGER=1`). It only retries them inline, back to back, with
+`TASK_QUEUE_EAGER_RETRIES=1`.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class RQQueue:
+    def __init__(self, redis_url, name, dead_letter_name, retry_intervals):
+        import redis
+        from rq import Queue
+
+        connection = redis.from_url(redis_url)
+        self.queue = Queue(name, connection=connection)
+        self.dead_letter_name = dead_letter_name
+        self.retry_intervals = retry_intervals
+
+    def enqueue(self, func, *args, **kwargs):
+        from rq import Retry
+
+        retry = None
+        if self.retry_intervals:
+            retry = Retry(max=len(self.retry_intervals), interval=self.retry_intervals)
+
+        return self.queue.enqueue_call(
+            func,
+            args=args,
+            kwargs=kwargs,
+            retry=retry,
+            meta={"dead_letter_queue": self.dead_letter_name},
+            on_failure=move_to_dead_letter_queue,
+        )
+
+
+class EagerQueue:
+    def __init__(self, max_retries=0):
+        self.max_retries = max_retries
+        self.dead_letters = []
+
+    def enqueue(self, func, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                logger.warning(
+                    "Task %s failed (attempt %s): %r", func.__name__, attempt + 1, e
+                )
+                error = e
+
+        self.dead_letters.append((func, args, kwargs, repr(error)))
+        return None
+
+
+class ThreadQueue:
+    def __init__(self, threads, dead_letters=100):
+        # No thread is started before the first job, so a preloading master
+        # forks its workers without any
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="task")
+        self.dead_letters = deque(maxlen=dead_letters)
+
+    def enqueue(self, func, *args, **kwargs):
+        app = current_app._get_current_object()
+        return self.executor.submit(self._run, app, func, args, kwargs)
+
+    def _run(self, app, func, args, kwargs):
+        with app.app_context():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                logger.error("Task %s failed: %r", func.__name__, e)
+                self.dead_letters.append((func, args, kwargs, repr(e)))
+                return None
+
+
+def move_to_dead_letter_queue(job, connection, exc_type, exc_value, traceback):
+    """rq failure callback. It runs after every failed attempt, and only moves
+    the job once no retries are left."""
+    if job.retries_left:
+        return
+
+    from rq import Queue
+
+    Queue(job.meta["dead_letter_queue"], connection=connection).enqueue_call(
+        job.func_name,
+        args=job.args,
+        kwargs=job.kwargs,
+        meta={"failed_job_id": job.id, "error": repr(exc_value)},
+    )
+    logger.error("Task %s moved to the dead-letter queue: %r", job.id, exc_value)
+
+
+def create_queue(config):
+    if config["TASK_QUEUE_EAGER"]:
+        retries = len(config["TASK_RETRY_INTERVALS"]) if config["TASK_QUEUE_EAGER_RETRIES"] else 0
+        return EagerQueue(max_retries=retries)
+    if not config["TASK_QUEUE_REDIS_URL"]:
+        return ThreadQueue(config["TASK_QUEUE_THREADS"])
+
+    return RQQueue(
+        config["TASK_QUEUE_REDIS_URL"],
+        config["TASK_QUEUE_NAME"],
+        config["TASK_DEAD_LETTER_QUEUE"],
+        config["TASK_RETRY_INTERVALS"],
+    )
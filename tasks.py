@@ -1,21 +1,45 @@
 import os
 
-import jinja2
-import requests
 from dotenv import load_dotenv
 
 load_dotenv()
 DOMAIN = os.getenv("MAILGUN_DOMAIN")
-template_loader = jinja2.FileSystemLoader("templates")
-template_env = jinja2.Environment(loader=template_loader)
+
+# Built on first use: the web app imports this module to enqueue emails, and
+# only the process that sends them needs requests and the templates.
+_template_env = None
+
+# One pooled session per worker process, so consecutive emails reuse the
+# connection to Mailgun instead of doing a new TLS handshake each.
+_http_session = None
+
+
+def template_env():
+    global _template_env
+    if _template_env is None:
+        import jinja2
+
+        _template_env = jinja2.Environment(loader=jinja2.FileSystemLoader("templates"))
+    return _template_env
+
+
+def http_session():
+    global _http_session
+    if _http_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        _http_session = requests.Session()
+        _http_session.mount("https://", HTTPAdapter(pool_maxsize=10))
+    return _http_session
 
 
 def render_template(tempplate_filename, **context):
-    return template_env.get_template(tempplate_filename).render(**context)
+    return template_env().get_template(tempplate_filename).render(**context)
 
 
 def send_simple_message(to, subject, body, html):
-    return requests.post(
+    response = http_session().post(
         f"https://api.mailgun.net/v3/{DOMAIN}/messages",
         auth=("api", os.getenv("MAILGUN_API_KEY")),
         data={
@@ -25,7 +49,11 @@ def send_simple_message(to, subject, body, html):
             "text": body,
             "html": html,
         },
+        timeout=10,
     )
+    # Raising makes the queue retry the job, then dead-letter it
+    response.raise_for_status()
+    return response.status_code
 
 
 def send_user_registration_email(email, username):
@@ -0,0 +1,72 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from db import db
+from models import UserModel
+
+STORES = 3
+ITEMS_PER_STORE = 10
+TAGS_PER_STORE = 3
+
+
+@pytest.fixture
+def env():
+    """Environment variables the app is created with; override it in a module
+    to configure its app."""
+    return {}
+
+
+@pytest.fixture
+def app(monkeypatch, env):
+    # Jobs run in the request, so that their writes are done when it returns
+    monkeypatch.setenv("TASK_QUEUE_EAGER", "1")
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    app = create_app("sqlite://")
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    user = UserModel(username="tester", email="tester@example.com", password="-")
+    db.session.add(user)
+    db.session.commit()
+    return {"Authorization": f"Bearer {create_access_token(identity=user.id, fresh=True)}"}
+
+
+@pytest.fixture
+def catalogue(client, auth_headers):
+    """Several Stores, each with Items and Tags and every Item tagged, through
+    the API like a client would write them."""
+    for s in range(STORES):
+        store = client.post("/store", json={"name": f"store {s}"}, headers=auth_headers)
+        store_id = store.get_json()["id"]
+        tag_ids = [
+            client.post(
+                f"/store/{store_id}/tag", json={"name": f"tag {s}.{t}"}, headers=auth_headers
+            ).get_json()["id"]
+            for t in range(TAGS_PER_STORE)
+        ]
+        item_ids = [
+            client.post(
+                "/item",
+                json={"name": f"item {s}.{i}", "price": i + 0.5, "store_id": store_id},
+                headers=auth_headers,
+            ).get_json()["id"]
+            for i in range(ITEMS_PER_STORE)
+        ]
+        for tag_id in tag_ids:
+            client.post(f"/tag/{tag_id}/items", json={"item_ids": item_ids}, headers=auth_headers)
+    # Nothing is left in the session to be lazy loaded from
+    db.session.remove()
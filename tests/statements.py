@@ -0,0 +1,45 @@
+"""
+statements.py
+
+Counting the SQL statements an endpoint runs, so that an N+1 regression (one
+query per row dumped) fails a test instead of slowing production down.
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from db import db
+
+
+@contextmanager
+def count_statements(engine=None):
+    """Collects every SQL statement executed on `engine` inside the block."""
+    engine = engine or db.engine
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_statement_count(client, method, url, expected, **kwargs):
+    """Calls an endpoint with a test client and checks how many SQL statements
+    it ran, streamed bodies included.
+
+        assert_statement_count(client, "get", "/item", 2)
+    """
+    with count_statements() as statements:
+        response = client.open(url, method=method.upper(), **kwargs)
+        response.get_data()
+
+    assert len(statements) == expected, (
+        f"{method.upper()} {url} ran {len(statements)} SQL statements, expected {expected}:\n"
+        + "\n".join(statements)
+    )
+    return response
@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+from blocklist import BLOCKLIST
+
+
+@pytest.fixture(params=["memory", "sql"])
+def env(request):
+    return {"BLOCKLIST_BACKEND": request.param}
+
+
+def test_logout_revokes(client, auth_headers):
+    assert client.post("/logout", headers=auth_headers).status_code == 200
+
+    assert client.post("/logout", headers=auth_headers).status_code == 401
+
+
+def test_expires_out_of_blocklist(app, monkeypatch):
+    now = time.time()
+    BLOCKLIST.add("revoked", expires_at=now + 60)
+    assert "revoked" in BLOCKLIST
+    assert "other" not in BLOCKLIST
+
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert "revoked" not in BLOCKLIST
@@ -0,0 +1,38 @@
+def statuses(body):
+    return [result["status"] for result in body["results"]]
+
+
+def test_write_results(client, auth_headers, catalogue):
+    items = [
+        {"name": "chair", "price": 17.99, "store_id": 1},
+        {"name": "chair", "price": 18.99, "store_id": 1},
+        {"name": "table", "price": 49.0, "store_id": 999},
+        {"name": "item 0.0", "price": 1.0, "store_id": 1},
+        {"name": "lamp"},
+    ]
+    body = client.post("/item/bulk", json={"items": items}, headers=auth_headers).get_json()
+
+    assert statuses(body) == ["created", "error", "error", "error", "error"]
+    assert body["results"][1]["errors"] == {"name": ["Duplicate name in request."]}
+    assert body["results"][2]["errors"] == {"store_id": ["Store not found."]}
+    assert (body["created"], body["failed"]) == (1, 4)
+
+
+def test_upsert_updates(client, auth_headers, catalogue):
+    items = [{"name": "item 0.0", "price": 99.0, "store_id": 1}]
+    response = client.post("/item/bulk?upsert=true", json={"items": items}, headers=auth_headers)
+
+    assert statuses(response.get_json()) == ["updated"]
+    assert client.get("/item/1").get_json()["price"] == 99.0
+
+
+def test_delete_results(client, auth_headers, catalogue):
+    body = client.delete(
+        "/item/bulk", json={"ids": [1, 1, 12345]}, headers=auth_headers
+    ).get_json()
+
+    assert statuses(body) == ["deleted", "error", "error"]
+    assert body["results"][1]["errors"] == {"id": ["Duplicate id in request."]}
+    assert body["results"][2]["errors"] == {"id": ["Item not found."]}
+    assert (body["deleted"], body["failed"]) == (1, 2)
+    assert client.get("/item/1").status_code == 404
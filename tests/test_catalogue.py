@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+from tests.conftest import ITEMS_PER_STORE, STORES
+
+
+def export(client, format, **args):
+    response = client.get("/catalogue/export", query_string={"format": format, **args})
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def import_lines(client, auth_headers, lines, **args):
+    response = client.post(
+        "/catalogue/import",
+        query_string=args,
+        data="".join(json.dumps(line) + "\n" for line in lines),
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_export_csv(client, catalogue):
+    rows = list(csv.DictReader(io.StringIO(export(client, "csv", store_id=1))))
+
+    assert len(rows) == ITEMS_PER_STORE
+    assert rows[0]["name"] == "item 0.0"
+    assert rows[0]["store"] == "store 0"
+    assert rows[0]["tags"] == "tag 0.0|tag 0.1|tag 0.2"
+
+
+def test_export_ndjson(client, catalogue):
+    rows = [json.loads(line) for line in export(client, "ndjson").splitlines()]
+
+    assert len(rows) == STORES * ITEMS_PER_STORE
+    assert rows[-1]["tags"] == ["tag 2.0", "tag 2.1", "tag 2.2"]
+
+
+def test_import(client, auth_headers):
+    lines = [
+        {"name": "chair", "price": 10.0, "store": "new store", "tags": ["wood"]},
+        {"name": "table", "price": 20.0, "store": "new store", "tags": ["wood", "large"]},
+    ]
+    result = import_lines(client, auth_headers, lines, create_missing="true")
+
+    assert (result["created"], result["failed"]) == (2, 0)
+    assert (result["stores_created"], result["tags_created"], result["linked"]) == (1, 2, 3)
+    exported = [json.loads(line) for line in export(client, "ndjson").splitlines()]
+    assert [(row["name"], sorted(row["tags"])) for row in exported] == [
+        ("chair", ["wood"]),
+        ("table", ["large", "wood"]),
+    ]
+
+
+def test_import_errors(client, auth_headers, catalogue):
+    lines = [
+        {"name": "item 0.0", "price": 99.0, "store": "store 0"},
+        {"name": "chair", "price": 10.0, "store": "missing store"},
+        {"name": "lamp", "store": "store 0"},
+    ]
+    result = import_lines(client, auth_headers, lines, upsert="true")
+
+    assert (result["updated"], result["created"], result["failed"]) == (1, 0, 2)
+    assert [error["line"] for error in result["errors"]] == [2, 3]
+    assert client.get("/item/1").get_json()["price"] == 99.0
@@ -0,0 +1,39 @@
+import time
+
+from changes import CHANGE_FEED
+
+
+def feed(client, auth_headers, since=0, **args):
+    return client.get("/changes", query_string={"since": since, **args}, headers=auth_headers)
+
+
+def test_needs_a_token(client, catalogue):
+    assert client.get("/changes?since=0").status_code == 401
+
+
+def test_entries_in_commit_order(client, auth_headers):
+    head = feed(client, auth_headers, since=None).get_json()["last_seq"]
+    client.post("/store", json={"name": "store"}, headers=auth_headers)
+    client.post("/item", json={"name": "a", "price": 1.0, "store_id": 1}, headers=auth_headers)
+    client.delete("/item/1", headers=auth_headers)
+
+    body = feed(client, auth_headers, since=head).get_json()
+    changes = [(c["entity"], c["id"], c["deleted"]) for c in body["changes"]]
+    assert changes == [("store", 1, False), ("item", 1, False), ("item", 1, True)]
+    assert [c["seq"] for c in body["changes"]] == sorted(c["seq"] for c in body["changes"])
+    assert body["changes"][0]["data"]["name"] == "store"
+    assert body["changes"][2]["data"] is None
+
+    assert feed(client, auth_headers, since=body["last_seq"]).get_json()["changes"] == []
+
+
+def test_gone_after_compaction(app, client, auth_headers):
+    client.post("/store", json={"name": "store"}, headers=auth_headers)
+    store_id = client.post("/store", json={"name": "doomed"}, headers=auth_headers).get_json()["id"]
+    client.delete(f"/store/{store_id}", headers=auth_headers)
+
+    CHANGE_FEED.compact(deleted_before=time.time() + 1)
+
+    assert feed(client, auth_headers, since=0).status_code == 410
+    last_seq = feed(client, auth_headers, since=None).get_json()["last_seq"]
+    assert feed(client, auth_headers, since=last_seq).status_code == 200
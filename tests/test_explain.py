@@ -0,0 +1,20 @@
+"""benchmarks/explain.py runs on every route, and finds no full scans."""
+
+from app import create_app
+from benchmarks import bench_api
+from benchmarks.explain import explain_routes
+from benchmarks.seed import seed
+
+COUNTS = (2, 50, 5)
+
+
+def test_explain_routes(monkeypatch, tmp_path):
+    monkeypatch.setenv("TASK_QUEUE_EAGER", "1")
+    monkeypatch.setattr("tasks.send_simple_message", lambda *args, **kwargs: 200)
+    # A file, not sqlite://, so that statements run on several connections
+    # like in production
+    app = create_app(f"sqlite:///{tmp_path / 'explain.db'}")
+    with app.app_context():
+        seed(*COUNTS)
+
+    assert explain_routes(app, bench_api.TestClient(app), COUNTS, threshold=10) == []
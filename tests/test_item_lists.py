@@ -0,0 +1,81 @@
+import pytest
+
+from tests.conftest import ITEMS_PER_STORE, STORES
+
+
+def walk(client, **args):
+    """Every page of `GET /item`, following the cursors."""
+    pages = []
+    after = None
+    while True:
+        query = {**args, **({"after": after} if after else {})}
+        response = client.get("/item", query_string=query)
+        assert response.status_code == 200
+        pages.append(response.get_json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            return pages
+
+
+def ids(client, **args):
+    return [item["id"] for page in walk(client, **args) for item in page]
+
+
+def test_pages(client, catalogue):
+    pages = walk(client, limit=7)
+
+    assert [len(page) for page in pages[:-1]] == [7] * (len(pages) - 1)
+    assert [item["id"] for page in pages for item in page] == list(
+        range(1, STORES * ITEMS_PER_STORE + 1)
+    )
+
+
+@pytest.mark.parametrize("sort", ["price", "-price", "name", "-name", "-id"])
+def test_pages_sorted(client, catalogue, sort):
+    # Prices repeat across stores, so pages have to break ties by id
+    items = [item for page in walk(client, limit=4, sort=sort) for item in page]
+    key = sort.lstrip("-")
+
+    assert len({item["id"] for item in items}) == STORES * ITEMS_PER_STORE
+    assert items == sorted(
+        items, key=lambda item: (item[key], item["id"]), reverse=sort.startswith("-")
+    )
+
+
+def test_invalid_cursor(client, catalogue):
+    response = client.get("/item", query_string={"limit": 7, "after": "not a cursor"})
+    assert response.status_code == 400
+
+
+def test_ndjson(client, catalogue):
+    response = client.get("/item?format=ndjson")
+
+    assert response.mimetype == "application/x-ndjson"
+    assert len(response.get_data(as_text=True).splitlines()) == STORES * ITEMS_PER_STORE
+
+
+def test_filters(client, catalogue):
+    assert ids(client, store_id=2) == list(range(11, 21))
+    assert ids(client, store_id=2, price_min=3.5, price_max=5.5) == [14, 15, 16]
+    assert ids(client, name_prefix="item 1.") == list(range(11, 21))
+    assert ids(client, tag=4) == list(range(11, 21))
+
+
+def test_tag_match(client, auth_headers, catalogue):
+    tag = client.post("/store/1/tag", json={"name": "sale"}, headers=auth_headers)
+    tag_id = tag.get_json()["id"]
+    client.post(f"/tag/{tag_id}/items", json={"item_ids": [2, 3]}, headers=auth_headers)
+
+    assert ids(client, tag=[1, tag_id]) == list(range(1, 11))
+    assert ids(client, tag=[1, tag_id], tag_match="all") == [2, 3]
+
+
+def test_search(client, auth_headers, catalogue):
+    for name, store_id in [("Oak Desk", 1), ("oak chair", 2)]:
+        item = {"name": name, "price": 1.0, "store_id": store_id}
+        client.post("/item", json=item, headers=auth_headers)
+
+    assert len(ids(client, q="oak")) == 2
+    assert len(ids(client, q="OAK desk")) == 1
+    assert ids(client, q="oak", store_id=2) == [STORES * ITEMS_PER_STORE + 2]
+    assert ids(client, q="walnut") == []
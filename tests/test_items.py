@@ -0,0 +1,46 @@
+def test_not_modified(client, catalogue):
+    etag = client.get("/item/1").headers["ETag"]
+
+    response = client.get("/item/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_update_if_match(client, auth_headers, catalogue):
+    etag = client.get("/item/1").headers["ETag"]
+
+    response = client.put(
+        "/item/1", json={"price": 2.0}, headers={**auth_headers, "If-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert client.get("/item/1").headers["ETag"] == response.headers["ETag"]
+
+
+def test_stale_if_match(client, auth_headers, catalogue):
+    etag = client.get("/item/1").headers["ETag"]
+    client.put("/item/1", json={"price": 2.0}, headers=auth_headers)
+
+    response = client.put(
+        "/item/1", json={"price": 3.0}, headers={**auth_headers, "If-Match": etag}
+    )
+    assert response.status_code == 412
+    assert client.get("/item/1").get_json()["price"] == 2.0
+
+
+def test_if_match_missing_item(client, auth_headers, catalogue):
+    response = client.put(
+        "/item/12345",
+        json={"name": "new", "price": 1.0, "store_id": 1},
+        headers={**auth_headers, "If-Match": '"1"'},
+    )
+    assert response.status_code == 412
+    assert client.get("/item/12345").status_code == 404
+
+
+def test_return_minimal(client, auth_headers, catalogue):
+    response = client.put(
+        "/item/1", json={"price": 2.0}, headers={**auth_headers, "Prefer": "return=minimal"}
+    )
+    assert response.status_code == 204
+    assert response.headers["Preference-Applied"] == "return=minimal"
+    assert response.headers["ETag"] == client.get("/item/1").headers["ETag"]
@@ -0,0 +1,87 @@
+import time
+
+import jwt
+import pytest
+from flask_jwt_extended import create_access_token
+
+from db import db
+from jwt_cache import CLAIMS_CACHE
+from models import UserModel
+
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def user_id(app):
+    user = UserModel(username="tester", email="tester@example.com", password="-")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_claims_cached(client, user_id):
+    token = create_access_token(identity=user_id)
+    assert CLAIMS_CACHE.claims(token) is None
+
+    assert client.get("/changes", headers=bearer(token)).status_code == 200
+    assert CLAIMS_CACHE.claims(token)["sub"] == user_id
+
+
+def test_cached_signature_on_other_claims(client, user_id):
+    token = create_access_token(identity=user_id)
+    client.get("/changes", headers=bearer(token))
+
+    header, _, signature = token.split(".")
+    other = create_access_token(identity=user_id + 1).split(".")[1]
+    forged = f"{header}.{other}.{signature}"
+    assert client.get("/changes", headers=bearer(forged)).status_code == 401
+
+
+def test_revoked_token_leaves_cache(client, user_id):
+    token = create_access_token(identity=user_id)
+    client.get("/changes", headers=bearer(token))
+
+    assert client.post("/logout", headers=bearer(token)).status_code == 200
+    assert CLAIMS_CACHE.claims(token) is None
+    assert client.get("/changes", headers=bearer(token)).status_code == 401
+
+
+class TestKeyRotation:
+    OVERLAP = 60
+
+    @pytest.fixture
+    def env(self, tmp_path):
+        return {
+            "JWT_KEYS_FILE": str(tmp_path / "keys.json"),
+            "JWT_KEY_OVERLAP": str(self.OVERLAP),
+            "JWT_KEYS_RELOAD_INTERVAL": "0",
+        }
+
+    @pytest.fixture
+    def generate(self, app):
+        pytest.importorskip("cryptography")
+
+        def generate(kid, *options):
+            result = app.test_cli_runner().invoke(args=["keys", "generate", kid, *options])
+            assert result.exit_code == 0, result.output
+
+        return generate
+
+    def test_rotation(self, app, client, generate, user_id, monkeypatch):
+        generate("first", "--sign-from", "2026-01-01T00:00:00+00:00")
+        old = create_access_token(identity=user_id)
+        generate("second")
+        new = create_access_token(identity=user_id)
+
+        assert jwt.get_unverified_header(old)["kid"] == "first"
+        assert jwt.get_unverified_header(new)["kid"] == "second"
+        assert client.get("/changes", headers=bearer(old)).status_code == 200
+        assert client.get("/changes", headers=bearer(new)).status_code == 200
+
+        # The first key retires once the overlap window is over
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + self.OVERLAP + 1)
+        assert client.get("/changes", headers=bearer(old)).status_code == 401
+        assert client.get("/changes", headers=bearer(new)).status_code == 200
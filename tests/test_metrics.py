@@ -0,0 +1,26 @@
+import copy
+
+import pytest
+from flask import g
+from sqlalchemy.exc import OperationalError
+
+from db import db
+
+
+def test_failed_statements_leave_no_timer(app):
+    with app.test_request_context(), db.engine.connect() as connection:
+        g.sql_statements, g.sql_seconds = 0, 0.0
+        before = copy.deepcopy(connection.info)
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.exec_driver_sql("SELECT * FROM no_such_table")
+        connection.exec_driver_sql("SELECT 1")
+
+        assert connection.info == before
+        assert g.sql_statements == 1
+
+
+def test_request_metrics(client, catalogue):
+    client.get("/item")
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'http_request_sql_statements_count{blueprint="items",endpoint="items.ItemList"}' in body
@@ -0,0 +1,21 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+
+from app import create_app
+from db import db, include_in_migrations, migrate_cli
+
+
+def test_autogenerate_finds_no_changes(tmp_path):
+    app = create_app(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrate_cli(app).group()
+    with app.app_context():
+        assert app.extensions["migrate"].configure_args["include_object"] is include_in_migrations
+        upgrade()
+        with db.engine.connect() as connection:
+            context = MigrationContext.configure(
+                connection, opts={"include_object": include_in_migrations}
+            )
+            diff = compare_metadata(context, db.metadata)
+
+    assert diff == []
@@ -0,0 +1,54 @@
+import pytest
+from passlib.hash import pbkdf2_sha256
+
+from db import db
+from models import UserModel
+from passwords import PASSWORD_HASHER
+
+ROUNDS = 1000
+
+
+@pytest.fixture
+def env():
+    return {"PASSWORD_ROUNDS": str(ROUNDS)}
+
+
+def login(client, password):
+    return client.post("/login", json={"username": "tester", "password": password})
+
+
+def stored_hash():
+    db.session.remove()
+    return UserModel.query.filter_by(username="tester").one().password
+
+
+@pytest.fixture
+def user(app):
+    password = PASSWORD_HASHER.hash("pw")
+    db.session.add(UserModel(username="tester", email="tester@example.com", password=password))
+    db.session.commit()
+
+
+def test_rehash_on_login(app, client, user):
+    assert pbkdf2_sha256.from_string(stored_hash()).rounds == ROUNDS
+
+    app.config["PASSWORD_ROUNDS"] = ROUNDS * 2
+    PASSWORD_HASHER.init_app(app)
+
+    assert login(client, "pw").status_code == 200
+    assert pbkdf2_sha256.from_string(stored_hash()).rounds == ROUNDS * 2
+    assert login(client, "pw").status_code == 200
+
+
+def test_no_rehash_when_current(client, user):
+    password_hash = stored_hash()
+
+    assert login(client, "pw").status_code == 200
+    assert stored_hash() == password_hash
+
+
+def test_wrong_password(client, user):
+    password_hash = stored_hash()
+
+    assert login(client, "wrong").status_code == 401
+    assert stored_hash() == password_hash
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import delete
+
+from db import db
+from models import StoreModel
+from reference_cache import REFERENCE_CACHE
+
+
+def test_off_without_redis(app):
+    assert not REFERENCE_CACHE.enabled
+
+
+class TestWithRedis:
+    @pytest.fixture
+    def env(self):
+        # Nothing listens there: publishing the invalidations fails
+        return {"REFERENCE_CACHE_REDIS_URL": "redis://127.0.0.1:1/0"}
+
+    @pytest.fixture(autouse=True)
+    def no_listener(self, monkeypatch):
+        # The subscriber thread would outlive the test's app
+        monkeypatch.setattr(REFERENCE_CACHE, "listen", lambda: None)
+
+    @pytest.fixture
+    def deleted_store(self, app, client, catalogue):
+        """Store 1, cached by this worker, then deleted by another one."""
+        assert client.get("/store/1/tag").status_code == 200
+        with db.engine.begin() as connection:
+            connection.execute(delete(StoreModel.__table__).where(StoreModel.id == 1))
+        return 1
+
+    def test_writes_check_the_database(self, client, auth_headers, deleted_store):
+        assert REFERENCE_CACHE.stores.get(deleted_store) is not None
+        url = f"/store/{deleted_store}/tag"
+        assert client.post(url, json={"name": "orphan"}, headers=auth_headers).status_code == 404
+        assert client.delete(f"/store/{deleted_store}", headers=auth_headers).status_code == 404
+
+    def test_commits_when_redis_is_down(self, client, auth_headers, catalogue):
+        response = client.post("/store/2/tag", json={"name": "new tag"}, headers=auth_headers)
+        assert response.status_code == 201
@@ -0,0 +1,38 @@
+import pytest
+
+from db import db, reads_from_replica
+
+
+@pytest.fixture
+def env(tmp_path):
+    return {"DATABASE_REPLICA_URLS": f"sqlite:///{tmp_path / 'replica.db'}"}
+
+
+@pytest.fixture
+def replica(app):
+    """An empty copy of the schema that is never written to, like a replica
+    lagging far behind."""
+    db.metadata.create_all(db.get_engine(app, bind="replica_0"))
+
+
+def test_reads_from_replica(app, client, auth_headers, replica):
+    store_id = client.post("/store", json={"name": "store"}, headers=auth_headers).get_json()["id"]
+
+    assert app.test_client().get(f"/store/{store_id}").status_code == 404
+    with app.test_request_context("/store", method="GET"):
+        app.preprocess_request()
+        assert reads_from_replica()
+    with app.test_request_context("/store", method="POST"):
+        app.preprocess_request()
+        assert not reads_from_replica()
+
+
+def test_sticky_after_write(app, client, auth_headers, replica):
+    response = client.post("/store", json={"name": "store"}, headers=auth_headers)
+    url = f"/store/{response.get_json()['id']}"
+
+    assert "db_primary_until" in response.headers["Set-Cookie"]
+    assert client.get(url).status_code == 200
+
+    client.set_cookie("localhost", "db_primary_until", "1")
+    assert client.get(url).status_code == 404
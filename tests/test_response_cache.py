@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture
+def env():
+    # Nothing listens there: every Redis call fails
+    return {"RESPONSE_CACHE_REDIS_URL": "redis://127.0.0.1:1/0"}
+
+
+def test_reads_render_without_redis(client, catalogue):
+    first = client.get("/item/1")
+    assert first.status_code == 200
+    assert client.get("/item/1").get_data() == first.get_data()
+    revalidated = client.get("/item/1", headers={"If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_writes_commit_without_redis(client, auth_headers, catalogue):
+    created = client.post("/store", json={"name": "new store"}, headers=auth_headers)
+    assert created.status_code == 201
+    assert client.get(f"/store/{created.get_json()['id']}").status_code == 200
@@ -0,0 +1,49 @@
+"""The list and detail endpoints load what they dump in a fixed number of
+statements, however many rows there are (see query_shaping.py)."""
+
+import pytest
+
+from tests.statements import assert_statement_count
+
+ENDPOINTS = [
+    # Page of Items (with their Store and Tags), and the Item
+    ("/item", 2),
+    ("/item?limit=5", 2),
+    ("/item?format=ndjson", 2),
+    ("/item/1", 2),
+    # Stores with their Items and Tags
+    ("/store", 3),
+    ("/store?limit=2", 3),
+    ("/store?format=ndjson", 3),
+    ("/store/1", 3),
+    ("/store/1/deletion", 2),
+    # The Store (uncached), then its Tags with their Items
+    ("/store/1/tag", 3),
+    ("/tag/1", 2),
+    ("/store/1/stats", 2),
+    ("/stats/stores", 2),
+    ("/stats/stores?format=ndjson", 2),
+    ("/catalogue/export?format=csv", 1),
+    ("/catalogue/export?format=ndjson", 1),
+    ("/user/1", 1),
+]
+
+# Behind a JWT; the token's user was cached by the writes of the catalogue
+AUTHENTICATED_ENDPOINTS = [
+    # Newest entry and horizon
+    ("/changes", 2),
+    # Horizon, entries, then the rows of each entity in one statement
+    ("/changes?since=0", 6),
+]
+
+
+@pytest.mark.parametrize("url, expected", ENDPOINTS)
+def test_statement_count(client, catalogue, url, expected):
+    response = assert_statement_count(client, "get", url, expected)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("url, expected", AUTHENTICATED_ENDPOINTS)
+def test_authenticated_statement_count(client, auth_headers, catalogue, url, expected):
+    response = assert_statement_count(client, "get", url, expected, headers=auth_headers)
+    assert response.status_code == 200
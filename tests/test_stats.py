@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def store(client, auth_headers):
+    """A Store with a Tag, and two Items of which one is tagged."""
+    client.post("/store", json={"name": "store"}, headers=auth_headers)
+    client.post("/store/1/tag", json={"name": "tag"}, headers=auth_headers)
+    for name, price in (("a", 2.0), ("b", 4.0)):
+        item = {"name": name, "price": price, "store_id": 1}
+        client.post("/item", json=item, headers=auth_headers)
+    client.post("/item/1/tag/1", headers=auth_headers)
+    return 1
+
+
+def stats(client, store_id):
+    body = client.get(f"/store/{store_id}/stats").get_json()
+    return {key: body[key] for key in ("item_count", "price_min", "price_max", "price_total")}
+
+
+def test_stats_follow_writes(client, auth_headers, store):
+    assert stats(client, store) == {
+        "item_count": 2, "price_min": 2.0, "price_max": 4.0, "price_total": 6.0
+    }
+    assert client.get(f"/store/{store}/stats").get_json()["tags"] == [
+        {"tag_id": 1, "item_count": 1}
+    ]
+
+    client.put("/item/2", json={"name": "b", "price": 10.0}, headers=auth_headers)
+    assert stats(client, store)["price_max"] == 10.0
+
+    assert client.delete("/item/1", headers=auth_headers).status_code == 200
+    assert stats(client, store) == {
+        "item_count": 1, "price_min": 10.0, "price_max": 10.0, "price_total": 10.0
+    }
+    assert client.get(f"/store/{store}/stats").get_json()["tags"][0]["item_count"] == 0
+
+
+def test_delete_missing_item(client, auth_headers, store):
+    assert client.delete("/item/12345", headers=auth_headers).status_code == 404
+    assert stats(client, store)["item_count"] == 2
@@ -0,0 +1,40 @@
+from db import db
+from models import ItemModel, ItemsTags, TagModel
+from tests.conftest import ITEMS_PER_STORE, STORES, TAGS_PER_STORE
+
+
+def remaining(store_id):
+    return {
+        "items": ItemModel.query.filter_by(store_id=store_id).count(),
+        "tags": TagModel.query.filter_by(store_id=store_id).count(),
+        "links": ItemsTags.query.join(TagModel).filter(TagModel.store_id == store_id).count(),
+    }
+
+
+def assert_deleted(client, store_id):
+    assert client.get(f"/store/{store_id}").status_code == 404
+    assert remaining(store_id) == {"items": 0, "tags": 0, "links": 0}
+    assert ItemModel.query.count() == (STORES - 1) * ITEMS_PER_STORE
+    assert TagModel.query.count() == (STORES - 1) * TAGS_PER_STORE
+    assert ItemsTags.query.count() == (STORES - 1) * ITEMS_PER_STORE * TAGS_PER_STORE
+
+
+def test_delete(client, auth_headers, catalogue):
+    response = client.delete("/store/2", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert_deleted(client, 2)
+
+
+def test_delete_in_background(client, auth_headers, catalogue):
+    response = client.delete("/store/2?background=true", headers=auth_headers)
+
+    assert response.status_code == 202
+    db.session.remove()
+    assert_deleted(client, 2)
+    assert client.get(response.headers["Location"]).status_code == 404
+
+
+def test_delete_missing(client, auth_headers, catalogue):
+    assert client.delete("/store/12345", headers=auth_headers).status_code == 404
+    assert client.delete("/store/12345?background=true", headers=auth_headers).status_code == 404
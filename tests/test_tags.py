@@ -0,0 +1,32 @@
+def item_tags(client, item_id):
+    return sorted(tag["id"] for tag in client.get(f"/item/{item_id}").get_json()["tags"])
+
+
+def test_link_twice(client, auth_headers, catalogue):
+    item_id = client.post(
+        "/item", json={"name": "new", "price": 1.0, "store_id": 1}, headers=auth_headers
+    ).get_json()["id"]
+
+    for _ in range(2):
+        response = client.post(f"/item/{item_id}/tag/1", headers=auth_headers)
+        assert response.status_code == 201
+        assert response.get_json()["id"] == 1
+    assert item_tags(client, item_id) == [1]
+
+
+def test_link_across_stores(client, auth_headers, catalogue):
+    # Item 1 is in the first store, and the last tag in the last one
+    response = client.post("/item/1/tag/9", headers=auth_headers)
+    assert response.status_code == 400
+    assert 9 not in item_tags(client, 1)
+
+
+def test_link_missing(client, auth_headers, catalogue):
+    assert client.post("/item/12345/tag/1", headers=auth_headers).status_code == 404
+    assert client.post("/item/1/tag/12345", headers=auth_headers).status_code == 404
+
+
+def test_unlink_twice(client, auth_headers, catalogue):
+    for _ in range(2):
+        assert client.delete("/item/1/tag/1", headers=auth_headers).status_code == 200
+    assert item_tags(client, 1) == [2, 3]
@@ -0,0 +1,47 @@
+import pytest
+
+from task_queue import EagerQueue, ThreadQueue
+
+
+class Flaky:
+    """A job that fails its first `failures` runs."""
+
+    __name__ = "flaky"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.runs = 0
+
+    def __call__(self, value):
+        self.runs += 1
+        if self.runs <= self.failures:
+            raise RuntimeError("down")
+        return value
+
+
+def test_eager_retries():
+    job = Flaky(failures=2)
+    queue = EagerQueue(max_retries=2)
+
+    assert queue.enqueue(job, "done") == "done"
+    assert job.runs == 3
+    assert queue.dead_letters == []
+
+
+def test_eager_dead_letters():
+    job = Flaky(failures=3)
+    queue = EagerQueue(max_retries=2)
+
+    assert queue.enqueue(job, "done") is None
+    assert job.runs == 3
+    assert queue.dead_letters == [(job, ("done",), {}, "RuntimeError('down')")]
+
+
+@pytest.mark.parametrize("failures,result", [(0, "done"), (1, None)])
+def test_thread_runs_once(app, failures, result):
+    job = Flaky(failures)
+    queue = ThreadQueue(threads=1)
+
+    assert queue.enqueue(job, "done").result(timeout=5) == result
+    assert job.runs == 1
+    assert len(queue.dead_letters) == failures